@@ -1,11 +1,32 @@
+import os
+import json
+import time
 import uuid
-from flask import Flask, request, jsonify
-from rag import rag_answer
+from flask import Flask, Response, request, jsonify, stream_with_context
+from rag import (
+    rag_answer, rag_answer_batch, rag_answer_stream, readiness, component_stats, resolve_title,
+    get_title_resolver, UnknownTitleError,
+)
+from evaluation import submit_evaluation, submit_evaluations
+from llm_client import get_llm_client
 import db
 
 
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))
+
 app = Flask(__name__)
 
+
+def unknown_title_response(e):
+    return jsonify({"error": str(e), "title": e.title, "suggestions": e.suggestions}), 404
+
+
+def needs_evaluation(answer_data):
+    # Degraded and no-context answers were not written by the LLM, so there is nothing to grade;
+    # a semantic-cache hit repeats an answer that is already graded
+    return not (answer_data.get("degraded") or answer_data.get("no_context") or answer_data.get("cache_hit"))
+
+
 @app.route("/question", methods=["POST"])
 def handle_question():
     data = request.json
@@ -15,6 +36,11 @@ def handle_question():
     if not question or not title:
         return jsonify({"error": "Question or game title not provided"}), 400
 
+    try:
+        title = resolve_title(title)
+    except UnknownTitleError as e:
+        return unknown_title_response(e)
+
     conversation_id = str(uuid.uuid4())
 
     # Pass both the question and the title to the RAG model for a response
@@ -33,9 +59,134 @@ def handle_question():
         answer_data=answer_data,
     )
 
+    # Relevance is graded by the background evaluation workers
+    if needs_evaluation(answer_data):
+        submit_evaluation(conversation_id, question, answer_data)
+
     return jsonify(result)
 
 
+def sse_event(event, data):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/question/stream", methods=["POST"])
+def handle_question_stream():
+    received_at = time.time()
+    data = request.json
+    question = data.get("question")
+    title = data.get("title")
+
+    if not question or not title:
+        return jsonify({"error": "Question or game title not provided"}), 400
+
+    try:
+        title = resolve_title(title)
+    except UnknownTitleError as e:
+        return unknown_title_response(e)
+
+    conversation_id = str(uuid.uuid4())
+
+    def generate():
+        yield sse_event("conversation", {
+            "conversation_id": conversation_id,
+            "question": question,
+            "title": title,
+        })
+
+        # Time to first byte is measured up to the first answer token sent to the client
+        ttfb = None
+        try:
+            for event, payload in rag_answer_stream(question, title):
+                if event == "token":
+                    if ttfb is None:
+                        ttfb = time.time() - received_at
+                    yield sse_event("token", {"text": payload})
+                    continue
+
+                answer_data = payload
+                answer_data["timings"]["ttfb"] = ttfb
+                yield sse_event("done", {
+                    "conversation_id": conversation_id,
+                    "answer": answer_data["answer"],
+                    "prompt_tokens": answer_data["prompt_tokens"],
+                    "completion_tokens": answer_data["completion_tokens"],
+                    "total_tokens": answer_data["total_tokens"],
+                    "openai_cost": answer_data["openai_cost"],
+                    "response_time": answer_data["response_time"],
+                    "degraded": answer_data.get("degraded", False),
+                })
+        except Exception as e:
+            print(f"Error streaming answer for conversation {conversation_id}: {e}")
+            yield sse_event("error", {"conversation_id": conversation_id, "error": str(e)})
+            return
+
+        # Persisted only once the whole answer has been sent
+        db.save_conversation(
+            conversation_id=conversation_id,
+            question=question,
+            answer_data=answer_data,
+        )
+        if needs_evaluation(answer_data):
+            submit_evaluation(conversation_id, question, answer_data)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
+
+@app.route("/questions", methods=["POST"])
+def handle_questions():
+    data = request.json or {}
+    items = data.get("questions")
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "A non-empty list of questions must be provided"}), 400
+    if len(items) > BATCH_MAX_QUESTIONS:
+        return jsonify({"error": f"At most {BATCH_MAX_QUESTIONS} questions per request"}), 400
+
+    results = [None] * len(items)
+    titles = [None] * len(items)
+    valid = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("question") or not item.get("title"):
+            results[i] = {"error": "Question or game title not provided"}
+            continue
+        try:
+            titles[i] = resolve_title(item["title"])
+        except UnknownTitleError as e:
+            results[i] = {"question": item["question"], "title": item["title"], "error": str(e),
+                          "suggestions": e.suggestions}
+            continue
+        valid.append(i)
+
+    answers = rag_answer_batch([{"question": items[i]["question"], "title": titles[i]} for i in valid])
+
+    conversations = []
+    for i, answer_data in zip(valid, answers):
+        question = items[i]["question"]
+        title = titles[i]
+        if "error" in answer_data:
+            results[i] = {"question": question, "title": title, "error": answer_data["error"]}
+            continue
+
+        conversation_id = str(uuid.uuid4())
+        conversations.append((conversation_id, question, answer_data))
+        results[i] = {
+            "conversation_id": conversation_id,
+            "question": question,
+            "title": title,
+            "answer": answer_data["answer"],
+        }
+
+    db.save_conversations(conversations)
+
+    # Relevance is graded by the background evaluation workers
+    submit_evaluations([c for c in conversations if needs_evaluation(c[2])])
+
+    return jsonify({"results": results})
+
+
 @app.route("/feedback", methods=["POST"])
 def handle_feedback():
     data = request.json
@@ -56,5 +207,28 @@ def handle_feedback():
     return jsonify(result)
 
 
+@app.route("/titles", methods=["GET"])
+def handle_titles():
+    # The titles questions can be asked about, as resolved by /question
+    title_resolver = get_title_resolver()
+    return jsonify({"titles": title_resolver.titles() if title_resolver is not None else []})
+
+
+@app.route("/ready", methods=["GET"])
+def handle_ready():
+    # Ready only once the model has run a warmup encode and Elasticsearch answers a ping
+    result = readiness()
+    return jsonify(result), 200 if result["ready"] else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def handle_metrics():
+    result = {
+        **component_stats(),
+        "llm": get_llm_client().stats(),
+    }
+    return jsonify(result)
+
+
 if __name__ == "__main__":
     app.run(debug=True)
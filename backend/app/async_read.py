@@ -0,0 +1,295 @@
+import time
+import asyncio
+from read import (
+    ReviewReader, ELASTIC_URL, INDEX_NAME, RAG_SOURCE_FIELDS, INDEX_LAYOUT, INDEX_LAYOUTS, VECTOR_FIELDS,
+    READ_PAGE_SIZE, READ_KEEP_ALIVE, ES_CONNECTIONS, RRF_UNSUPPORTED_ERRORS, VERSION_FILTER_PATH, es_client_options,
+    load_knn_settings,
+)
+
+
+class PoolStats:
+    """Counts the requests holding or waiting for one of the pooled connections."""
+
+    def __init__(self, size):
+        self.size = size
+        self._slots = asyncio.Semaphore(size)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.errors = 0
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        if self._slots.locked():
+            self.waited += 1  # every connection was busy
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.requests += 1
+        self.wait_seconds += time.perf_counter() - started
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        if exc_type is not None:
+            self.errors += 1
+        self._slots.release()
+        return False
+
+    def stats(self):
+        return {
+            "pool_size": self.size,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "utilization": self.in_flight / self.size if self.size else 0.0,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "waited": self.waited,
+            "mean_wait_ms": self.wait_seconds / self.requests * 1000 if self.requests else 0.0,
+            "errors": self.errors,
+        }
+
+
+class AsyncReviewReader(ReviewReader):
+    """asyncio version of ReviewReader on AsyncElasticsearch.
+
+    Every method that talks to Elasticsearch is a coroutine (iter_* are async
+    generators) with the same arguments and results as in ReviewReader; the
+    query building and response parsing are shared. Requests go through a
+    pool of `connections` keep-alive connections, so one event loop thread
+    can keep that many searches in flight. stats() reports how busy the pool
+    is. Needs aiohttp, which the Pipfile installs.
+
+    Create the reader inside the event loop that uses it, call
+    `await reader.check_connection()` once, and `await reader.close()` when done.
+    """
+
+    def __init__(self, es_host=ELASTIC_URL, index_name=INDEX_NAME, model=None, source_fields=RAG_SOURCE_FIELDS,
+                 layout=INDEX_LAYOUT, connections=ES_CONNECTIONS):
+        if layout not in INDEX_LAYOUTS:
+            raise ValueError(f"Unknown index layout '{layout}', expected one of {INDEX_LAYOUTS}")
+        # ReviewReader.__init__ is not called: it would check the connection synchronously
+        self.connections = connections
+        self.pool = PoolStats(connections)
+        self.es = self.create_client(es_host)
+        self.index_name = index_name
+        self.layout = layout
+        self.title_indices = {}
+        self._version = None
+        self._version_checked_at = 0.0
+        self.model = model
+        self.source_fields = source_fields
+        self.knn_settings = load_knn_settings()
+        self._server_rrf_supported = None
+
+    def create_client(self, es_host):
+        from elasticsearch import AsyncElasticsearch
+        return AsyncElasticsearch([es_host], **es_client_options(connections=self.connections))
+
+    async def check_connection(self):
+        """Ping Elasticsearch and, in the per-title layout, resolve the title indices."""
+        try:
+            print("Checking connection to Elasticsearch...")
+            if await self.ping():
+                print("Connected to Elasticsearch!")
+            else:
+                print("Failed to connect to Elasticsearch.")
+        except Exception as e:
+            print(f"Failed to connect to Elasticsearch: {e}")
+        if self.layout == "per-title":
+            await self.refresh_title_indices()
+
+    async def refresh_title_indices(self):
+        try:
+            async with self.pool:
+                response = await self.es.indices.get_mapping(index=self.index_name)
+            self.set_title_indices(response)
+        except Exception as e:
+            print(f"Error resolving per-title indices: {e}")
+        return self.title_indices
+
+    async def close(self):
+        await self.es.close()
+
+    def stats(self):
+        """Connection pool utilization."""
+        return self.pool.stats()
+
+    async def ping(self):
+        async with self.pool:
+            return bool(await self.es.ping())
+
+    async def index_version(self):
+        self._version_checked_at = time.time()
+        try:
+            async with self.pool:
+                response = await self.es.indices.get(index=self.index_name, filter_path=VERSION_FILTER_PATH)
+            version = self.version_from_indices(response)
+        except Exception as e:
+            print(f"Error retrieving index version: {e}")
+            return None
+        if version != self._version and self.layout == "per-title":
+            await self.refresh_title_indices()
+        self._version = version
+        return version
+
+    async def check_title_indices(self):
+        """Refresh a stale per-title map; the search methods call it before search_target."""
+        if self.title_indices_stale():
+            await self.index_version()
+
+    def search_target(self, title):
+        # The check needs a round trip, so it is awaited by the callers instead
+        return self.layout_target(title)
+
+    async def read_all_reviews(self):
+        try:
+            async with self.pool:
+                response = await self.es.search(
+                    index=self.index_name, query={"match_all": {}}, source_excludes=VECTOR_FIELDS
+                )
+            return response['hits']['hits']
+        except Exception as e:
+            print(f"Error retrieving documents: {e}")
+            return []
+
+    async def read_review_by_appid(self, appid):
+        try:
+            async with self.pool:
+                response = await self.es.search(
+                    index=self.index_name, query={"term": {"appid": appid}}, source_excludes=VECTOR_FIELDS
+                )
+            return response['hits']['hits']
+        except Exception as e:
+            print(f"Error retrieving document with appid {appid}: {e}")
+            return []
+
+    async def read_titles(self):
+        async with self.pool:
+            response = await self.es.search(index=self.index_name, size=0, aggs=self.build_titles_aggregation())
+        return self.titles_from_aggregation(response)
+
+    async def iter_hits(self, query, page_size=READ_PAGE_SIZE, source_fields=None, keep_alive=READ_KEEP_ALIVE):
+        async with self.pool:
+            pit_id = (await self.es.open_point_in_time(index=self.index_name, keep_alive=keep_alive))["id"]
+        source = source_fields if source_fields is not None else {"excludes": VECTOR_FIELDS}
+        search_after = None
+        try:
+            while True:
+                page = {"search_after": search_after} if search_after is not None else {}
+                async with self.pool:
+                    response = await self.es.search(
+                        pit={"id": pit_id, "keep_alive": keep_alive},
+                        query=query,
+                        size=page_size,
+                        sort=["_shard_doc"],
+                        source=source,
+                        track_total_hits=False,
+                        **page,
+                    )
+                pit_id = response.get("pit_id", pit_id)
+                hits = response["hits"]["hits"]
+                for hit in hits:
+                    yield hit
+                if len(hits) < page_size:
+                    break
+                search_after = hits[-1]["sort"]
+        finally:
+            try:
+                async with self.pool:
+                    await self.es.close_point_in_time(id=pit_id)
+            except Exception as e:
+                print(f"Error closing point in time: {e}")
+
+    def iter_all_reviews(self, page_size=READ_PAGE_SIZE, source_fields=None):
+        return self.iter_hits({"match_all": {}}, page_size=page_size, source_fields=source_fields)
+
+    def iter_reviews_by_appid(self, appid, page_size=READ_PAGE_SIZE, source_fields=None):
+        return self.iter_hits({"term": {"appid": appid}}, page_size=page_size, source_fields=source_fields)
+
+    async def read_reviews_knn(self, query, title, vector_field="answer_vector", num_results=5):
+        try:
+            await self.check_title_indices()
+            if self.model is None:
+                raise ValueError("Model for embedding generation is not initialized.")
+            # Encoding is CPU-bound, so it runs off the event loop
+            knn_vector = (await asyncio.to_thread(self.model.encode, query)).tolist()
+            async with self.pool:
+                es_results = await self.es.search(
+                    **self.search_target(title),
+                    query={"knn": self.build_knn_query(vector_field, knn_vector, title, num_results)},
+                    source=self.source_fields,
+                )
+            return [hit['_source'] for hit in es_results['hits']['hits']]
+        except Exception as e:
+            print(f"Error executing KNN search: {e}")
+            return []
+
+    async def read_reviews_knn_and_keyword(self, field, query, vector, title, num_results=5, stats=None):
+        try:
+            await self.check_title_indices()
+            search_body = self.build_knn_and_keyword_search(field, query, vector, title, num_results)
+            async with self.pool:
+                es_results = await self.es.search(**self.search_target(title), **search_body)
+            if stats is not None:
+                stats["es_took"] = es_results["took"] / 1000
+            return [hit['_source'] for hit in es_results['hits']['hits']]
+        except Exception as e:
+            print(f"Error executing combined KNN and keyword search: {e}")
+            return []
+
+    async def read_reviews_knn_and_keyword_batch(self, field, queries, vectors, titles, num_results=5, stats=None,
+                                                 mode="hybrid", k=60, window_size=None):
+        await self.check_title_indices()
+        searches = self.build_batch_searches(field, queries, vectors, titles, num_results, mode, window_size)
+        try:
+            async with self.pool:
+                es_results = await self.es.msearch(searches=searches)
+        except Exception as e:
+            print(f"Error executing batched KNN and keyword search: {e}")
+            return [e] * len(queries)
+
+        if stats is not None:
+            stats["es_took"] = es_results["took"] / 1000
+        return self.parse_batch_responses(es_results["responses"], mode, k, num_results)
+
+    async def read_reviews_knn_and_keyword_rrf(self, field, query, vector, title, k=60, num_results=5, stats=None,
+                                               window_size=None, server_side=False):
+        window_size = max(window_size or num_results, num_results)
+        try:
+            await self.check_title_indices()
+            if server_side and self._server_rrf_supported is not False:
+                try:
+                    async with self.pool:
+                        response = await self.es.search(
+                            **self.search_target(title),
+                            **self.build_server_rrf_search(field, query, vector, title, k, num_results, window_size),
+                        )
+                    self._server_rrf_supported = True
+                    if stats is not None:
+                        stats["es_took"] = response["took"] / 1000
+                    return [hit['_source'] for hit in response['hits']['hits']]
+                except RRF_UNSUPPORTED_ERRORS as e:
+                    if self._server_rrf_supported:
+                        raise
+                    print(f"Server-side RRF unavailable, fusing client-side instead: {e}")
+                    self._server_rrf_supported = False
+
+            async with self.pool:
+                es_results = await self.es.msearch(
+                    searches=self.build_rrf_searches(field, query, vector, title, window_size)
+                )
+            if stats is not None:
+                stats["es_took"] = es_results["took"] / 1000
+            return self.parse_rrf_responses(es_results["responses"], k, num_results)
+
+        except Exception as e:
+            print(f"Error executing KNN and keyword search with RRF: {e}")
+            return []
@@ -0,0 +1,791 @@
+import os
+import json
+import time
+import random
+import argparse
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+MODEL_NAME = 'multi-qa-MiniLM-L6-cos-v1'
+GROUND_TRUTH_PATH = os.getenv(
+    "GROUND_TRUTH_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ground_truth_retrieval.json"),
+)
+
+
+def load_ground_truth(file_path=GROUND_TRUTH_PATH, limit=None, seed=42):
+    """Load ground-truth records, optionally as a reproducible random sample."""
+    print(f"Loading ground truth from {file_path}...")
+    with open(file_path, 'r', encoding='utf-8') as file:
+        records = json.load(file)
+    if limit is not None and limit < len(records):
+        records = random.Random(seed).sample(records, limit)
+    print(f"Loaded {len(records)} ground-truth records.")
+    return records
+
+
+def latency_summary(latencies):
+    """Return p50/p95/p99 of a list of latencies in seconds, as milliseconds."""
+    if not latencies:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+    return {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+
+def print_table(rows):
+    """Print a list of dicts as a fixed-width table."""
+    if not rows:
+        print("No results.")
+        return
+    columns = list(rows[0].keys())
+    formatted = [
+        [f"{row[col]:.2f}" if isinstance(row[col], float) else str(row[col]) for col in columns]
+        for row in rows
+    ]
+    widths = [max(len(col), *(len(r[i]) for r in formatted)) for i, col in enumerate(columns)]
+    print("  ".join(col.ljust(widths[i]) for i, col in enumerate(columns)))
+    for r in formatted:
+        print("  ".join(value.ljust(widths[i]) for i, value in enumerate(r)))
+
+
+def run_concurrent(encode_fn, questions, concurrency):
+    """Encode questions from `concurrency` threads; return wall time and per-call latencies."""
+    latencies = []
+    lock = threading.Lock()
+    chunks = [questions[i::concurrency] for i in range(concurrency)]
+
+    def worker(chunk):
+        local = []
+        for question in chunk:
+            started = time.perf_counter()
+            encode_fn(question)
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies
+
+
+def bench_batcher(args):
+    """Throughput and latency of single encodes versus the micro-batcher."""
+    from sentence_transformers import SentenceTransformer
+    from embedding_batcher import EmbeddingBatcher
+
+    questions = [r["question"] for r in load_ground_truth(args.ground_truth, limit=args.requests)]
+    model = SentenceTransformer(MODEL_NAME)
+    model.encode(questions[:8])  # warm up
+
+    batcher = EmbeddingBatcher(model, max_batch_size=args.max_batch_size, max_wait_us=args.max_wait_us)
+    modes = {
+        "single": model.encode,
+        "batched": batcher.encode,
+    }
+
+    rows = []
+    for concurrency in args.concurrency:
+        for mode, encode_fn in modes.items():
+            elapsed, latencies = run_concurrent(encode_fn, questions, concurrency)
+            rows.append({
+                "mode": mode,
+                "concurrency": concurrency,
+                "throughput_qps": len(questions) / elapsed,
+                **latency_summary(latencies),
+            })
+            print(f"{mode} @ {concurrency}: {len(questions) / elapsed:.1f} q/s")
+
+    print_table(rows)
+    print(f"Batcher stats: {batcher.stats()}")
+
+
+def bench_embedder(args):
+    """Parity and latency of the ONNX embedder backends against the torch model."""
+    from embedder import load_embedder
+
+    records = load_ground_truth(args.ground_truth, limit=args.limit)
+    texts = [r["question"] for r in records]
+    texts += [f"{r['question']} {r['answer']}" for r in records if r.get("answer")]
+
+    reference = None
+    rows = []
+    failed = False
+    for backend in args.backends:
+        embedder = load_embedder(MODEL_NAME, backend=backend)
+        embedder.encode(texts[:8])  # warm up
+
+        latencies = []
+        for text in texts[:args.single_requests]:
+            started = time.perf_counter()
+            embedder.encode(text)
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        vectors = np.asarray(embedder.encode(texts, batch_size=args.batch_size), dtype=np.float32)
+        elapsed = time.perf_counter() - started
+
+        if reference is None:
+            reference = vectors
+        # Vectors are L2-normalized, so the row-wise dot product is the cosine similarity
+        cosines = np.sum(reference * vectors, axis=1)
+        passed = bool(cosines.min() >= args.min_cosine)
+        failed = failed or not passed
+        rows.append({
+            "backend": backend,
+            "throughput_tps": len(texts) / elapsed,
+            **latency_summary(latencies),
+            "min_cosine": float(cosines.min()),
+            "mean_cosine": float(cosines.mean()),
+            "parity": "PASS" if passed else "FAIL",
+        })
+
+    print_table(rows)
+    if failed:
+        raise SystemExit(f"Embedding parity below {args.min_cosine} against '{args.backends[0]}'")
+
+
+def project_queries(reader, vectors):
+    """Reduce query vectors with the projection the reader's index was built with, if any (see projection.py)."""
+    from projection import load_projection
+
+    version = reader.index_projection()
+    if not version:
+        return vectors
+    projected = load_projection(version).transform(np.asarray(vectors, dtype=np.float32))
+    return projected if isinstance(vectors, np.ndarray) else projected.tolist()
+
+
+def is_relevant(record, document):
+    """A result is relevant when it is the document the ground-truth question was generated for."""
+    if document.get("document_id") is not None and record.get("document_id") is not None:
+        return document["document_id"] == record["document_id"]
+    # Indices built before document_id was stored: fall back to the question text
+    return document.get("question") == record["question"]
+
+
+def ranking_metrics(records, results):
+    """Hit rate and MRR over the ranked results of each ground-truth record."""
+    hits = 0
+    reciprocal_ranks = 0.0
+    for record, documents in zip(records, results):
+        for rank, document in enumerate(documents):
+            if is_relevant(record, document):
+                hits += 1
+                reciprocal_ranks += 1 / (rank + 1)
+                break
+    return {
+        "hit_rate": hits / len(records) if records else 0.0,
+        "mrr": reciprocal_ranks / len(records) if records else 0.0,
+    }
+
+
+def bench_retrieval(args):
+    """Latency and quality of the hybrid search versus single-round-trip RRF."""
+    from embedder import load_embedder
+    from read import ReviewReader
+
+    records = load_ground_truth(args.ground_truth, limit=args.limit)
+    questions = [r["question"] for r in records]
+    titles = [r["review"]["title"] for r in records]
+    # Embed up front so only the search is timed
+    vectors = load_embedder(MODEL_NAME).encode(questions, batch_size=64)
+
+    reader = ReviewReader()
+    vectors = project_queries(reader, vectors)
+    field = "question_answer_vector"
+    modes = {
+        "hybrid": lambda q, v, t, stats: reader.read_reviews_knn_and_keyword(
+            field=field, query=q, title=t, vector=v, num_results=args.num_results, stats=stats),
+        "rrf": lambda q, v, t, stats: reader.read_reviews_knn_and_keyword_rrf(
+            field=field, query=q, title=t, vector=v, num_results=args.num_results, stats=stats,
+            window_size=args.window_size),
+        "rrf-server": lambda q, v, t, stats: reader.read_reviews_knn_and_keyword_rrf(
+            field=field, query=q, title=t, vector=v, num_results=args.num_results, stats=stats,
+            window_size=args.window_size, server_side=True),
+    }
+
+    rows = []
+    for mode in args.modes:
+        search_fn = modes[mode]
+        search_fn(questions[0], vectors[0], titles[0], {})  # warm up
+
+        latencies = []
+        es_took = []
+        results = []
+        for question, vector, title in zip(questions, vectors, titles):
+            stats = {}
+            started = time.perf_counter()
+            results.append(search_fn(question, vector, title, stats))
+            latencies.append(time.perf_counter() - started)
+            es_took.append(stats.get("es_took", 0.0))
+
+        rows.append({
+            "mode": mode,
+            **latency_summary(latencies),
+            "es_took_p50_ms": float(np.percentile(es_took, 50) * 1000),
+            **ranking_metrics(records, results),
+        })
+
+    print_table(rows)
+    if "rrf-server" in args.modes and reader._server_rrf_supported is False:
+        print("Note: the cluster rejected server-side RRF; 'rrf-server' fell back to client-side fusion.")
+
+
+def bench_payload(args):
+    """Response bytes and JSON decode time of search responses with and without _source projection."""
+    import urllib.request
+    from embedder import load_embedder
+    from read import ReviewReader, ELASTIC_URL
+
+    records = load_ground_truth(args.ground_truth, limit=args.limit)
+    questions = [r["question"] for r in records]
+    titles = [r["review"]["title"] for r in records]
+    vectors = load_embedder(MODEL_NAME).encode(questions, batch_size=64)
+
+    reader = ReviewReader()
+    vectors = project_queries(reader, vectors)
+    url = f"{ELASTIC_URL.rstrip('/')}/{reader.index_name}/_search"
+
+    rows = []
+    for mode in ("full", "projected"):
+        response_bytes = []
+        decode_times = []
+        latencies = []
+        for question, vector, title in zip(questions, vectors, titles):
+            body = reader.build_knn_and_keyword_search(
+                "question_answer_vector", question, vector.tolist(), title, args.num_results
+            )
+            if mode == "full":
+                del body["_source"]  # the previous behaviour: every field, vectors included
+            request = urllib.request.Request(
+                url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}
+            )
+            started = time.perf_counter()
+            with urllib.request.urlopen(request) as response:
+                raw = response.read()
+            latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            json.loads(raw)
+            decode_times.append(time.perf_counter() - started)
+            response_bytes.append(len(raw))
+
+        rows.append({
+            "mode": mode,
+            "mean_kb": float(np.mean(response_bytes) / 1024),
+            "decode_p50_ms": float(np.percentile(decode_times, 50) * 1000),
+            "decode_p95_ms": float(np.percentile(decode_times, 95) * 1000),
+            **latency_summary(latencies),
+        })
+
+    print_table(rows)
+
+
+def sweep_num_candidates(reader, records, vectors, candidates, num_results):
+    """Run a pure kNN search per record for each num_candidates value; one result row per value."""
+    rows = []
+    for value in candidates:
+        reader.knn_settings = {"default": value, "titles": {}}
+        took = []
+        results = []
+        for record, vector in zip(records, vectors):
+            response = reader.es.search(
+                **reader.search_target(record["review"]["title"]),
+                knn=reader.build_knn_query("question_answer_vector", vector, record["review"]["title"], num_results),
+                size=num_results,
+                source=reader.source_fields,
+            )
+            took.append(response["took"] / 1000)
+            results.append([hit["_source"] for hit in response["hits"]["hits"]])
+        took_ms = np.asarray(took) * 1000
+        rows.append({
+            "num_candidates": value,
+            **ranking_metrics(records, results),
+            "took_p50_ms": float(np.percentile(took_ms, 50)),
+            "took_p95_ms": float(np.percentile(took_ms, 95)),
+        })
+    return rows
+
+
+def choose_num_candidates(rows, tolerance):
+    """Smallest num_candidates whose hit rate is within tolerance of the best one."""
+    best = max(row["hit_rate"] for row in rows)
+    eligible = [row for row in rows if row["hit_rate"] >= best - tolerance]
+    return min(row["num_candidates"] for row in eligible)
+
+
+def tune_knn(args):
+    """Sweep kNN num_candidates on the ground truth and optionally save the chosen settings."""
+    from embedder import load_embedder
+    from read import ReviewReader, KNN_SETTINGS_PATH
+
+    records = load_ground_truth(args.ground_truth, limit=args.limit)
+    vectors = load_embedder(MODEL_NAME).encode([r["question"] for r in records], batch_size=64).tolist()
+    reader = ReviewReader()
+    vectors = project_queries(reader, vectors)
+
+    rows = sweep_num_candidates(reader, records, vectors, args.candidates, args.num_results)
+    print_table(rows)
+    settings = {"default": choose_num_candidates(rows, args.tolerance), "titles": {}}
+    print(f"Chosen default num_candidates: {settings['default']}")
+
+    if args.per_title:
+        by_title = {}
+        for record, vector in zip(records, vectors):
+            by_title.setdefault(record["review"]["title"], []).append((record, vector))
+        for title, pairs in sorted(by_title.items()):
+            if len(pairs) < args.min_title_queries:
+                print(f"Skipping '{title}': only {len(pairs)} ground-truth questions")
+                continue
+            title_rows = sweep_num_candidates(
+                reader, [p[0] for p in pairs], [p[1] for p in pairs], args.candidates, args.num_results
+            )
+            settings["titles"][title] = choose_num_candidates(title_rows, args.tolerance)
+            print(f"{title}: num_candidates {settings['titles'][title]}")
+
+    if args.save:
+        output = args.output or KNN_SETTINGS_PATH
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(settings, file, indent=2)
+        print(f"Saved kNN settings to {output}")
+
+
+def bench_local(args):
+    """Latency and quality of the local memory-mapped index versus Elasticsearch."""
+    from embedder import load_embedder
+    from read import ReviewReader
+    from local_index import LocalReviewReader, build_local_index
+
+    records = load_ground_truth(args.ground_truth, limit=args.limit)
+    questions = [r["question"] for r in records]
+    titles = [r["review"]["title"] for r in records]
+    vectors = load_embedder(MODEL_NAME).encode(questions, batch_size=64)
+
+    if args.build:
+        build_local_index()
+    readers = {"elasticsearch": ReviewReader(), "local": LocalReviewReader()}
+    vectors = project_queries(readers["elasticsearch"], vectors)
+    field = "question_answer_vector"
+
+    rows = []
+    reference = {}
+    for mode in args.modes:
+        for backend, reader in readers.items():
+            if mode == "rrf":
+                search_fn = lambda q, v, t: reader.read_reviews_knn_and_keyword_rrf(
+                    field=field, query=q, title=t, vector=v, num_results=args.num_results)
+            else:
+                search_fn = lambda q, v, t: reader.read_reviews_knn_and_keyword(
+                    field=field, query=q, title=t, vector=v, num_results=args.num_results)
+            search_fn(questions[0], vectors[0].tolist(), titles[0])  # warm up
+
+            latencies = []
+            results = []
+            for question, vector, title in zip(questions, vectors, titles):
+                started = time.perf_counter()
+                results.append(search_fn(question, vector.tolist(), title))
+                latencies.append(time.perf_counter() - started)
+
+            # Share of the Elasticsearch results the local backend also returns
+            ids = [[d.get("document_id") for d in documents] for documents in results]
+            if backend == "elasticsearch":
+                reference[mode] = ids
+            overlap = np.mean([
+                len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(ids, reference[mode])
+            ])
+            rows.append({
+                "backend": backend,
+                "mode": mode,
+                **latency_summary(latencies),
+                **ranking_metrics(records, results),
+                "overlap": float(overlap),
+            })
+
+    print_table(rows)
+
+
+def bench_async(args):
+    """Hybrid search throughput of ReviewReader on a thread pool versus AsyncReviewReader on one event loop."""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from embedder import load_embedder
+    from read import ReviewReader
+    from async_read import AsyncReviewReader
+
+    records = load_ground_truth(args.ground_truth, limit=args.limit)
+    questions = [r["question"] for r in records]
+    titles = [r["review"]["title"] for r in records]
+    vectors = load_embedder(MODEL_NAME).encode(questions, batch_size=64).tolist()
+    field = "question_answer_vector"
+
+    sync_reader = ReviewReader()
+    vectors = project_queries(sync_reader, vectors)
+
+    def search_sync(i):
+        started = time.perf_counter()
+        sync_reader.read_reviews_knn_and_keyword(field, questions[i], vectors[i], titles[i], args.num_results)
+        return time.perf_counter() - started
+
+    async def run_async(concurrency):
+        reader = AsyncReviewReader(connections=args.connections)
+        await reader.check_connection()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def search(i):
+            async with slots:
+                started = time.perf_counter()
+                await reader.read_reviews_knn_and_keyword(field, questions[i], vectors[i], titles[i], args.num_results)
+                return time.perf_counter() - started
+
+        try:
+            await search(0)  # warm up
+            started = time.perf_counter()
+            latencies = await asyncio.gather(*(search(i) for i in range(len(questions))))
+            return time.perf_counter() - started, latencies, reader.stats()
+        finally:
+            await reader.close()
+
+    search_sync(0)  # warm up
+    rows = []
+    for concurrency in args.concurrency:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            latencies = list(pool.map(search_sync, range(len(questions))))
+            elapsed = time.perf_counter() - started
+        rows.append({
+            "mode": "sync-threads",
+            "concurrency": concurrency,
+            "threads": concurrency,
+            "throughput_qps": len(questions) / elapsed,
+            **latency_summary(latencies),
+            "peak_in_flight": concurrency,
+        })
+
+        elapsed, latencies, pool_stats = asyncio.run(run_async(concurrency))
+        rows.append({
+            "mode": "async",
+            "concurrency": concurrency,
+            "threads": 1,
+            "throughput_qps": len(questions) / elapsed,
+            **latency_summary(latencies),
+            "peak_in_flight": pool_stats["peak_in_flight"],
+        })
+        print(f"Async pool @ {concurrency}: {pool_stats}")
+
+    print_table(rows)
+
+
+def replicate_titles(documents, n_titles):
+    """Copy prepared documents under renamed titles until there are at least n_titles titles."""
+    titles = sorted({doc["title"] for doc in documents})
+    copies = max(1, -(-n_titles // len(titles)))
+    replicated = []
+    for copy in range(copies):
+        for doc in documents:
+            replicated.append(doc if copy == 0 else {
+                **doc, "title": f"{doc['title']} ({copy})", "document_key": f"{doc['document_key']}-{copy}",
+            })
+    return replicated, len(titles) * copies
+
+
+def bench_partitioning(args):
+    """Hybrid search latency per index layout (single, routed, per-title) as the number of titles grows."""
+    from embedder import load_embedder
+    from prep import ReviewIndexer
+    from read import ReviewReader
+
+    records = load_ground_truth(args.ground_truth, limit=args.limit)
+    questions = [r["question"] for r in records]
+    titles = [r["review"]["title"] for r in records]
+    model = load_embedder(MODEL_NAME)
+    vectors = model.encode(questions, batch_size=64).tolist()
+
+    documents = None
+    rows = []
+    for layout in args.layouts:
+        index_name = f"{args.index_prefix}-{layout}"
+        for n_titles in sorted(args.titles):
+            indexer = ReviewIndexer(index_name=index_name, model=model, layout=layout, shards=args.shards,
+                                    projection_dims=0)
+            if documents is None:
+                # Embedded once; every layout and size indexes the same vectors
+                documents = list(indexer.prepare_documents(records, indexer.encode_corpus(records)))
+            replicated, title_count = replicate_titles(documents, n_titles)
+            indexer.begin_version()
+            indexer.index_documents(replicated)
+            indexer.publish_version(warm=False)
+
+            # Only the original titles are queried; the copies grow the index around them
+            reader = ReviewReader(index_name=index_name, model=model, layout=layout)
+            reader.read_reviews_knn_and_keyword("question_answer_vector", questions[0], vectors[0], titles[0])
+            latencies = []
+            es_took = []
+            for question, vector, title in zip(questions, vectors, titles):
+                stats = {}
+                started = time.perf_counter()
+                reader.read_reviews_knn_and_keyword(
+                    "question_answer_vector", question, vector, title, args.num_results, stats=stats
+                )
+                latencies.append(time.perf_counter() - started)
+                es_took.append(stats.get("es_took", 0.0))
+
+            rows.append({
+                "layout": layout,
+                "titles": title_count,
+                "documents": len(replicated),
+                **latency_summary(latencies),
+                "es_took_p50_ms": float(np.percentile(es_took, 50) * 1000),
+                "es_took_p95_ms": float(np.percentile(es_took, 95) * 1000),
+            })
+            print(f"{layout} with {title_count} titles: p50 {rows[-1]['p50_ms']:.1f} ms")
+            if not args.keep:
+                indexer.drop_index()
+
+    print_table(rows)
+
+
+def index_bytes(es, index_name):
+    """Primary store size of an index (or alias), and the bytes of its kNN vector data when the cluster reports it."""
+    stats = es.indices.stats(index=index_name, metric="store")
+    store = stats["_all"]["primaries"]["store"]["size_in_bytes"]
+    try:
+        usage = es.indices.disk_usage(index=index_name, run_expensive_tasks=True)
+        knn = sum(
+            entry["all_fields"].get("knn_vectors_in_bytes", 0)
+            for name, entry in usage.items() if name != "_shards"
+        )
+    except Exception as e:
+        print(f"Disk usage analysis unavailable: {e}")
+        knn = None
+    return store, knn
+
+
+def bench_profiles(args):
+    """Index size, build time and hybrid search latency per vector-field profile (see INDEX_PROFILES)."""
+    from embedder import load_embedder
+    from prep import ReviewIndexer
+    from read import ReviewReader
+
+    records = load_ground_truth(args.ground_truth, limit=args.limit)
+    questions = [r["question"] for r in records]
+    titles = [r["review"]["title"] for r in records]
+    model = load_embedder(MODEL_NAME)
+    vectors = model.encode(questions, batch_size=64).tolist()
+
+    rows = []
+    for profile in args.profiles:
+        index_name = f"{args.index_prefix}-{profile}"
+        indexer = ReviewIndexer(index_name=index_name, model=model, profile=profile, projection_dims=0)
+        # Each profile embeds only its own fields, which is part of its build time
+        indexer.begin_version()
+        report = indexer.index_reviews(records, force_merge=True)
+        indexer.publish_version(warm=False)
+        store_bytes, knn_bytes = index_bytes(indexer.es, index_name)
+
+        reader = ReviewReader(index_name=index_name, model=model)
+        reader.read_reviews_knn_and_keyword("question_answer_vector", questions[0], vectors[0], titles[0])
+        latencies = []
+        es_took = []
+        results = []
+        for question, vector, title in zip(questions, vectors, titles):
+            stats = {}
+            started = time.perf_counter()
+            results.append(reader.read_reviews_knn_and_keyword(
+                "question_answer_vector", question, vector, title, args.num_results, stats=stats
+            ))
+            latencies.append(time.perf_counter() - started)
+            es_took.append(stats.get("es_took", 0.0))
+
+        rows.append({
+            "profile": profile,
+            "fields": "+".join(field.replace("_vector", "") for field in indexer.vector_fields),
+            "store_mb": store_bytes / 2 ** 20,
+            "knn_mb": knn_bytes / 2 ** 20 if knn_bytes is not None else "n/a",
+            "encode_s": report["encode_seconds"],
+            "index_s": report["seconds"],
+            "build_s": report["total_seconds"],
+            **latency_summary(latencies),
+            "es_took_p50_ms": float(np.percentile(es_took, 50) * 1000),
+            **ranking_metrics(records, results),
+        })
+        print(f"{profile}: {rows[-1]['store_mb']:.1f} MiB, built in {rows[-1]['build_s']:.1f}s")
+        if not args.keep:
+            indexer.drop_index()
+
+    print_table(rows)
+
+
+def bench_projection(args):
+    """Hit rate, MRR, index size and kNN latency of PCA-projected vectors at each dimension (0 = full vectors)."""
+    from embedder import load_embedder
+    from prep import ReviewIndexer
+    from read import ReviewReader
+
+    corpus = load_ground_truth(args.ground_truth)
+    records = load_ground_truth(args.ground_truth, limit=args.limit)
+    model = load_embedder(MODEL_NAME)
+    vectors = model.encode([r["question"] for r in records], batch_size=64)
+
+    rows = []
+    for dims in args.dims:
+        index_name = f"{args.index_prefix}-{dims or 'full'}"
+        indexer = ReviewIndexer(index_name=index_name, model=model, profile="search", projection_dims=dims,
+                                refit_projection=True)
+        indexer.begin_version()
+        report = indexer.index_reviews(corpus, force_merge=True)
+        indexer.publish_version(warm=False)
+        store_bytes, knn_bytes = index_bytes(indexer.es, index_name)
+
+        # Queries are projected with the artifact the index was built with, as rag.search does
+        reader = ReviewReader(index_name=index_name)
+        queries = project_queries(reader, vectors)
+        reader.knn_settings = {"default": args.num_candidates, "titles": {}}
+
+        def knn_search(record, vector):
+            title = record["review"]["title"]
+            return reader.es.search(
+                **reader.search_target(title),
+                knn=reader.build_knn_query("question_answer_vector", vector, title, args.num_results),
+                size=args.num_results,
+                source=reader.source_fields,
+            )
+
+        knn_search(records[0], queries[0])  # warm up
+        latencies = []
+        took = []
+        results = []
+        for record, vector in zip(records, queries):
+            started = time.perf_counter()
+            response = knn_search(record, vector)
+            latencies.append(time.perf_counter() - started)
+            took.append(response["took"] / 1000)
+            results.append([hit["_source"] for hit in response["hits"]["hits"]])
+
+        projection = report["projection"]
+        rows.append({
+            "dims": indexer.dims,
+            "projection": projection["version"] if projection else "none",
+            "explained_variance": projection["explained_variance"] if projection else 1.0,
+            **ranking_metrics(records, results),
+            "store_mb": store_bytes / 2 ** 20,
+            "knn_mb": knn_bytes / 2 ** 20 if knn_bytes is not None else "n/a",
+            "build_s": report["total_seconds"],
+            **latency_summary(latencies),
+            "took_p50_ms": float(np.percentile(took, 50) * 1000),
+        })
+        print(f"{indexer.dims} dims: hit rate {rows[-1]['hit_rate']:.3f}, {rows[-1]['store_mb']:.1f} MiB")
+        if not args.keep:
+            indexer.drop_index()
+
+    print_table(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the reviews assistant")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH, help="Path to ground_truth_retrieval.json")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batcher_parser = subparsers.add_parser("batcher", help=bench_batcher.__doc__)
+    batcher_parser.add_argument("--requests", type=int, default=512)
+    batcher_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    batcher_parser.add_argument("--max-batch-size", type=int, default=32)
+    batcher_parser.add_argument("--max-wait-us", type=int, default=2000)
+    batcher_parser.set_defaults(func=bench_batcher)
+
+    embedder_parser = subparsers.add_parser("embedder", help=bench_embedder.__doc__)
+    embedder_parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"],
+                                 help="The first backend is the parity reference")
+    embedder_parser.add_argument("--limit", type=int, default=1000)
+    embedder_parser.add_argument("--single-requests", type=int, default=200)
+    embedder_parser.add_argument("--batch-size", type=int, default=32)
+    embedder_parser.add_argument("--min-cosine", type=float, default=0.99)
+    embedder_parser.set_defaults(func=bench_embedder)
+
+    retrieval_parser = subparsers.add_parser("retrieval", help=bench_retrieval.__doc__)
+    retrieval_parser.add_argument("--modes", nargs="+", default=["hybrid", "rrf", "rrf-server"],
+                                  choices=["hybrid", "rrf", "rrf-server"])
+    retrieval_parser.add_argument("--limit", type=int, default=500)
+    retrieval_parser.add_argument("--num-results", type=int, default=5)
+    retrieval_parser.add_argument("--window-size", type=int, default=None,
+                                  help="Candidates per RRF sub-search (default: num results)")
+    retrieval_parser.set_defaults(func=bench_retrieval)
+
+    payload_parser = subparsers.add_parser("payload", help=bench_payload.__doc__)
+    payload_parser.add_argument("--limit", type=int, default=200)
+    payload_parser.add_argument("--num-results", type=int, default=5)
+    payload_parser.set_defaults(func=bench_payload)
+
+    tune_parser = subparsers.add_parser("tune-knn", help=tune_knn.__doc__)
+    tune_parser.add_argument("--limit", type=int, default=1000)
+    tune_parser.add_argument("--num-results", type=int, default=5)
+    tune_parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 50, 100, 200, 500, 1000, 10000])
+    tune_parser.add_argument("--tolerance", type=float, default=0.005,
+                             help="Accepted hit-rate loss against the best value")
+    tune_parser.add_argument("--per-title", action="store_true", help="Also tune each title separately")
+    tune_parser.add_argument("--min-title-queries", type=int, default=30)
+    tune_parser.add_argument("--save", action="store_true", help="Write the chosen settings for ReviewReader")
+    tune_parser.add_argument("--output", default=None, help="Default: read.KNN_SETTINGS_PATH")
+    tune_parser.set_defaults(func=tune_knn)
+
+    local_parser = subparsers.add_parser("local", help=bench_local.__doc__)
+    local_parser.add_argument("--modes", nargs="+", default=["hybrid", "rrf"], choices=["hybrid", "rrf"])
+    local_parser.add_argument("--limit", type=int, default=500)
+    local_parser.add_argument("--num-results", type=int, default=5)
+    local_parser.add_argument("--build", action="store_true", help="Rebuild the local index from Elasticsearch first")
+    local_parser.set_defaults(func=bench_local)
+
+    async_parser = subparsers.add_parser("async", help=bench_async.__doc__)
+    async_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    async_parser.add_argument("--connections", type=int, default=16, help="Connection pool size of the async client")
+    async_parser.add_argument("--limit", type=int, default=500)
+    async_parser.add_argument("--num-results", type=int, default=5)
+    async_parser.set_defaults(func=bench_async)
+
+    partitioning_parser = subparsers.add_parser("partitioning", help=bench_partitioning.__doc__)
+    partitioning_parser.add_argument("--layouts", nargs="+", default=["single", "routed", "per-title"],
+                                     choices=["single", "routed", "per-title"])
+    partitioning_parser.add_argument("--titles", type=int, nargs="+", default=[20, 100, 200],
+                                     help="Title counts to reach by copying the corpus under new titles")
+    partitioning_parser.add_argument("--limit", type=int, default=500)
+    partitioning_parser.add_argument("--num-results", type=int, default=5)
+    partitioning_parser.add_argument("--shards", type=int, default=4, help="Primary shards of the routed layout")
+    partitioning_parser.add_argument("--index-prefix", default="bench-partitioning",
+                                     help="Benchmark indices are created and dropped under this name")
+    partitioning_parser.add_argument("--keep", action="store_true", help="Keep the benchmark indices afterwards")
+    partitioning_parser.set_defaults(func=bench_partitioning)
+
+    profiles_parser = subparsers.add_parser("profiles", help=bench_profiles.__doc__)
+    profiles_parser.add_argument("--profiles", nargs="+", default=["full", "stored", "search"],
+                                 choices=["full", "stored", "search"])
+    profiles_parser.add_argument("--limit", type=int, default=None, help="Index a random sample of the ground truth")
+    profiles_parser.add_argument("--num-results", type=int, default=5)
+    profiles_parser.add_argument("--index-prefix", default="bench-profiles",
+                                 help="Benchmark indices are created and dropped under this name")
+    profiles_parser.add_argument("--keep", action="store_true", help="Keep the benchmark indices afterwards")
+    profiles_parser.set_defaults(func=bench_profiles)
+
+    projection_parser = subparsers.add_parser("projection", help=bench_projection.__doc__)
+    projection_parser.add_argument("--dims", type=int, nargs="+", default=[0, 256, 128, 64, 32],
+                                   help="Projected dimensions; 0 indexes the full vectors")
+    projection_parser.add_argument("--limit", type=int, default=1000, help="Ground-truth questions to search")
+    projection_parser.add_argument("--num-results", type=int, default=5)
+    projection_parser.add_argument("--num-candidates", type=int, default=100)
+    projection_parser.add_argument("--index-prefix", default="bench-projection",
+                                   help="Benchmark indices are created and dropped under this name")
+    projection_parser.add_argument("--keep", action="store_true", help="Keep the benchmark indices afterwards")
+    projection_parser.set_defaults(func=bench_projection)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# test_index_mapping.py is a manual check against a running Elasticsearch, not a pytest module
+collect_ignore = ["test_index_mapping.py"]
@@ -1,7 +1,8 @@
 import os
+import argparse
 from dotenv import load_dotenv
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2.extras import DictCursor, execute_values
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -38,17 +39,25 @@ def get_db_connection():
         raise
 
 
-def init_db():
+def init_db(reset=False):
+    """Create the tables that do not exist yet; existing tables and their rows are kept.
+
+    With reset, every table is dropped first, which deletes the conversation
+    history and the evaluation queue. Only `python db.py --reset` does that.
+    """
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            print("Dropping tables if they exist...")
-            cur.execute("DROP TABLE IF EXISTS feedback")
-            cur.execute("DROP TABLE IF EXISTS conversations")
+            if reset:
+                print("Dropping tables if they exist...")
+                cur.execute("DROP TABLE IF EXISTS evaluation_queue")
+                cur.execute("DROP TABLE IF EXISTS stage_timings")
+                cur.execute("DROP TABLE IF EXISTS feedback")
+                cur.execute("DROP TABLE IF EXISTS conversations")
 
-            print("Creating tables...")
+            print("Creating missing tables...")
             cur.execute("""
-                CREATE TABLE conversations (
+                CREATE TABLE IF NOT EXISTS conversations (
                     id TEXT PRIMARY KEY,
                     question TEXT NOT NULL,
                     answer TEXT NOT NULL,
@@ -67,14 +76,43 @@ def init_db():
                 )
             """)
             cur.execute("""
-                CREATE TABLE feedback (
+                CREATE TABLE IF NOT EXISTS feedback (
                     id SERIAL PRIMARY KEY,
                     conversation_id TEXT REFERENCES conversations(id),
                     feedback INTEGER NOT NULL,
                     timestamp TIMESTAMP WITH TIME ZONE NOT NULL
                 )
             """)
-            print("Tables created successfully.")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stage_timings (
+                    id SERIAL PRIMARY KEY,
+                    conversation_id TEXT REFERENCES conversations(id),
+                    stage TEXT NOT NULL,
+                    duration FLOAT NOT NULL,
+                    timestamp TIMESTAMP WITH TIME ZONE NOT NULL
+                )
+            """)
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS stage_timings_stage_timestamp_idx ON stage_timings (stage, timestamp)"
+            )
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS evaluation_queue (
+                    id SERIAL PRIMARY KEY,
+                    conversation_id TEXT REFERENCES conversations(id),
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    model_used TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    enqueued_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                    locked_at TIMESTAMP WITH TIME ZONE
+                )
+            """)
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS evaluation_queue_status_idx ON evaluation_queue (status, id)"
+            )
+            print("Tables are ready.")
         conn.commit()
     except Exception as e:
         print(f"Error initializing database: {e}")
@@ -82,6 +120,25 @@ def init_db():
     finally:
         conn.close()
 
+def conversation_row(conversation_id, question, answer_data, timestamp):
+    return (
+        conversation_id,
+        question,
+        answer_data["answer"],
+        answer_data["model_used"],
+        answer_data["response_time"],
+        answer_data["relevance"],
+        answer_data["relevance_explanation"],
+        answer_data["prompt_tokens"],
+        answer_data["completion_tokens"],
+        answer_data["total_tokens"],
+        answer_data["eval_prompt_tokens"],
+        answer_data["eval_completion_tokens"],
+        answer_data["eval_total_tokens"],
+        answer_data["openai_cost"],
+        timestamp,
+    )
+
 def save_conversation(conversation_id, question, answer_data, timestamp=None):
     if timestamp is None:
         timestamp = datetime.now(tz)
@@ -97,24 +154,9 @@ def save_conversation(conversation_id, question, answer_data, timestamp=None):
                 eval_prompt_tokens, eval_completion_tokens, eval_total_tokens, openai_cost, timestamp)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """,
-                (
-                    conversation_id,
-                    question,
-                    answer_data["answer"],
-                    answer_data["model_used"],
-                    answer_data["response_time"],
-                    answer_data["relevance"],
-                    answer_data["relevance_explanation"],
-                    answer_data["prompt_tokens"],
-                    answer_data["completion_tokens"],
-                    answer_data["total_tokens"],
-                    answer_data["eval_prompt_tokens"],
-                    answer_data["eval_completion_tokens"],
-                    answer_data["eval_total_tokens"],
-                    answer_data["openai_cost"],
-                    timestamp,
-                ),
+                conversation_row(conversation_id, question, answer_data, timestamp),
             )
+            insert_stage_timings(cur, conversation_id, answer_data.get("timings", {}), timestamp)
         conn.commit()
         print(f"Conversation {conversation_id} saved successfully.")
     except Exception as e:
@@ -122,6 +164,56 @@ def save_conversation(conversation_id, question, answer_data, timestamp=None):
     finally:
         conn.close()
 
+def save_conversations(conversations, timestamp=None):
+    """Bulk-insert (conversation_id, question, answer_data) tuples in one transaction."""
+    if not conversations:
+        return
+    if timestamp is None:
+        timestamp = datetime.now(tz)
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO conversations 
+                (id, question, answer, model_used, response_time, relevance, 
+                relevance_explanation, prompt_tokens, completion_tokens, total_tokens, 
+                eval_prompt_tokens, eval_completion_tokens, eval_total_tokens, openai_cost, timestamp)
+                VALUES %s
+            """,
+                [
+                    conversation_row(conversation_id, question, answer_data, timestamp)
+                    for conversation_id, question, answer_data in conversations
+                ],
+            )
+            execute_values(
+                cur,
+                "INSERT INTO stage_timings (conversation_id, stage, duration, timestamp) VALUES %s",
+                [
+                    (conversation_id, stage, duration, timestamp)
+                    for conversation_id, _, answer_data in conversations
+                    for stage, duration in answer_data.get("timings", {}).items()
+                ],
+            )
+        conn.commit()
+        print(f"{len(conversations)} conversations saved successfully.")
+    except Exception as e:
+        print(f"Error saving {len(conversations)} conversations: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+def insert_stage_timings(cur, conversation_id, timings, timestamp):
+    """Insert one stage_timings row per measured stage (durations in seconds)."""
+    if not timings:
+        return
+    cur.executemany(
+        "INSERT INTO stage_timings (conversation_id, stage, duration, timestamp) VALUES (%s, %s, %s, %s)",
+        [(conversation_id, stage, duration, timestamp) for stage, duration in timings.items()],
+    )
+
 def save_feedback(conversation_id, feedback, timestamp=None):
     if timestamp is None:
         timestamp = datetime.now(tz)
@@ -139,3 +231,206 @@ def save_feedback(conversation_id, feedback, timestamp=None):
         print(f"Error saving feedback for conversation {conversation_id}: {e}")
     finally:
         conn.close()
+
+def enqueue_evaluation(conversation_id, question, answer, model_used, max_depth, timestamp=None):
+    """Queue a conversation for relevance evaluation.
+
+    Returns False (and marks the conversation as SKIPPED) when the queue
+    already holds max_depth pending jobs. The table is locked like in
+    enqueue_evaluations, so concurrent requests cannot overfill the queue.
+    """
+    if timestamp is None:
+        timestamp = datetime.now(tz)
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("LOCK TABLE evaluation_queue IN SHARE ROW EXCLUSIVE MODE")
+            cur.execute("SELECT COUNT(*) FROM evaluation_queue WHERE status IN ('queued', 'running')")
+            queued = cur.fetchone()[0] < max_depth
+            if queued:
+                cur.execute(
+                    """
+                    INSERT INTO evaluation_queue
+                    (conversation_id, question, answer, model_used, status, enqueued_at)
+                    VALUES (%s, %s, %s, %s, 'queued', %s)
+                """,
+                    (conversation_id, question, answer, model_used, timestamp),
+                )
+            else:
+                cur.execute(
+                    "UPDATE conversations SET relevance = %s, relevance_explanation = %s WHERE id = %s",
+                    ("SKIPPED", "Evaluation queue full", conversation_id),
+                )
+        conn.commit()
+        if queued:
+            print(f"Evaluation for conversation {conversation_id} queued.")
+        else:
+            print(f"Evaluation queue full, skipping conversation {conversation_id}.")
+        return queued
+    except Exception as e:
+        print(f"Error queueing evaluation for conversation {conversation_id}: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+def enqueue_evaluations(jobs, max_depth, timestamp=None):
+    """Queue many (conversation_id, question, answer, model_used) jobs at once.
+
+    Jobs beyond the free queue capacity are not queued and their
+    conversations are marked as SKIPPED. Returns the number of queued jobs.
+    """
+    if not jobs:
+        return 0
+    if timestamp is None:
+        timestamp = datetime.now(tz)
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("LOCK TABLE evaluation_queue IN SHARE ROW EXCLUSIVE MODE")
+            cur.execute("SELECT COUNT(*) FROM evaluation_queue WHERE status IN ('queued', 'running')")
+            capacity = max(0, max_depth - cur.fetchone()[0])
+            queued, skipped = jobs[:capacity], jobs[capacity:]
+
+            if queued:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO evaluation_queue
+                    (conversation_id, question, answer, model_used, status, enqueued_at)
+                    VALUES %s
+                """,
+                    [job + ("queued", timestamp) for job in queued],
+                )
+            if skipped:
+                cur.execute(
+                    "UPDATE conversations SET relevance = %s, relevance_explanation = %s WHERE id = ANY(%s)",
+                    ("SKIPPED", "Evaluation queue full", [job[0] for job in skipped]),
+                )
+        conn.commit()
+        print(f"Queued {len(queued)} evaluations, skipped {len(skipped)}.")
+        return len(queued)
+    except Exception as e:
+        print(f"Error queueing {len(jobs)} evaluations: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+def claim_evaluation(visibility_timeout, max_attempts):
+    """Claim the oldest queued evaluation job.
+
+    Jobs left in the running state for longer than visibility_timeout seconds
+    (e.g. by a worker that was killed) are claimed again, unless they already
+    used max_attempts; those are parked as failed, so a job that keeps
+    killing its worker is not retried forever.
+    """
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=DictCursor) as cur:
+            now = datetime.now(tz)
+            cur.execute(
+                """
+                UPDATE evaluation_queue
+                SET status = 'failed', locked_at = NULL,
+                    last_error = COALESCE(last_error, 'Worker did not finish the job')
+                WHERE status = 'running' AND locked_at < %s - %s * INTERVAL '1 second'
+                  AND attempts >= %s
+            """,
+                (now, visibility_timeout, max_attempts),
+            )
+            if cur.rowcount:
+                print(f"Parked {cur.rowcount} evaluation jobs that ran out of attempts.")
+            cur.execute(
+                """
+                UPDATE evaluation_queue
+                SET status = 'running', attempts = attempts + 1, locked_at = %s
+                WHERE id = (
+                    SELECT id FROM evaluation_queue
+                    WHERE status = 'queued'
+                       OR (status = 'running' AND locked_at < %s - %s * INTERVAL '1 second'
+                           AND attempts < %s)
+                    ORDER BY id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, conversation_id, question, answer, model_used, attempts, enqueued_at
+            """,
+                (now, now, visibility_timeout, max_attempts),
+            )
+            job = cur.fetchone()
+        conn.commit()
+        return dict(job) if job else None
+    except Exception as e:
+        print(f"Error claiming evaluation job: {e}")
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+def complete_evaluation(job_id, conversation_id, evaluation_data):
+    """Store the evaluation result on the conversation and drop the job."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE conversations
+                SET relevance = %s, relevance_explanation = %s,
+                    eval_prompt_tokens = %s, eval_completion_tokens = %s, eval_total_tokens = %s,
+                    openai_cost = openai_cost + %s
+                WHERE id = %s
+            """,
+                (
+                    evaluation_data["relevance"],
+                    evaluation_data["relevance_explanation"],
+                    evaluation_data["eval_prompt_tokens"],
+                    evaluation_data["eval_completion_tokens"],
+                    evaluation_data["eval_total_tokens"],
+                    evaluation_data["openai_cost"],
+                    conversation_id,
+                ),
+            )
+            insert_stage_timings(
+                cur, conversation_id, evaluation_data.get("timings", {}), datetime.now(tz)
+            )
+            cur.execute("DELETE FROM evaluation_queue WHERE id = %s", (job_id,))
+        conn.commit()
+        print(f"Evaluation for conversation {conversation_id} saved successfully.")
+    except Exception as e:
+        print(f"Error saving evaluation for conversation {conversation_id}: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def fail_evaluation(job_id, error, max_attempts):
+    """Put a failed job back on the queue, or park it once it ran out of attempts."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE evaluation_queue
+                SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'queued' END,
+                    last_error = %s, locked_at = NULL
+                WHERE id = %s
+            """,
+                (max_attempts, str(error), job_id),
+            )
+        conn.commit()
+    except Exception as e:
+        print(f"Error releasing evaluation job {job_id}: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the PostgreSQL tables of the app")
+    parser.add_argument("--reset", action="store_true",
+                        help="Drop every table first, deleting all conversations, feedback and queued evaluations")
+    args = parser.parse_args()
+    init_db(reset=args.reset)
@@ -0,0 +1,165 @@
+import os
+import json
+import argparse
+import importlib.util
+import numpy as np
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+MODEL_NAME = 'multi-qa-MiniLM-L6-cos-v1'
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "torch")  # torch | onnx | onnx-int8
+EMBEDDER_ONNX_DIR = os.getenv(
+    "EMBEDDER_ONNX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "models"),
+)
+EMBEDDER_THREADS = int(os.getenv("EMBEDDER_THREADS", "0"))  # 0 lets PyTorch / ONNX Runtime decide
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def load_embedder(model_name=MODEL_NAME, backend=EMBEDDER_BACKEND, num_threads=EMBEDDER_THREADS):
+    """Return an object with a SentenceTransformer-compatible encode() for the chosen backend.
+
+    num_threads sets the intra-op CPU threads (for torch, process-wide); 0 keeps the default.
+    """
+    print(f"Loading embedder '{model_name}' with backend '{backend}'...")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        return SentenceTransformer(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbedder(model_name, quantized=backend == "onnx-int8", num_threads=num_threads)
+    raise ValueError(f"Unknown embedder backend '{backend}', expected one of {BACKENDS}")
+
+
+def export_onnx(model_name=MODEL_NAME, model_dir=EMBEDDER_ONNX_DIR, quantize=False):
+    """Export the transformer to ONNX once, optionally with a dynamic int8 copy.
+
+    Only the export needs PyTorch; the ONNX backend itself runs on
+    onnxruntime, tokenizers and NumPy. Returns the path of the requested model.
+    """
+    target = os.path.join(model_dir, model_name)
+    fp32_path = os.path.join(target, "model.onnx")
+    int8_path = os.path.join(target, "model-int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        # torch.onnx.export writes the model with the onnx package
+        if importlib.util.find_spec("onnx") is None:
+            raise ImportError("Exporting the ONNX embedder needs the onnx package (pipenv install)")
+
+        print(f"Exporting '{model_name}' to {fp32_path}...")
+        os.makedirs(target, exist_ok=True)
+        st_model = SentenceTransformer(model_name, device="cpu")
+        st_model.tokenizer.save_pretrained(target)
+
+        class TokenEmbeddings(torch.nn.Module):
+            def __init__(self, transformer):
+                super().__init__()
+                self.transformer = transformer
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.transformer(
+                    input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+                ).last_hidden_state
+
+        dummy = st_model.tokenizer(["Is the game worth the price?"], return_tensors="pt")
+        input_names = ["input_ids", "attention_mask", "token_type_ids"]
+        torch.onnx.export(
+            TokenEmbeddings(st_model[0].auto_model).eval(),
+            tuple(dummy[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["token_embeddings"]},
+            opset_version=14,
+        )
+        with open(os.path.join(target, "embedder.json"), "w") as file:
+            json.dump({
+                "model_name": model_name,
+                "max_seq_length": st_model.max_seq_length,
+                "dimension": st_model.get_sentence_embedding_dimension(),
+            }, file)
+        print("ONNX export complete.")
+
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        print(f"Quantizing {fp32_path} to {int8_path}...")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    return int8_path if quantize else fp32_path
+
+
+class OnnxEmbedder:
+    """ONNX Runtime version of the SentenceTransformer (mean pooling + L2 normalization)."""
+
+    def __init__(self, model_name=MODEL_NAME, quantized=False, model_dir=EMBEDDER_ONNX_DIR,
+                 num_threads=EMBEDDER_THREADS):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The ONNX embedder backend needs the onnxruntime package (pipenv install)") from e
+
+        model_path = export_onnx(model_name, model_dir, quantize=quantized)
+        target = os.path.dirname(model_path)
+        with open(os.path.join(target, "embedder.json")) as file:
+            config = json.load(file)
+        self.max_seq_length = config["max_seq_length"]
+        self.dimension = config["dimension"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(target, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        """Encode one text or a list of texts into normalized float32 vectors."""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            encodings = self.tokenizer.encode_batch(sentences[start:start + batch_size])
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": attention_mask,
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            token_embeddings = self.session.run(
+                None, {name: value for name, value in feeds.items() if name in self.input_names}
+            )[0]
+
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+
+        vectors = np.concatenate(batches) if batches else np.zeros((0, self.dimension), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX")
+    parser.add_argument("--model-name", default=MODEL_NAME)
+    parser.add_argument("--model-dir", default=EMBEDDER_ONNX_DIR)
+    parser.add_argument("--quantize", action="store_true", help="Also write a dynamic int8 model")
+    args = parser.parse_args()
+    print(export_onnx(args.model_name, args.model_dir, quantize=args.quantize))
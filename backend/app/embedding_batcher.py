@@ -0,0 +1,99 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+EMBED_BATCHING_ENABLED = os.getenv("EMBED_BATCHING_ENABLED", "1") == "1"
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_MAX_WAIT_US = int(os.getenv("EMBED_BATCH_MAX_WAIT_US", "2000"))
+
+
+class EmbeddingBatcher:
+    """Collect concurrent encode calls into batches for a single forward pass.
+
+    The first queued text opens a batch. The batch is sent to the model when
+    it holds max_batch_size texts or when max_wait_us microseconds have
+    passed, whichever comes first. Each caller blocks until its own vector is
+    ready.
+    """
+
+    def __init__(self, model, max_batch_size=EMBED_BATCH_MAX_SIZE, max_wait_us=EMBED_BATCH_MAX_WAIT_US):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1_000_000
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def encode(self, text):
+        """Return the embedding of a single text, batched with concurrent callers."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_us": int(self.max_wait * 1_000_000),
+            }
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so gunicorn workers start their own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "1") == "1"
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")  # empty keeps the cache in memory only
+
+# Rough per-entry bookkeeping cost on top of the vector and the key
+ENTRY_OVERHEAD_BYTES = 128
+
+
+def normalize_question(text):
+    """Collapse whitespace and case-fold a question so trivial variants share a key."""
+    return " ".join(text.split()).casefold()
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of float32 query vectors keyed by the normalized question.
+
+    When path is set, vectors are also written to a SQLite file. Every
+    gunicorn worker pointing at the same file can then reuse embeddings that
+    another worker computed. Disk entries are keyed by model_name, so pass a
+    name that also identifies the embedder backend (e.g. "model:onnx-int8").
+    """
+
+    def __init__(self, model_name, max_bytes=QUERY_CACHE_MAX_BYTES, path=QUERY_CACHE_PATH or None):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # normalized question -> vector, least recently used first
+        self._size = 0
+        self._local = threading.local()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.path:
+            self._create_table()
+
+    def get_or_encode(self, text, encode_fn):
+        """Return the cached vector for text, calling encode_fn(text) on a miss."""
+        vector = self.get(text)
+        if vector is None:
+            vector = np.asarray(encode_fn(text), dtype=np.float32)
+            self.put(text, vector)
+        return vector
+
+    def get(self, text):
+        key = normalize_question(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        vector = self._disk_get(key)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._memory_put(key, vector)
+        return vector
+
+    def put(self, text, vector):
+        key = normalize_question(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        self._memory_put(key, vector)
+        self._disk_put(key, vector)
+
+    def stats(self):
+        """Return hit-rate counters and the memory footprint of the cache."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "disk_path": self.path,
+            }
+
+    def _memory_put(self, key, vector):
+        size = vector.nbytes + len(key) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.nbytes + len(key) + ENTRY_OVERHEAD_BYTES
+            self._entries[key] = vector
+            self._size += size
+
+            while self._size > self.max_bytes:
+                oldest_key, oldest = self._entries.popitem(last=False)
+                self._size -= oldest.nbytes + len(oldest_key) + ENTRY_OVERHEAD_BYTES
+                self.evictions += 1
+
+    def _disk_key(self, key):
+        return hashlib.sha1(f"{self.model_name}\0{key}".encode("utf-8")).hexdigest()
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _create_table(self):
+        try:
+            conn = self._connection()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error opening query embedding cache at {self.path}: {e}")
+            self.path = None
+
+    def _disk_get(self, key):
+        if not self.path:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT vector FROM query_embeddings WHERE key = ?", (self._disk_key(key),)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading query embedding cache: {e}")
+            return None
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def _disk_put(self, key, vector):
+        if not self.path:
+            return
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector) VALUES (?, ?)",
+                (self._disk_key(key), vector.tobytes()),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing query embedding cache: {e}")
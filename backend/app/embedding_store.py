@@ -0,0 +1,247 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+EMBEDDING_STORE_ENABLED = os.getenv("EMBEDDING_STORE_ENABLED", "1") == "1"
+EMBEDDING_STORE_PATH = os.getenv(
+    "EMBEDDING_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "embedding_store"),
+)
+# Garbage collect after a reindex once this share of the stored vectors is no longer referenced
+EMBEDDING_STORE_GC_RATIO = float(os.getenv("EMBEDDING_STORE_GC_RATIO", "0.5"))
+
+KEY_BYTES = 16
+
+
+def embedding_key(model_name, text):
+    """Content address of a text's embedding: the first 16 bytes of sha256(model name, text)."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()[:KEY_BYTES]
+
+
+class EmbeddingStore:
+    """On-disk, content-addressed store of float32 embeddings.
+
+    vectors.f32 holds one float32 row per entry and keys.bin the matching
+    16-byte keys (see embedding_key), both append-only. meta.json records
+    the row count and is written last, so rows past the count left by an
+    interrupted write are dropped on open. Reads go through a memory map of
+    vectors.f32, and the key -> row index is rebuilt from keys.bin in memory.
+
+    Every key looked up or added since the store was opened counts as
+    referenced. collect_garbage() rewrites the files with only those rows,
+    so after a full reindex the vectors of texts that left the corpus are
+    dropped. Compaction writes a new generation of the data files and
+    switches to it by replacing meta.json, so a crash at any point leaves
+    either the old or the new store. One process writes to a store at a time.
+    """
+
+    def __init__(self, model_name, dims, path=EMBEDDING_STORE_PATH):
+        self.model_name = model_name
+        self.dims = dims
+        # One directory per model, so stores of different models and dimensions never mix
+        self.path = os.path.join(path, hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:12])
+
+        self._lock = threading.Lock()
+        self._index = {}  # key -> row
+        self._count = 0
+        self._generation = 0  # data files in use, bumped by each compaction
+        self._vectors = None  # memory map, reopened after appends
+        self.referenced = set()
+
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        self.collected = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        self._open()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @staticmethod
+    def _data_files(generation):
+        """Names of the vectors and keys files of a generation; generation 0 keeps the original names."""
+        if not generation:
+            return "vectors.f32", "keys.bin"
+        return f"vectors.{generation}.f32", f"keys.{generation}.bin"
+
+    def _open(self):
+        count = 0
+        generation = 0
+        if os.path.exists(self._file("meta.json")):
+            with open(self._file("meta.json"), "r", encoding="utf-8") as file:
+                meta = json.load(file)
+            if meta["dims"] != self.dims or meta["model_name"] != self.model_name:
+                raise ValueError(f"Embedding store {self.path} holds {meta['model_name']} ({meta['dims']} dims)")
+            count = meta["count"]
+            generation = meta.get("generation", 0)
+        self._generation = generation
+        vectors_name, keys_name = self._data_files(generation)
+
+        # Remove the data files of other generations, left behind by a compaction
+        # that was interrupted before or after switching meta.json
+        for name in os.listdir(self.path):
+            if name.startswith(("vectors.", "keys.")) and name not in (vectors_name, keys_name):
+                os.remove(self._file(name))
+
+        # Drop rows an interrupted append wrote past the recorded count. Files
+        # shorter than the count cannot be trusted past their complete rows.
+        for name, row_bytes in ((vectors_name, self.dims * 4), (keys_name, KEY_BYTES)):
+            path = self._file(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size < count * row_bytes:
+                print(f"Embedding store file {path} is shorter than its {count} recorded rows.")
+                count = size // row_bytes
+        for name, row_bytes in ((vectors_name, self.dims * 4), (keys_name, KEY_BYTES)):
+            with open(self._file(name), "ab") as file:
+                file.truncate(count * row_bytes)
+
+        with open(self._file(keys_name), "rb") as file:
+            keys = file.read()
+        self._index = {keys[i * KEY_BYTES:(i + 1) * KEY_BYTES]: i for i in range(count)}
+        self._count = count
+        self._vectors = None
+        print(f"Opened embedding store {self.path}: {count} vectors.")
+
+    def _write_meta(self):
+        meta = {"model_name": self.model_name, "dims": self.dims, "count": self._count,
+                "generation": self._generation}
+        with open(self._file("meta.json.tmp"), "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        os.replace(self._file("meta.json.tmp"), self._file("meta.json"))
+
+    def _matrix(self):
+        if self._vectors is None and self._count:
+            vectors_name, _ = self._data_files(self._generation)
+            self._vectors = np.memmap(self._file(vectors_name), dtype=np.float32, mode="r",
+                                      shape=(self._count, self.dims))
+        return self._vectors
+
+    def lookup(self, texts):
+        """Return (float32 matrix with a row per text, indices of the texts not in the store)."""
+        keys = [embedding_key(self.model_name, text) for text in texts]
+        vectors = np.zeros((len(texts), self.dims), dtype=np.float32)
+        with self._lock:
+            self.referenced.update(keys)
+            rows = [self._index.get(key) for key in keys]
+            found = [i for i, row in enumerate(rows) if row is not None]
+            if found:
+                vectors[found] = self._matrix()[[rows[i] for i in found]]
+            self.lookups += len(texts)
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+        missing = [i for i, row in enumerate(rows) if row is None]
+        return vectors, missing
+
+    def add(self, texts, vectors):
+        """Append the embeddings of texts that are not stored yet."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dims)
+        with self._lock:
+            new_keys = []
+            new_rows = []
+            for text, vector in zip(texts, vectors):
+                key = embedding_key(self.model_name, text)
+                self.referenced.add(key)
+                if key in self._index:
+                    continue
+                self._index[key] = self._count + len(new_keys)
+                new_keys.append(key)
+                new_rows.append(vector)
+            if not new_keys:
+                return
+            vectors_name, keys_name = self._data_files(self._generation)
+            with open(self._file(vectors_name), "ab") as file:
+                file.write(np.ascontiguousarray(new_rows, dtype=np.float32).tobytes())
+            with open(self._file(keys_name), "ab") as file:
+                file.write(b"".join(new_keys))
+            self._count += len(new_keys)
+            self.added += len(new_keys)
+            self._vectors = None
+            self._write_meta()
+
+    def get_or_encode(self, texts, encode_fn):
+        """Return a float32 matrix for texts, calling encode_fn(list of texts) once for the distinct misses."""
+        vectors, missing = self.lookup(texts)
+        if missing:
+            distinct = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = np.asarray(encode_fn(distinct), dtype=np.float32).reshape(len(distinct), self.dims)
+            by_text = dict(zip(distinct, encoded))
+            for i in missing:
+                vectors[i] = by_text[texts[i]]
+            self.add(distinct, encoded)
+        return vectors
+
+    def compact(self, keep=None):
+        """Rewrite the store with only the rows whose key is in keep (all rows when None).
+
+        The kept rows are written to the data files of the next generation,
+        and replacing meta.json switches the store to them; only then are the
+        old files removed. Returns the number of rows dropped.
+        """
+        with self._lock:
+            matrix = self._matrix()
+            kept = [(key, row) for key, row in sorted(self._index.items(), key=lambda item: item[1])
+                    if keep is None or key in keep]
+            rows = [row for _, row in kept]
+            vectors = matrix[rows] if rows else np.zeros((0, self.dims), dtype=np.float32)
+            old_files = self._data_files(self._generation)
+            new_files = self._data_files(self._generation + 1)
+            np.ascontiguousarray(vectors, dtype=np.float32).tofile(self._file(new_files[0]))
+            with open(self._file(new_files[1]), "wb") as file:
+                file.write(b"".join(key for key, _ in kept))
+
+            dropped = self._count - len(kept)
+            self._vectors = None
+            del matrix
+            self._generation += 1
+            self._count = len(kept)
+            try:
+                self._write_meta()
+            except Exception:
+                self._generation -= 1
+                self._count += dropped
+                raise
+            self._index = {key: i for i, (key, _) in enumerate(kept)}
+            for name in old_files:
+                os.remove(self._file(name))
+            self.collected += dropped
+        print(f"Compacted embedding store {self.path}: {len(kept)} vectors kept, {dropped} dropped.")
+        return dropped
+
+    def garbage_ratio(self):
+        """Share of the stored vectors not referenced since the store was opened."""
+        with self._lock:
+            if not self._count:
+                return 0.0
+            return 1 - len(self.referenced & self._index.keys()) / self._count
+
+    def collect_garbage(self):
+        """Drop every vector not looked up or added since the store was opened."""
+        with self._lock:
+            referenced = set(self.referenced)
+        return self.compact(keep=referenced)
+
+    def stats(self):
+        """Return the store size and the lookup hit rate."""
+        with self._lock:
+            referenced = len(self.referenced & self._index.keys())
+            return {
+                "entries": self._count,
+                "bytes": self._count * (self.dims * 4 + KEY_BYTES),
+                "referenced": referenced,
+                "unreferenced": self._count - referenced,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "added": self.added,
+                "collected": self.collected,
+            }
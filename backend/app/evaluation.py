@@ -0,0 +1,112 @@
+import os
+import time
+import signal
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+import db
+from rag import evaluate_relevance, calculate_openai_cost
+
+
+load_dotenv()
+
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "2"))
+EVAL_QUEUE_MAX_DEPTH = int(os.getenv("EVAL_QUEUE_MAX_DEPTH", "1000"))
+EVAL_POLL_INTERVAL = float(os.getenv("EVAL_POLL_INTERVAL", "1.0"))
+EVAL_VISIBILITY_TIMEOUT = int(os.getenv("EVAL_VISIBILITY_TIMEOUT", "300"))
+EVAL_MAX_ATTEMPTS = int(os.getenv("EVAL_MAX_ATTEMPTS", "3"))
+
+
+# Function to hand a finished conversation over to the evaluation workers
+def submit_evaluation(conversation_id, question, answer_data):
+    return db.enqueue_evaluation(
+        conversation_id=conversation_id,
+        question=question,
+        answer=answer_data["answer"],
+        model_used=answer_data["model_used"],
+        max_depth=EVAL_QUEUE_MAX_DEPTH,
+    )
+
+
+# Function to hand many finished conversations over at once (used by /questions)
+def submit_evaluations(conversations):
+    jobs = [
+        (conversation_id, question, answer_data["answer"], answer_data["model_used"])
+        for conversation_id, question, answer_data in conversations
+    ]
+    return db.enqueue_evaluations(jobs, max_depth=EVAL_QUEUE_MAX_DEPTH)
+
+
+# Function to grade a single queued conversation
+def process_job(job):
+    model = job["model_used"]
+    queue_wait = (datetime.now(db.tz) - job["enqueued_at"]).total_seconds()
+
+    started = time.time()
+    relevance, rel_token_stats = evaluate_relevance(job["question"], job["answer"])
+    evaluation_time = time.time() - started
+    # The prompt asks for lowercase keys, the parse-failure fallback uses capitalized ones
+    relevance = {str(key).lower(): value for key, value in relevance.items()} if isinstance(relevance, dict) else {}
+
+    evaluation_data = {
+        "relevance": relevance.get("relevance", "UNKNOWN"),
+        "relevance_explanation": relevance.get(
+            "explanation", "Failed to parse evaluation"
+        ),
+        "eval_prompt_tokens": rel_token_stats["prompt_tokens"],
+        "eval_completion_tokens": rel_token_stats["completion_tokens"],
+        "eval_total_tokens": rel_token_stats["total_tokens"],
+        "openai_cost": calculate_openai_cost(model, rel_token_stats),
+        "timings": {
+            "evaluation_queue_wait": queue_wait,
+            "evaluation": evaluation_time,
+        },
+    }
+
+    db.complete_evaluation(job["id"], job["conversation_id"], evaluation_data)
+
+
+def worker_loop(worker_id, stop_event):
+    """Claim and process evaluation jobs until stop_event is set."""
+    print(f"Evaluation worker {worker_id} started.")
+    while not stop_event.is_set():
+        job = db.claim_evaluation(EVAL_VISIBILITY_TIMEOUT, EVAL_MAX_ATTEMPTS)
+        if job is None:
+            stop_event.wait(EVAL_POLL_INTERVAL)
+            continue
+
+        try:
+            process_job(job)
+        except Exception as e:
+            print(f"Worker {worker_id} failed to evaluate conversation {job['conversation_id']}: {e}")
+            db.fail_evaluation(job["id"], e, EVAL_MAX_ATTEMPTS)
+    print(f"Evaluation worker {worker_id} stopped.")
+
+
+def run_workers(num_workers=EVAL_WORKERS):
+    """Run a pool of evaluation workers until interrupted."""
+    stop_event = threading.Event()
+    # docker stop sends SIGTERM; unfinished jobs are reclaimed after the visibility timeout
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    workers = [
+        threading.Thread(target=worker_loop, args=(i, stop_event), daemon=True)
+        for i in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+
+    print("Stopping evaluation workers...")
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    print(f"Starting {EVAL_WORKERS} evaluation workers (queue depth {EVAL_QUEUE_MAX_DEPTH})...")
+    run_workers()
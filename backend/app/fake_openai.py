@@ -0,0 +1,145 @@
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Local OpenAI-compatible chat completions server for exercising llm_client
+# (timeouts, retries, hedging, circuit breaker) without calling OpenAI:
+#
+#   python fake_openai.py --port 8001 --latency 0.2 --slow-rate 0.1 --error-rate 0.05
+#   OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake python app.py
+#
+# --fail-first and --slow-first make the first requests fail or stall
+# deterministically; test_llm_client.py uses them.
+
+FAKE_ANSWER = "This is a fake answer generated by the local test server."
+FAKE_EVALUATION = '{"relevance": "RELEVANT", "explanation": "Fake evaluation."}'
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    config = None
+    requests = 0  # chat completion requests received, counted per handler class
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        config = self.config
+        with self._lock:
+            number = type(self).requests
+            type(self).requests += 1
+
+        if number < config.fail_first:
+            self._send_json(config.fail_status, {"error": {"message": "Injected failure", "type": "server_error"}})
+            return
+        if random.random() < config.error_rate:
+            self._send_json(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+            return
+
+        delay = config.latency + random.uniform(0, config.jitter)
+        if number < config.fail_first + config.slow_first or random.random() < config.slow_rate:
+            delay += config.slow_latency
+        time.sleep(delay)
+
+        prompt = " ".join(m.get("content", "") for m in payload.get("messages", []))
+        content = FAKE_EVALUATION if "expert evaluator" in prompt else FAKE_ANSWER
+        model = payload.get("model", "gpt-4o-mini")
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": len(prompt) // 4 + len(content) // 4,
+        }
+
+        if payload.get("stream"):
+            try:
+                self._stream(model, content, usage, payload.get("stream_options") or {})
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client gave up on this request, e.g. a cancelled hedge
+        else:
+            self._send_json(200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+    def _stream(self, model, content, usage, stream_options):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        def chunk(delta, finish_reason=None, with_usage=False):
+            body = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [] if with_usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if with_usage:
+                body["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(body)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for word in content.split(" "):
+            chunk({"content": word + " "})
+            time.sleep(self.config.token_delay)
+        chunk({}, finish_reason="stop")
+        if stream_options.get("include_usage"):
+            chunk({}, with_usage=True)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="Base delay before the first token (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Uniform random extra delay (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests that are slow")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="Extra delay of slow requests (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Delay between streamed tokens (s)")
+    parser.add_argument("--fail-first", type=int, default=0, help="Answer the first N requests with an error")
+    parser.add_argument("--fail-status", type=int, default=500, help="HTTP status of the --fail-first errors")
+    parser.add_argument("--slow-first", type=int, default=0,
+                        help="Delay the N requests after the --fail-first ones by --slow-latency")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    FakeOpenAIHandler.config = args
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), FakeOpenAIHandler)
+    print(f"Fake OpenAI server listening on http://localhost:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
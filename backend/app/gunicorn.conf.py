@@ -0,0 +1,36 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+bind = "0.0.0.0:5000"
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Import the app once in the master so every worker inherits the loaded modules
+preload_app = True
+
+# Load the embedding weights in the master as well. Forked workers then share
+# the weight pages copy-on-write instead of each holding its own copy.
+PRELOAD_MODEL = os.getenv("PRELOAD_MODEL", "1") == "1"
+
+
+def when_ready(server):
+    from embedder import EMBEDDER_BACKEND
+
+    # ONNX Runtime sessions own thread pools that do not survive fork, so the
+    # ONNX backends are loaded by each worker instead.
+    if not PRELOAD_MODEL or EMBEDDER_BACKEND != "torch":
+        return
+    import rag
+    server.log.info("Loading embedding model in the master process")
+    rag.get_model()
+
+
+def post_fork(server, worker):
+    import rag
+
+    # Warm up in the background; /ready reports 503 until it has finished
+    threading.Thread(target=rag.warmup, name="warmup", daemon=True).start()
@@ -3,7 +3,7 @@ import json
 import random
 from dotenv import load_dotenv
 from tqdm.auto import tqdm
-from openai import OpenAI
+from llm_client import get_llm_client
 
 
 load_dotenv()
@@ -12,9 +12,6 @@ ELASTIC_URL = os.getenv("ELASTIC_URL", "http://localhost:9200")
 INDEX_NAME = os.getenv("INDEX_NAME", "reviews-steam")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Initialize the OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
-
 # Define the prompt template for generating questions
 prompt_template = """
 You are a PC video game enthusiast who enjoys playing games on their release day.
@@ -80,12 +77,9 @@ def generate_questions(doc):
     prompt = prompt_template.format(**doc)
     print(f"Generating questions for appid {doc['appid']}...")
 
-    response = client.chat.completions.create(
-        model='gpt-4o-mini',
-        messages=[{"role": "user", "content": prompt}]
-    )
+    answer, _, _ = get_llm_client().complete(prompt, model='gpt-4o-mini')
 
-    questions_data = json.loads(response.choices[0].message.content)
+    questions_data = json.loads(answer)
     print(f"Generated questions for appid {doc['appid']}: {questions_data['question']}")
     return questions_data
 
@@ -120,7 +114,8 @@ def process_documents(reviews):
                     "review": doc,
                     "question": questions[i],
                     "answer": answers[i],
-                    "section": sections[i]
+                    "section": sections[i],
+                    "question_index": i
                 })
                 print(f"Added question {i+1} for appid {doc_id} to results.")
                 unique_id_counter += 1
@@ -0,0 +1,366 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import openai
+from openai import OpenAI
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # e.g. http://localhost:8001/v1 for fake_openai.py
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "0") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Errors worth another attempt; anything else (bad request, auth) fails immediately
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+def token_stats(usage):
+    """Token counts from an OpenAI usage object (zeros when the stream sent none)."""
+    return {
+        "prompt_tokens": usage.prompt_tokens if usage else 0,
+        "completion_tokens": usage.completion_tokens if usage else 0,
+        "total_tokens": usage.total_tokens if usage else 0,
+    }
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the LLM cannot answer: circuit open, deadline hit or retries exhausted."""
+
+
+class LLMRequestError(Exception):
+    """Raised when the LLM rejects the request itself (bad request, auth, context length).
+
+    The upstream answered, so these errors do not count toward the circuit breaker.
+    """
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures.
+
+    After failure_threshold consecutive failed calls the breaker opens and
+    rejects calls for cooldown seconds. It then lets a single trial call
+    through (half-open) and closes again if that call succeeds. A trial
+    that ends without a verdict (the request was rejected as invalid) is
+    replaced by another one after a further cooldown.
+    """
+
+    def __init__(self, failure_threshold=LLM_BREAKER_FAILURES, cooldown=LLM_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if time.time() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                self.opened_at = time.time()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                    print(f"LLM circuit breaker opened after {self.failures} failures.")
+                self.state = "open"
+                self.opened_at = time.time()
+
+
+class LLMClient:
+    """OpenAI chat client with deadlines, retries, hedged requests and a circuit breaker.
+
+    Every call gets an overall deadline of timeout seconds that covers all
+    retries. Retryable errors are retried up to max_retries times with
+    full-jitter exponential backoff. With hedging enabled, a duplicate request
+    is sent once the first one has been running longer than the
+    hedge_percentile of recent latencies, and the first response wins.
+    """
+
+    def __init__(self, api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, timeout=LLM_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX,
+                 hedge_enabled=LLM_HEDGE_ENABLED, hedge_percentile=LLM_HEDGE_PERCENTILE,
+                 hedge_min_samples=LLM_HEDGE_MIN_SAMPLES, breaker=None):
+        # Retries are handled here, so the SDK's own retry loop is disabled
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+
+        self._latencies = deque(maxlen=500)
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge") if hedge_enabled else None
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rejected = 0
+        self.request_errors = 0
+
+    def complete(self, prompt, model="gpt-4o-mini", timeout=None):
+        """Send a single-message chat completion.
+
+        Returns (answer, token_stats, time_to_first_token). Raises
+        LLMUnavailableError when no answer could be produced, and
+        LLMRequestError when the LLM rejected the request.
+        """
+        if not self.breaker.allow():
+            with self._lock:
+                self.rejected += 1
+            raise LLMUnavailableError("LLM circuit breaker is open")
+
+        with self._lock:
+            self.calls += 1
+        deadline = time.time() + (timeout or self.timeout)
+        messages = [{"role": "user", "content": prompt}]
+
+        attempt = 0
+        while True:
+            try:
+                started = time.time()
+                result = self._hedged_attempt(model, messages, deadline)
+                self._latencies.append(time.time() - started)
+                self.breaker.record_success()
+                return result
+            except RETRYABLE_ERRORS as e:
+                backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if attempt >= self.max_retries or time.time() + backoff >= deadline:
+                    self._record_failure()
+                    raise LLMUnavailableError(f"LLM call failed after {attempt + 1} attempts: {e}") from e
+                print(f"LLM call failed ({e}), retrying in {backoff:.2f}s...")
+                with self._lock:
+                    self.retries += 1
+                attempt += 1
+                time.sleep(backoff)
+            except LLMUnavailableError:
+                self._record_failure()
+                raise
+            except openai.APIStatusError as e:
+                self._record_request_error()
+                raise LLMRequestError(f"LLM rejected the request: {e}") from e
+
+    def stream(self, prompt, model="gpt-4o-mini", timeout=None, stats=None):
+        """Stream a single-message chat completion, yielding answer text as it arrives.
+
+        Retryable errors are retried only until the first token has been
+        yielded, and requests are never hedged. Once the stream ends, the
+        token counts and time_to_first_token are written into stats. Raises
+        LLMUnavailableError when no answer could be produced, and
+        LLMRequestError when the LLM rejected the request.
+        """
+        if not self.breaker.allow():
+            with self._lock:
+                self.rejected += 1
+            raise LLMUnavailableError("LLM circuit breaker is open")
+
+        with self._lock:
+            self.calls += 1
+        deadline = time.time() + (timeout or self.timeout)
+        messages = [{"role": "user", "content": prompt}]
+
+        attempt = 0
+        while True:
+            started = time.time()
+            first_token_at = None
+            usage = None
+            try:
+                remaining = deadline - started
+                if remaining <= 0:
+                    raise LLMUnavailableError("LLM deadline exceeded")
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=remaining,
+                )
+                try:
+                    for chunk in response:
+                        if time.time() > deadline:
+                            raise LLMUnavailableError("LLM deadline exceeded")
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if first_token_at is None:
+                                first_token_at = time.time()
+                            yield chunk.choices[0].delta.content
+                        if chunk.usage is not None:
+                            usage = chunk.usage
+                finally:
+                    response.close()
+                break
+            except RETRYABLE_ERRORS as e:
+                backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                # Tokens already sent to the caller cannot be taken back
+                if first_token_at is not None or attempt >= self.max_retries or time.time() + backoff >= deadline:
+                    self._record_failure()
+                    raise LLMUnavailableError(f"LLM stream failed after {attempt + 1} attempts: {e}") from e
+                print(f"LLM stream failed ({e}), retrying in {backoff:.2f}s...")
+                with self._lock:
+                    self.retries += 1
+                attempt += 1
+                time.sleep(backoff)
+            except LLMUnavailableError:
+                self._record_failure()
+                raise
+            except openai.APIStatusError as e:
+                self._record_request_error()
+                raise LLMRequestError(f"LLM rejected the request: {e}") from e
+
+        self._latencies.append(time.time() - started)
+        self.breaker.record_success()
+        if stats is not None:
+            stats.update(token_stats(usage))
+            stats["time_to_first_token"] = (first_token_at or time.time()) - started
+
+    def stats(self):
+        latencies = list(self._latencies)
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "failures": self.failures,
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "rejected": self.rejected,
+                "request_errors": self.request_errors,
+                "breaker_state": self.breaker.state,
+                "breaker_trips": self.breaker.trips,
+                "latency_p50": float(np.percentile(latencies, 50)) if latencies else None,
+                "latency_p95": float(np.percentile(latencies, 95)) if latencies else None,
+            }
+
+    def _record_failure(self):
+        self.breaker.record_failure()
+        with self._lock:
+            self.failures += 1
+
+    def _record_request_error(self):
+        # Not a failure of the upstream, so the breaker does not see it
+        with self._lock:
+            self.request_errors += 1
+
+    def _hedge_delay(self):
+        if not self.hedge_enabled or len(self._latencies) < self.hedge_min_samples:
+            return None
+        return float(np.percentile(list(self._latencies), self.hedge_percentile))
+
+    def _hedged_attempt(self, model, messages, deadline):
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return self._attempt(model, messages, deadline, threading.Event())
+
+        cancel = threading.Event()
+        primary = self._executor.submit(self._attempt, model, messages, deadline, cancel)
+        done, _ = wait([primary], timeout=min(hedge_delay, max(deadline - time.time(), 0)))
+        if done:
+            return primary.result()
+
+        with self._lock:
+            self.hedges += 1
+        hedge = self._executor.submit(self._attempt, model, messages, deadline, cancel)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.time(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    cancel.set()  # stop streaming the losing request
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+
+        cancel.set()
+        if error is not None:
+            raise error
+        raise LLMUnavailableError("LLM deadline exceeded")
+
+    def _attempt(self, model, messages, deadline, cancel):
+        """One streamed request; gives up when the deadline passes or cancel is set."""
+        started = time.time()
+        remaining = deadline - started
+        if remaining <= 0:
+            raise LLMUnavailableError("LLM deadline exceeded")
+
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=remaining,
+        )
+
+        chunks = []
+        first_token_at = None
+        usage = None
+        try:
+            for chunk in stream:
+                if cancel.is_set():
+                    raise LLMUnavailableError("LLM request cancelled by a faster hedge")
+                if time.time() > deadline:
+                    raise LLMUnavailableError("LLM deadline exceeded")
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token_at is None:
+                        first_token_at = time.time()
+                    chunks.append(chunk.choices[0].delta.content)
+                if chunk.usage is not None:
+                    usage = chunk.usage
+        finally:
+            stream.close()
+
+        time_to_first_token = (first_token_at or time.time()) - started
+        return "".join(chunks), token_stats(usage), time_to_first_token
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_llm_client():
+    """Return the process-wide LLMClient shared by rag.py and ingest.py."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
@@ -0,0 +1,322 @@
+import os
+import re
+import json
+import math
+import time
+import uuid
+import argparse
+import threading
+from collections import Counter
+import numpy as np
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "elasticsearch")  # elasticsearch | local
+LOCAL_INDEX_PATH = os.getenv(
+    "LOCAL_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "local_index"),
+)
+
+VECTOR_FIELD = "question_answer_vector"
+# Same boosts as the keyword clause of ReviewReader.build_keyword_query
+KEYWORD_FIELDS = {"question": 3.0, "answer": 1.0, "section": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def build_local_index(path=LOCAL_INDEX_PATH, es_host=None, index_name=None):
+    """Export the Elasticsearch index built by prep.ReviewIndexer to a local index directory.
+
+    Writes vectors.f32 (float32 rows, L2-normalized, grouped by title),
+    documents.json (the projected fields of every row) and meta.json (shape,
+    per-title row ranges and a version id). Files are written next to the
+    old ones and renamed into place, so a running reader never sees a half
+    written index.
+    """
+    from read import ReviewReader, ELASTIC_URL, INDEX_NAME, RAG_SOURCE_FIELDS
+
+    reader = ReviewReader(es_host=es_host or ELASTIC_URL, index_name=index_name or INDEX_NAME)
+    index_name = reader.index_name
+
+    print(f"Exporting '{index_name}' to local index at {path}...")
+    reader.es.indices.refresh(index=index_name)
+    rows = []
+    for hit in reader.iter_all_reviews(source_fields=RAG_SOURCE_FIELDS + ["appid", VECTOR_FIELD]):
+        source = hit["_source"]
+        vector = source.pop(VECTOR_FIELD, None)
+        if vector is None:
+            continue
+        rows.append((source, vector))
+    rows.sort(key=lambda row: row[0].get("title") or "")
+    print(f"Exported {len(rows)} documents.")
+
+    os.makedirs(path, exist_ok=True)
+    dims = len(rows[0][1]) if rows else 0
+    vectors = np.asarray([row[1] for row in rows], dtype=np.float32).reshape(len(rows), dims)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.clip(norms, 1e-12, None)
+
+    titles = {}
+    for i, (source, _) in enumerate(rows):
+        start, _ = titles.get(source.get("title"), (i, i))
+        titles[source.get("title")] = (start, i + 1)
+
+    meta = {
+        "version": uuid.uuid4().hex,
+        "source_index": index_name,
+        "count": len(rows),
+        "dims": dims,
+        "titles": titles,
+        "projection": reader.index_projection(),
+    }
+
+    vectors.tofile(os.path.join(path, "vectors.f32.tmp"))
+    with open(os.path.join(path, "documents.json.tmp"), "w", encoding="utf-8") as file:
+        json.dump([row[0] for row in rows], file)
+    with open(os.path.join(path, "meta.json.tmp"), "w", encoding="utf-8") as file:
+        json.dump(meta, file)
+    # meta.json goes last: readers reload when its version changes
+    for name in ("vectors.f32", "documents.json", "meta.json"):
+        os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+    print(f"Local index written: {len(rows)} documents, {len(titles)} titles, version {meta['version']}.")
+    return meta
+
+
+class KeywordIndex:
+    """BM25 over the question, answer and section fields of one title's documents."""
+
+    def __init__(self, documents):
+        self.fields = {}
+        for field in KEYWORD_FIELDS:
+            postings = {}
+            lengths = np.zeros(len(documents), dtype=np.float32)
+            for i, document in enumerate(documents):
+                tokens = tokenize(document.get(field))
+                lengths[i] = len(tokens)
+                for term, tf in Counter(tokens).items():
+                    postings.setdefault(term, ([], []))
+                    postings[term][0].append(i)
+                    postings[term][1].append(tf)
+            postings = {
+                term: (np.asarray(ids, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+                for term, (ids, tfs) in postings.items()
+            }
+            average_length = float(lengths.mean()) if len(documents) else 0.0
+            self.fields[field] = (postings, lengths, average_length)
+        self.size = len(documents)
+
+    def score(self, query):
+        """Return the boosted BM25 score of every document (zeros for non-matching ones)."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        terms = set(tokenize(query))
+        for field, boost in KEYWORD_FIELDS.items():
+            postings, lengths, average_length = self.fields[field]
+            for term in terms:
+                if term not in postings:
+                    continue
+                ids, tfs = postings[term]
+                idf = math.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ids] / max(average_length, 1e-9))
+                scores[ids] += boost * idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+        return scores
+
+
+class TitleShard:
+    """The documents and vector rows of one title."""
+
+    def __init__(self, documents, vectors):
+        self.documents = documents
+        self.vectors = vectors  # view into the memory-mapped matrix
+        self._keyword_index = None
+
+    def keyword_index(self):
+        # Built on the first keyword search for this title
+        if self._keyword_index is None:
+            self._keyword_index = KeywordIndex(self.documents)
+        return self._keyword_index
+
+    def knn(self, vector, k):
+        """Top-k (row offsets, cosine similarities), best first."""
+        if not len(self.documents):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        similarities = self.vectors @ query
+        k = min(k, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return top, similarities[top]
+
+    def keyword(self, query, k):
+        """Top-k keyword matches (row offsets, BM25 scores), best first."""
+        if not len(self.documents):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self.keyword_index().score(query)
+        matching = np.flatnonzero(scores > 0)
+        top = matching[np.argsort(-scores[matching])][:k]
+        return top, scores[top]
+
+
+EMPTY_SHARD = TitleShard([], np.zeros((0, 0), dtype=np.float32))
+
+
+class LocalReviewReader:
+    """In-process alternative to read.ReviewReader backed by a memory-mapped vector file.
+
+    Exposes the search methods used by rag.py. kNN is an exact dot product
+    over the title's rows, which are contiguous in the memory-mapped matrix.
+    The keyword score is BM25 with the same field boosts as the Elasticsearch
+    query, without fuzzy matching. The index is built by build_local_index()
+    and reloaded automatically when it is rebuilt.
+    """
+
+    def __init__(self, path=LOCAL_INDEX_PATH, model=None):
+        self.path = path
+        self.model = model
+        self.index_name = f"local:{path}"
+        self.version = None
+        self.projection = None
+        self.shards = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """(Re)load meta.json, the memory-mapped vectors and the documents."""
+        with self._lock:
+            with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as file:
+                meta = json.load(file)
+            with open(os.path.join(self.path, "documents.json"), "r", encoding="utf-8") as file:
+                documents = json.load(file)
+            vectors = np.memmap(
+                os.path.join(self.path, "vectors.f32"), dtype=np.float32, mode="r",
+                shape=(meta["count"], meta["dims"]),
+            )
+            # Searches keep using the shards they started with while a reload swaps in new ones
+            self.shards = {
+                title: TitleShard(documents[start:end], vectors[start:end])
+                for title, (start, end) in meta["titles"].items()
+            }
+            self.version = meta["version"]
+            self.projection = meta.get("projection")
+        print(f"Loaded local index {self.path}: {meta['count']} documents, version {self.version}")
+
+    def check_connection(self):
+        return self.ping()
+
+    def ping(self):
+        return os.path.exists(os.path.join(self.path, "meta.json"))
+
+    def index_version(self):
+        """Return the version of the local index, reloading it if it was rebuilt."""
+        try:
+            with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as file:
+                version = json.load(file)["version"]
+            if version != self.version:
+                self.load()
+            return self.version
+        except Exception as e:
+            print(f"Error retrieving local index version: {e}")
+            return None
+
+    def index_projection(self):
+        """Version of the projection of the exported vectors, or None."""
+        return self.projection
+
+    def read_titles(self):
+        """Return {title: appid} for every title in the local index."""
+        return {
+            title: shard.documents[0].get("appid") if shard.documents else None
+            for title, shard in self.shards.items()
+        }
+
+    def read_reviews_knn(self, query, title, vector_field=VECTOR_FIELD, num_results=5):
+        """Retrieve reviews using exact kNN over the title's vectors."""
+        try:
+            if self.model is None:
+                raise ValueError("Model for embedding generation is not initialized.")
+            if vector_field != VECTOR_FIELD:
+                raise ValueError(f"The local index only stores {VECTOR_FIELD}")
+            shard = self.shards.get(title, EMPTY_SHARD)
+            top, _ = shard.knn(self.model.encode(query), num_results)
+            return [shard.documents[i] for i in top]
+        except Exception as e:
+            print(f"Error executing local KNN search: {e}")
+            return []
+
+    def read_reviews_knn_and_keyword(self, field, query, vector, title, num_results=5, stats=None):
+        """Sum of kNN and BM25 scores, like the Elasticsearch hybrid search.
+
+        The search time is stored in stats as local_search (seconds), apart
+        from the es_took that the Elasticsearch readers report.
+        """
+        started = time.time()
+        try:
+            shard = self.shards.get(title, EMPTY_SHARD)
+            knn_top, similarities = shard.knn(vector, num_results)
+            # Elasticsearch maps cosine similarity to (1 + cos) / 2 for scoring
+            scores = {int(i): (1 + float(s)) / 2 for i, s in zip(knn_top, similarities)}
+            keyword_top, keyword_scores = shard.keyword(query, num_results)
+            for i, s in zip(keyword_top, keyword_scores):
+                scores[int(i)] = scores.get(int(i), 0.0) + float(s)
+            ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:num_results]
+            return [shard.documents[i] for i, _ in ranked]
+        except Exception as e:
+            print(f"Error executing local KNN and keyword search: {e}")
+            return []
+        finally:
+            if stats is not None:
+                stats["local_search"] = time.time() - started
+
+    def read_reviews_knn_and_keyword_batch(self, field, queries, vectors, titles, num_results=5, stats=None,
+                                           mode="hybrid", k=60, window_size=None):
+        """Run the searches one after another; there is no round trip to save."""
+        started = time.time()
+        results = []
+        for query, vector, title in zip(queries, vectors, titles):
+            if mode == "rrf":
+                results.append(self.read_reviews_knn_and_keyword_rrf(
+                    field, query, vector, title, k=k, num_results=num_results, window_size=window_size
+                ))
+            else:
+                results.append(self.read_reviews_knn_and_keyword(field, query, vector, title, num_results))
+        if stats is not None:
+            stats["local_search"] = time.time() - started
+        return results
+
+    def read_reviews_knn_and_keyword_rrf(self, field, query, vector, title, k=60, num_results=5, stats=None,
+                                         window_size=None, server_side=False):
+        """Fuse the kNN and keyword rankings with RRF."""
+        started = time.time()
+        window_size = max(window_size or num_results, num_results)
+        try:
+            shard = self.shards.get(title, EMPTY_SHARD)
+            knn_top, _ = shard.knn(vector, window_size)
+            keyword_top, _ = shard.keyword(query, window_size)
+            rrf_scores = {}
+            for ranking in (knn_top, keyword_top):
+                for rank, i in enumerate(ranking):
+                    rrf_scores[int(i)] = rrf_scores.get(int(i), 0.0) + 1 / (k + rank + 1)
+            ranked = sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)[:num_results]
+            return [shard.documents[i] for i, _ in ranked]
+        except Exception as e:
+            print(f"Error executing local KNN and keyword search with RRF: {e}")
+            return []
+        finally:
+            if stats is not None:
+                stats["local_search"] = time.time() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local vector index from Elasticsearch")
+    parser.add_argument("--path", default=LOCAL_INDEX_PATH)
+    parser.add_argument("--index-name", default=None)
+    args = parser.parse_args()
+    build_local_index(args.path, index_name=args.index_name)
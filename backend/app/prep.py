@@ -1,11 +1,21 @@
 import os
+import sys
 import json
+import time
+import hashlib
+import uuid
+import resource
 from elasticsearch import Elasticsearch, NotFoundError, ConnectionError
+from elasticsearch.helpers import streaming_bulk, parallel_bulk
 from dotenv import load_dotenv
 from ingest import ingest_documents  # Keep this import as it triggers the ingest.py script
 from db import init_db
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
+from embedder import load_embedder, MODEL_NAME, EMBEDDER_BACKEND, EMBEDDER_THREADS
+from embedding_store import EmbeddingStore, EMBEDDING_STORE_ENABLED, EMBEDDING_STORE_GC_RATIO
+from local_index import build_local_index, RETRIEVAL_BACKEND
+from read import ReviewReader, INDEX_LAYOUT, INDEX_LAYOUTS, VECTOR_FIELDS, title_index_name
+from projection import PROJECTION_DIMS, PROJECTION_REFIT, fit_projection, load_projection
 import numpy as np
 
 
@@ -13,27 +23,109 @@ load_dotenv()
 
 ELASTIC_URL = os.getenv("ELASTIC_URL", "http://localhost:9200")  # Changed to localhost for local testing
 INDEX_NAME = os.getenv("INDEX_NAME", "reviews-steam")
+# Primary shards of the routed layout; the single and per-title layouts use one shard per index
+INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", "4"))
+# Vector fields written by each index profile: field -> indexed for kNN (True) or only stored (False).
+# The backend only searches question_answer_vector, so every profile indexes it; read_reviews_knn on
+# the other fields (and the notebooks) needs full.
+INDEX_PROFILES = {
+    "full": {"question_vector": True, "answer_vector": True, "question_answer_vector": True},
+    "stored": {"question_vector": False, "answer_vector": False, "question_answer_vector": True},
+    "search": {"question_answer_vector": True},
+}
+INDEX_PROFILE = os.getenv("INDEX_PROFILE", "full")
+# Bulk loading: documents per _bulk request, concurrent requests (1 streams them one by one),
+# and whether to force-merge each index down to one segment once the load is done
+INDEX_CHUNK_SIZE = int(os.getenv("INDEX_CHUNK_SIZE", "500"))
+INDEX_THREADS = int(os.getenv("INDEX_THREADS", "4"))
+INDEX_FORCE_MERGE = os.getenv("INDEX_FORCE_MERGE", "0") == "1"
+# Corpus embedding: texts per encode batch and CPU threads of the embedder (0 keeps the default)
+INDEX_ENCODE_BATCH_SIZE = int(os.getenv("INDEX_ENCODE_BATCH_SIZE", "256"))
+INDEX_ENCODE_THREADS = int(os.getenv("INDEX_ENCODE_THREADS", str(EMBEDDER_THREADS)))
+# rebuild: build a new index version and swap the alias to it; incremental: apply the
+# differences to the live index in place
+INDEX_MODE = os.getenv("INDEX_MODE", "rebuild")
+INDEX_REPORT_PATH = os.getenv(
+    "INDEX_REPORT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "index_report.json"),
+)
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def document_keys(reviews):
+    """Stable id of each ground-truth record: its review's recommendationid plus the question index.
+
+    Records without a question_index (files written before ingest.py stored
+    it) are numbered in file order within their review.
+    """
+    keys = []
+    seen = {}
+    for review in reviews:
+        source = review["review"]
+        review_id = source.get("recommendationid") or (
+            f"{review['appid']}-{source['author.steamid']}-{source['timestamp_created']}"
+        )
+        question_index = review.get("question_index")
+        if question_index is None:
+            question_index = seen.get(review_id, 0)
+        seen[review_id] = question_index + 1
+        keys.append(f"{review_id}-{question_index}")
+    return keys
+
+
+def content_hash(source):
+    """Hash of a document's indexed fields (vectors excluded), to detect changed records."""
+    return hashlib.sha256(json.dumps(source, sort_keys=True, default=str).encode("utf-8")).hexdigest()
 
 class ReviewIndexer:
-    def __init__(self, es_host=ELASTIC_URL, index_name=INDEX_NAME, model=None):
+    def __init__(self, es_host=ELASTIC_URL, index_name=INDEX_NAME, model=None, layout=INDEX_LAYOUT,
+                 shards=INDEX_SHARDS, embedding_store=None, profile=INDEX_PROFILE, projection_dims=PROJECTION_DIMS,
+                 refit_projection=PROJECTION_REFIT):
         print("Initializing ReviewIndexer...")
+        if layout not in INDEX_LAYOUTS:
+            raise ValueError(f"Unknown index layout '{layout}', expected one of {INDEX_LAYOUTS}")
+        if profile not in INDEX_PROFILES:
+            raise ValueError(f"Unknown index profile '{profile}', expected one of {tuple(INDEX_PROFILES)}")
+        self.es_host = es_host
         self.es = Elasticsearch([es_host])
-        self.index_name = index_name
+        self.index_name = index_name  # alias of the live version (or a legacy concrete index)
         self.model = model  # Expecting a SentenceTransformer model to encode text
+        self.embedding_store = embedding_store  # optional EmbeddingStore; only misses are encoded
+        self.layout = layout
+        self.profile = profile
+        self.vector_fields = [field for field in VECTOR_FIELDS if field in INDEX_PROFILES[profile]]
+        # With projection_dims, vectors are reduced by a PCA projection. It is fitted on the corpus by the
+        # first rebuild and then reused, unless refit_projection asks for a new one (see begin_version)
+        self.projection_dims = projection_dims
+        self.refit_projection = refit_projection
+        self.projection = None
+        self.dims = projection_dims or (model.get_sentence_embedding_dimension() if model is not None else 384)
+        self.title_indices = {}  # per-title layout: title -> backing index written to
+        self.version = None  # physical index (or per-title prefix) of a rebuild in progress
+        self._paused_settings = None  # index -> settings to restore, while a bulk load runs
+        self._warm_vectors = {}  # title -> one question_answer_vector, to warm a new version
         
         # Check the connection upon initialization
         self.check_connection()
         
         self.index_settings = {
             "settings": {
-                "number_of_shards": 1,
+                "number_of_shards": shards if layout == "routed" else 1,
                 "number_of_replicas": 0
             },
             "mappings": {
+                "_meta": {"profile": profile},
                 "properties": {
                     "appid": {"type": "keyword"},
+                    "document_id": {"type": "integer"},
                     "timestamp_query": {"type": "integer"},
                     "title": {"type": "keyword"},
+                    "recommendationid": {"type": "keyword"},
                     "author.steamid": {"type": "keyword"},
                     "author.playtimeforever": {"type": "integer"},
                     "author.playtime_last_two_weeks": {"type": "integer"},
@@ -48,30 +140,25 @@ class ReviewIndexer:
                     "question": {"type": "text"},
                     "answer": {"type": "text"},
                     "section": {"type": "keyword"},
-                    "question_vector": {
-                        "type": "dense_vector",
-                        "dims": 384,
-                        "index": True,
-                        "similarity": "cosine"
-                    },
-                    "answer_vector": {
-                        "type": "dense_vector",
-                        "dims": 384,
-                        "index": True,
-                        "similarity": "cosine"
-                    },
-                    "question_answer_vector": {
-                        "type": "dense_vector",
-                        "dims": 384,
-                        "index": True,
-                        "similarity": "cosine"
+                    "document_key": {"type": "keyword"},
+                    "content_hash": {"type": "keyword", "index": False},
+                    **{
+                        field: self.vector_mapping(indexed, self.dims)
+                        for field, indexed in INDEX_PROFILES[profile].items()
                     },
                 }
             }
         }
+        if layout == "routed":
+            # Every document is routed by title, so a title's searches touch a single shard
+            self.index_settings["mappings"]["_routing"] = {"required": True}
 
-        # Drop the index if it exists and create a new one
-        self.drop_and_create_index()
+    @staticmethod
+    def vector_mapping(indexed, dims=384):
+        """Mapping of a dense_vector field; a field that is not indexed is stored without an HNSW graph."""
+        if not indexed:
+            return {"type": "dense_vector", "dims": dims, "index": False}
+        return {"type": "dense_vector", "dims": dims, "index": True, "similarity": "cosine"}
 
     def check_connection(self):
         """Check if Elasticsearch connection is established."""
@@ -82,40 +169,436 @@ class ReviewIndexer:
         except ConnectionError:
             print("Failed to connect to Elasticsearch.")
 
-    def drop_and_create_index(self):
-        """Delete the existing index if it exists and create a new one."""
+    def physical_indices(self):
+        """The index, or every backing index behind the alias; empty when neither exists."""
+        if self.es.indices.exists_alias(name=self.index_name):
+            return list(self.es.indices.get_alias(name=self.index_name).keys())
+        if self.es.indices.exists(index=self.index_name):
+            return [self.index_name]
+        return []
+
+    def previous_alias(self):
+        """Alias of the version the last publish_version() replaced, kept until the next one."""
+        return f"{self.index_name}-previous"
+
+    def previous_indices(self):
+        """Backing indices of the previous version; empty when there is none."""
+        if self.es.indices.exists_alias(name=self.previous_alias()):
+            return list(self.es.indices.get_alias(name=self.previous_alias()).keys())
+        return []
+
+    def drop_index(self):
+        """Delete the index, or every backing index behind the alias, and the previous version, if present."""
+        print(f"Checking if index '{self.index_name}' exists...")
+        for index in self.physical_indices() + self.previous_indices():
+            print(f"Index '{index}' exists. Deleting it...")
+            self.es.indices.delete(index=index)
+            print(f"Index '{index}' deleted.")
+        self.title_indices = {}
+
+    def begin_version(self):
+        """Start building a new version of the index next to the live one.
+
+        Physical indices are named after INDEX_NAME plus a timestamp and a
+        random suffix, so two builds started in the same second do not
+        collide. In the per-title layout that name is the prefix of the title
+        indices, which are created as their first document is indexed (see
+        index_target).
+        Searches keep using the alias until publish_version().
+        """
+        self.version = self.new_version_name()
+        self.title_indices = {}
+        self._warm_vectors = {}
+        if self.projection_dims:
+            # Backends keep projecting queries with the live index's projection until they
+            # reload it (PROJECTION_REFRESH_INTERVAL), so the basis is kept across versions.
+            # Without a usable one, index_reviews fits a new one on the corpus.
+            projection = None if self.refit_projection else self.projection or self.live_projection()
+            reusable = projection is not None and (projection.dims, projection.model_name) == (
+                self.projection_dims, MODEL_NAME)
+            if reusable:
+                print(f"Reusing projection {projection.version}.")
+                self.projection = projection
+                self.index_settings["mappings"]["_meta"]["projection"] = projection.version
+            else:
+                self.projection = None
+                self.index_settings["mappings"]["_meta"].pop("projection", None)
+        if self.layout != "per-title":
+            print(f"Creating index '{self.version}'...")
+            self.es.indices.create(index=self.version, body=self.index_settings)
+        return self.version
+
+    def live_projection(self):
+        """The projection the live index was built with, or None (full vectors, no live index or no artifact)."""
+        if not self.physical_indices():
+            return None
+        mappings = self.es.indices.get_mapping(index=self.index_name)
+        versions = {mapping["mappings"].get("_meta", {}).get("projection") for mapping in mappings.values()}
+        version = versions.pop() if len(versions) == 1 else None
+        if not version:
+            return None
         try:
-            print(f"Checking if index '{self.index_name}' exists...")
-            if self.es.indices.exists(index=self.index_name):
-                print(f"Index '{self.index_name}' exists. Deleting it...")
-                self.es.indices.delete(index=self.index_name)
-                print(f"Index '{self.index_name}' deleted.")
-            print(f"Creating index '{self.index_name}'...")
-            self.es.indices.create(index=self.index_name, body=self.index_settings)  # Update to `body` since the settings are not expected to change.
-            print(f"Index '{self.index_name}' created.")
-        except Exception as e:
-            print(f"Error creating index: {e}")
+            return load_projection(version)
+        except FileNotFoundError:
+            print(f"Projection artifact {version} of the live index is missing.")
+            return None
+
+    def version_indices(self):
+        """Physical indices of the version being built."""
+        if self.layout == "per-title":
+            return list(self.title_indices.values())
+        return [self.version]
+
+    def warm_version(self):
+        """Run one kNN search per title on the new version, so its first live searches are not cold."""
+        for title, vector in self._warm_vectors.items():
+            target = self.index_target(title)
+            try:
+                self.es.search(
+                    index=target["index"],
+                    **({"routing": target["routing"]} if "routing" in target else {}),
+                    knn={"field": "question_answer_vector", "query_vector": vector, "k": 5, "num_candidates": 50,
+                         "filter": {"term": {"title": title}}},
+                    size=5,
+                    source=False,
+                )
+            except Exception as e:
+                print(f"Error warming '{target['index']}' for '{title}': {e}")
+        print(f"Warmed {len(self._warm_vectors)} titles on '{self.version}'.")
+
+    def publish_version(self, warm=True):
+        """Point the alias at the new version in one atomic update.
+
+        The replaced indices move to previous_alias() instead of being
+        deleted, because readers search per-title indices by name from a map
+        they refresh every TITLE_INDICES_REFRESH_INTERVAL seconds. The next
+        publish deletes them. A concrete index named INDEX_NAME (built before
+        indices were versioned) is removed in the same update, so the alias
+        can take its name.
+        """
+        if warm:
+            self.warm_version()
+        new_indices = self.version_indices()
+        live = self.es.indices.exists_alias(name=self.index_name)
+        old_indices = self.physical_indices()
+        retired_indices = [index for index in self.previous_indices() if index not in old_indices]
+
+        actions = [{"add": {"index": index, "alias": self.index_name}} for index in new_indices]
+        if live:
+            actions += [{"remove": {"index": index, "alias": self.index_name}} for index in old_indices]
+            actions += [{"add": {"index": index, "alias": self.previous_alias()}} for index in old_indices]
+        elif old_indices:
+            actions.append({"remove_index": {"index": self.index_name}})
+        self.es.indices.update_aliases(actions=actions)
+        print(f"Alias '{self.index_name}' now points to {len(new_indices)} indices of '{self.version}'.")
+
+        for index in retired_indices:
+            print(f"Deleting retired index '{index}'...")
+            self.es.indices.delete(index=index, ignore_unavailable=True)
+        self.version = None
+
+    def rebuild(self, reviews, warm=True, **kwargs):
+        """Index reviews into a new version and swap the alias to it; the live index serves until then."""
+        self.begin_version()
+        try:
+            report = self.index_reviews(reviews, **kwargs)
+        except Exception:
+            for index in self.version_indices():
+                self.es.indices.delete(index=index, ignore_unavailable=True)
+            self.version = None
+            raise
+        self.publish_version(warm=warm)
+        report["mode"] = "rebuild"
+        return report
+
+    def load_title_indices(self, response):
+        """Per-title layout: map the titles of the live version to their indices, given its get_mapping response."""
+        self.title_indices = {
+            mapping["mappings"]["_meta"]["title"]: index
+            for index, mapping in response.items()
+            if "title" in mapping["mappings"].get("_meta", {})
+        }
+
+    def read_live_documents(self):
+        """Return {_id: hit} for every live document, with its content_hash and title."""
+        reader = ReviewReader(es_host=self.es_host, index_name=self.index_name, layout=self.layout)
+        return {
+            hit["_id"]: hit
+            for hit in reader.iter_all_reviews(source_fields=["content_hash", "title"])
+        }
+
+    def update(self, reviews, **kwargs):
+        """Apply reviews to the live index in place: upsert new or changed documents and delete removed ones.
+
+        Documents are identified by document_keys(), and a document counts as
+        changed when its content_hash differs. Only the upserted documents are
+        embedded. Without a live index, or when it was built with another
+        profile, this falls back to rebuild().
+        """
+        if not self.physical_indices():
+            print(f"No live index '{self.index_name}', building it instead.")
+            return self.rebuild(reviews, **kwargs)
+        mappings = self.es.indices.get_mapping(index=self.index_name)
+        builds = {
+            (mapping["mappings"].get("_meta", {}).get("profile"), mapping["mappings"].get("_meta", {}).get("projection"))
+            for mapping in mappings.values()
+        }
+        profile, projection_version = next(iter(builds)) if len(builds) == 1 else (None, None)
+        try:
+            projection = load_projection(projection_version) if projection_version else None
+        except FileNotFoundError:
+            print(f"Projection artifact {projection_version} of the live index is missing.")
+            profile = None
+        if profile != self.profile or (projection.dims if projection else 0) != self.projection_dims:
+            print(f"Live index '{self.index_name}' was built as {sorted(map(str, builds))}, rebuilding it with "
+                  f"profile '{self.profile}' and {self.projection_dims or 'full'} dims.")
+            return self.rebuild(reviews, **kwargs)
+        if projection is not None:
+            self.projection = projection
+            self.index_settings["mappings"]["_meta"]["projection"] = projection.version
+        if self.layout == "per-title":
+            self.load_title_indices(mappings)
+
+        keys = document_keys(reviews)
+        live = self.read_live_documents()
+        changed = [
+            i for i, (review, key) in enumerate(zip(reviews, keys))
+            if key not in live or live[key]["_source"].get("content_hash") != content_hash(self.document_source(review))
+        ]
+        # A document whose title changed is deleted from its old index (or routing) and written again
+        current = set(keys)
+        moved = {keys[i] for i in changed if keys[i] in live and live[keys[i]]["_source"].get("title")
+                 != reviews[i]["review"]["title"]}
+        removed = [hit for key, hit in live.items() if key not in current or key in moved]
+        print(f"Incremental update: {len(changed)} new or changed, {len(removed)} removed, "
+              f"{len(reviews) - len(changed)} unchanged.")
+
+        deleted, delete_failures = self.delete_documents(removed)
+        report = self.index_reviews([reviews[i] for i in changed], keys=[keys[i] for i in changed], **kwargs)
+        if changed or removed:
+            self.bump_generation()
+        report.update({
+            "mode": "incremental",
+            "unchanged": len(reviews) - len(changed),
+            "deleted": deleted,
+            "delete_failures": delete_failures,
+        })
+        return report
+
+    def bump_generation(self):
+        """Count an in-place update in the _meta of every live index.
+
+        The index uuid only changes with a rebuild, so this is what makes
+        ReviewReader.index_version change, and the backends' semantic cache
+        and title catalogue reload, after an incremental update.
+        """
+        for index, mapping in self.es.indices.get_mapping(index=self.index_name).items():
+            meta = mapping["mappings"].get("_meta", {})
+            # put_mapping replaces the whole _meta, so the profile, projection and title are sent again
+            self.es.indices.put_mapping(index=index, meta={**meta, "generation": meta.get("generation", 0) + 1})
+        print(f"Bumped the generation of '{self.index_name}'.")
+
+    def delete_documents(self, hits):
+        """Bulk-delete live hits; returns (deleted count, failures). Already missing documents count as deleted."""
+        actions = (
+            {"_op_type": "delete", "_index": hit["_index"], "_id": hit["_id"],
+             **({"routing": hit["_routing"]} if "_routing" in hit else {})}
+            for hit in hits
+        )
+        deleted = 0
+        failures = []
+        for ok, item in streaming_bulk(self.es, actions, raise_on_error=False, raise_on_exception=False):
+            result = item["delete"]
+            if ok or result.get("status") == 404:
+                deleted += 1
+            else:
+                failures.append({"_id": result.get("_id"), "status": result.get("status"),
+                                 "error": result.get("error") or str(result.get("exception"))})
+        if hits:
+            for index in {hit["_index"] for hit in hits}:
+                self.es.indices.refresh(index=index)
+        return deleted, failures
+
+    def new_version_name(self):
+        return f"{self.index_name}-v{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    def create_title_index(self, title):
+        """Create the backing index of one title.
+
+        During a rebuild it joins the alias on publish_version(); in an
+        incremental update it joins the alias right away.
+        """
+        prefix = self.version or self.new_version_name()
+        index = title_index_name(prefix, title)
+        body = {
+            **self.index_settings,
+            "mappings": {
+                **self.index_settings["mappings"],
+                "_meta": {**self.index_settings["mappings"]["_meta"], "title": title},
+            },
+        }
+        if self.version is None:
+            body["aliases"] = {self.index_name: {}}
+        print(f"Creating index '{index}' for title '{title}'...")
+        self.es.indices.create(index=index, body=body)
+        self.title_indices[title] = index
+        if self._paused_settings is not None:
+            self.pause_index(index)
+        return index
+
+    def index_target(self, title):
+        """Index and routing a document of this title is written to under the configured layout.
+
+        Writes go to the version being built, or to the live index (through
+        the alias) in an incremental update.
+        """
+        if self.layout == "per-title":
+            index = self.title_indices.get(title) or self.create_title_index(title)
+            return {"index": index}
+        index = self.version or self.index_name
+        if self.layout == "routed":
+            return {"index": index, "routing": title}
+        return {"index": index}
+
+    def pause_index(self, index):
+        """Turn off refresh and replicas on an index, remembering the settings to restore."""
+        settings = self.es.indices.get_settings(index=index, flat_settings=True)[index]["settings"]
+        # A setting missing here was never set explicitly; restoring None resets it to the default
+        self._paused_settings[index] = {
+            "index.refresh_interval": settings.get("index.refresh_interval"),
+            "index.number_of_replicas": settings.get("index.number_of_replicas"),
+        }
+        self.es.indices.put_settings(index=index, settings={
+            "index.refresh_interval": "-1",
+            "index.number_of_replicas": 0,
+        })
+
+    def begin_bulk_load(self):
+        """Pause refresh and replication on every index of the version being built, for the duration of a load.
+
+        An incremental update writes to the live index, which keeps serving
+        with its replicas and refresh interval.
+        """
+        if self.version is None:
+            self._paused_settings = None
+            return
+        self._paused_settings = {}
+        for index in self.version_indices():
+            self.pause_index(index)
+
+    def end_bulk_load(self, force_merge=INDEX_FORCE_MERGE):
+        """Restore the paused settings, refresh, and optionally force-merge to one segment."""
+        if self._paused_settings is None:
+            self.es.indices.refresh(index=self.index_name)
+            return
+        paused, self._paused_settings = self._paused_settings, None
+        for index, settings in paused.items():
+            try:
+                self.es.indices.put_settings(index=index, settings=settings)
+                self.es.indices.refresh(index=index)
+                if force_merge:
+                    print(f"Force-merging '{index}'...")
+                    self.es.indices.forcemerge(index=index, max_num_segments=1)
+            except Exception as e:
+                print(f"Error restoring settings of index '{index}': {e}")
+
+    def encode_texts(self, texts, batch_size=INDEX_ENCODE_BATCH_SIZE):
+        """Embed texts in batches into a contiguous float32 matrix; empty texts get a zero row.
+
+        With an embedding store, stored vectors are reused and only the
+        texts it does not hold yet are encoded.
+        """
+        vectors = np.zeros((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        rows = [i for i, text in enumerate(texts) if text]
+        if not rows:
+            return vectors
+
+        def encode(batch):
+            return self.model.encode(batch, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+        batch = [texts[i] for i in rows]
+        if self.embedding_store is not None:
+            vectors[rows] = self.embedding_store.get_or_encode(batch, encode)
+        else:
+            vectors[rows] = np.asarray(encode(batch), dtype=np.float32)
+        return vectors
+
+    def encode_corpus(self, reviews, batch_size=INDEX_ENCODE_BATCH_SIZE, fields=None):
+        """Embed every review with one batched pass per vector field of the profile (or of fields).
+
+        Returns {field: float32 matrix}, one row per review in input order.
+        """
+        texts = {
+            "question_vector": [review["question"] or "" for review in reviews],
+            "answer_vector": [review["answer"] or "" for review in reviews],
+            "question_answer_vector": [
+                f"{review['question']} {review['answer']}" if review["question"] and review["answer"] else ""
+                for review in reviews
+            ],
+        }
+        vectors = {}
+        for field in fields or self.vector_fields:
+            print(f"Encoding {field} for {len(reviews)} reviews...")
+            vectors[field] = self.encode_texts(texts[field], batch_size)
+        return vectors
 
     def encode_vectors(self, question, answer):
         """Generate vectors for question, answer, and a combined question + answer."""
-        print("Encoding vectors for question and answer...")
-        # Use float64 to avoid np.float_ deprecation
-        question_vector = self.model.encode(question, convert_to_numpy=True).astype(np.float64) if question else np.zeros(384, dtype=np.float64)
-        answer_vector = self.model.encode(answer, convert_to_numpy=True).astype(np.float64) if answer else np.zeros(384, dtype=np.float64)
-        combined_text = f"{question} {answer}" if question and answer else ""
-        question_answer_vector = self.model.encode(combined_text, convert_to_numpy=True).astype(np.float64) if combined_text else np.zeros(384, dtype=np.float64)
-        print("Vector encoding complete.")
-        return question_vector.tolist(), answer_vector.tolist(), question_answer_vector.tolist()
-
-    def prepare_document(self, review):
-        """Prepare the document to be indexed."""
-        print(f"Preparing document for appid {review['appid']}...")
-        question_vector, answer_vector, question_answer_vector = self.encode_vectors(review["question"], review["answer"])
-        
+        vectors = self.encode_corpus([{"question": question, "answer": answer}], fields=VECTOR_FIELDS)
+        return tuple(vectors[field][0] for field in VECTOR_FIELDS)
+
+    def prepare_documents(self, reviews, vectors, keys=None):
+        """Yield the documents of reviews, taking each one's vectors from the encode_corpus matrices.
+
+        keys are the document_keys() of reviews; pass them when reviews is a
+        subset of the corpus, so records are numbered as in the full file.
+        """
+        keys = keys or document_keys(reviews)
+        for i, review in enumerate(reviews):
+            yield self.prepare_document(review, {field: matrix[i] for field, matrix in vectors.items()}, keys[i])
+
+    def prepare_document(self, review, vectors=None, key=None):
+        """Prepare the document to be indexed, with the vector fields of the profile.
+
+        vectors maps each field to its vector; they are encoded here unless given.
+        """
+        if vectors is None:
+            vectors = {field: matrix[0] for field, matrix in self.project_corpus(self.encode_corpus([review])).items()}
+        source = self.document_source(review)
+
+        return {
+            **source,
+            "document_key": key or document_keys([review])[0],
+            "content_hash": content_hash(source),
+            **{field: vector.tolist() for field, vector in vectors.items()},
+        }
+
+    def project_corpus(self, vectors):
+        """Reduce encode_corpus matrices with the projection, fitting it on them first when none is set."""
+        if not self.projection_dims:
+            return vectors
+        if self.projection is None:
+            self.set_projection(fit_projection(np.vstack(list(vectors.values())), self.projection_dims, MODEL_NAME))
+        return {field: self.projection.transform(matrix) for field, matrix in vectors.items()}
+
+    def set_projection(self, projection):
+        """Save the projection artifact and record its version in the _meta of the indices being built."""
+        projection.save()
+        self.projection = projection
+        meta = self.index_settings["mappings"]["_meta"]
+        meta["projection"] = projection.version
+        # Per-title indices are created after this and take the _meta from index_settings
+        if self.version is not None and self.layout != "per-title":
+            self.es.indices.put_mapping(index=self.version, meta=meta)
+
+    def document_source(self, review):
+        """The indexed fields of a review other than its vectors and ids."""
         return {
             "appid": review["appid"],
+            "document_id": review.get("document_id"),
             "timestamp_query": review["review"]["timestamp_query"],
             "title": review["review"]["title"],
+            "recommendationid": review["review"].get("recommendationid"),
             "author.steamid": review["review"]["author.steamid"],
             "author.playtimeforever": review["review"]["author.playtimeforever"],
             "author.playtime_last_two_weeks": review["review"]["author.playtime_last_two_weeks"],
@@ -130,25 +613,124 @@ class ReviewIndexer:
             "question": review["question"],
             "answer": review["answer"],
             "section": review["section"],
-            "question_vector": question_vector,
-            "answer_vector": answer_vector,
-            "question_answer_vector": question_answer_vector
         }
 
-    def index_reviews(self, reviews):
-        """Index the provided reviews into Elasticsearch."""
+    def index_reviews(self, reviews, batch_size=INDEX_ENCODE_BATCH_SIZE, keys=None, **kwargs):
+        """Embed the provided reviews in batches, then index them into Elasticsearch.
+
+        Returns the index_documents report with the encoding time, the
+        overall docs/s and the peak RSS of the process added.
+        """
         print(f"Starting indexing of {len(reviews)} reviews...")
-        for review in tqdm(reviews):
-            # Prepare the document
-            doc = self.prepare_document(review)
+        started = time.time()
+        vectors = self.project_corpus(self.encode_corpus(reviews, batch_size))
+        encode_seconds = time.time() - started
+        print(f"Encoded {len(reviews)} reviews in {encode_seconds:.1f}s "
+              f"({len(reviews) / max(encode_seconds, 1e-9):.1f} docs/s).")
 
-            # Index the document
-            try:
-                print(f"Indexing document for appid {review['appid']}...")
-                self.es.index(index=self.index_name, document=doc)  # Change here from body to document
-                print(f"Document for appid {review['appid']} indexed successfully.")
-            except Exception as e:
-                print(f"Error indexing document with appid {review['appid']}: {e}")
+        report = self.index_documents(self.prepare_documents(reviews, vectors, keys), **kwargs)
+        total_seconds = time.time() - started
+        report.update({
+            "profile": self.profile,
+            "vector_fields": self.vector_fields,
+            "projection": self.projection.stats() if self.projection is not None else None,
+            "encode_seconds": encode_seconds,
+            "encode_docs_per_second": len(reviews) / encode_seconds if encode_seconds > 0 else 0.0,
+            "encode_batch_size": batch_size,
+            "total_seconds": total_seconds,
+            "total_docs_per_second": report["indexed"] / total_seconds if total_seconds > 0 else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+            "embedding_store": self.embedding_store.stats() if self.embedding_store is not None else None,
+        })
+        print(f"Reindex took {total_seconds:.1f}s ({report['total_docs_per_second']:.1f} docs/s), "
+              f"peak RSS {report['peak_rss_mb']:.0f} MiB.")
+        if self.embedding_store is not None:
+            print(f"Embedding store hit rate: {report['embedding_store']['hit_rate']:.1%}")
+        return report
+
+    def collect_embedding_garbage(self, ratio=EMBEDDING_STORE_GC_RATIO):
+        """After a full reindex, drop stored vectors of texts that left the corpus once they exceed ratio."""
+        if self.embedding_store is None:
+            return 0
+        garbage = self.embedding_store.garbage_ratio()
+        if garbage < ratio:
+            print(f"Embedding store: {garbage:.1%} unreferenced, below {ratio:.0%}; not collecting.")
+            return 0
+        return self.embedding_store.collect_garbage()
+
+    def index_documents(self, documents, chunk_size=INDEX_CHUNK_SIZE, thread_count=INDEX_THREADS,
+                        force_merge=INDEX_FORCE_MERGE):
+        """Bulk-index prepared documents, each into the index (and routing) of its title.
+
+        Documents are written with their document_key as _id, so indexing a
+        record again replaces it.
+
+        Refresh and replicas are off while the load runs (see begin_bulk_load).
+        With thread_count > 1, chunks of chunk_size documents are sent by
+        parallel_bulk; otherwise by streaming_bulk, which also retries
+        rejected chunks. Returns a report with the indexed and failed counts,
+        docs/s and one entry per failed document.
+        """
+        # streaming_bulk yields retried documents after the rest of their chunk, so
+        # results are matched to documents by _id rather than by position
+        pending = {}
+
+        def actions():
+            for doc in documents:
+                pending[doc["document_key"]] = {"appid": doc.get("appid"), "document_id": doc.get("document_id"),
+                                                "title": doc.get("title")}
+                target = self.index_target(doc["title"])
+                if doc.get("question_answer_vector") is not None:
+                    self._warm_vectors.setdefault(doc["title"], doc["question_answer_vector"])
+                yield {"_index": target["index"], **({"routing": target["routing"]} if "routing" in target else {}),
+                       "_id": doc["document_key"], "_source": doc}
+
+        options = {"chunk_size": chunk_size, "raise_on_error": False, "raise_on_exception": False}
+        indexed = 0
+        failures = []
+        started = time.time()
+        self.begin_bulk_load()
+        try:
+            if thread_count > 1:
+                results = parallel_bulk(self.es, actions(), thread_count=thread_count, **options)
+            else:
+                results = streaming_bulk(self.es, actions(), max_retries=3, **options)
+            for ok, item in tqdm(results, unit="doc"):
+                result = next(iter(item.values()))
+                document = pending.pop(result.get("_id"), {})
+                if ok:
+                    indexed += 1
+                    continue
+                failures.append({
+                    "document_key": result.get("_id"),
+                    **document,
+                    "status": result.get("status"),
+                    "error": result.get("error") or str(result.get("exception")),
+                })
+        finally:
+            self.end_bulk_load(force_merge=force_merge)
+
+        elapsed = time.time() - started
+        report = {
+            "index": self.index_name,
+            "indexed": indexed,
+            "failed": len(failures),
+            "seconds": elapsed,
+            "docs_per_second": indexed / elapsed if elapsed > 0 else 0.0,
+            "chunk_size": chunk_size,
+            "thread_count": thread_count,
+            "force_merge": force_merge,
+            "failures": failures,
+        }
+        print(f"Indexed {indexed} documents in {elapsed:.1f}s ({report['docs_per_second']:.1f} docs/s), "
+              f"{len(failures)} failed.")
+        return report
+
+    def save_report(self, report, path=INDEX_REPORT_PATH):
+        """Write an index_documents report as JSON."""
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, default=str)
+        print(f"Indexing report written to {path}")
 
     def load_reviews_from_file(self, file_path):
         """Load reviews from a JSON file."""
@@ -169,13 +751,18 @@ if __name__ == "__main__":
     output_file = os.path.join(data_dir, "ground_truth_retrieval.json")
 
     # Initialize the model
-    print("Initializing SentenceTransformer model...")
-    model_name = 'multi-qa-MiniLM-L6-cos-v1'
-    model = SentenceTransformer(model_name)
+    print("Initializing embedding model...")
+    model_name = MODEL_NAME
+    model = load_embedder(model_name, num_threads=INDEX_ENCODE_THREADS)
     print(f"Model '{model_name}' initialized.")
 
+    # Vectors of unchanged texts are reused from earlier runs
+    embedding_store = None
+    if EMBEDDING_STORE_ENABLED:
+        embedding_store = EmbeddingStore(f"{model_name}:{EMBEDDER_BACKEND}", model.get_sentence_embedding_dimension())
+
     # Load reviews from the specified JSON file
-    indexer = ReviewIndexer(model=model)
+    indexer = ReviewIndexer(model=model, embedding_store=embedding_store)
 
     # Initialize paths
     json_file_path = os.path.abspath('../llm-zoomcamp-capstone-01/backend/app/data/ground_truth_retrieval.json')
@@ -188,12 +775,22 @@ if __name__ == "__main__":
             print("Loading reviews from existing file...")
             reviews = indexer.load_reviews_from_file(json_file_path)
             if reviews:
-                indexer.index_reviews(reviews)
+                if INDEX_MODE == "incremental":
+                    report = indexer.update(reviews)
+                else:
+                    report = indexer.rebuild(reviews)
+                indexer.save_report(report)
+                # An incremental update only looks up the changed records, so the rest would look unreferenced
+                if report["mode"] == "rebuild":
+                    indexer.collect_embedding_garbage()
+                if RETRIEVAL_BACKEND == "local":
+                    build_local_index()
             else:
                 print("No reviews found to index.")
         else:
             print(f"Found existing empty data in {json_file_path}. Running ingest_documents...")
             data_directory
 
+    # Only creates missing tables: the app may be serving from them during a reindex
     print("Initializing PostgreSQL database...")
     init_db()
@@ -0,0 +1,211 @@
+import os
+import time
+import hashlib
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+# Dimensions prep.py reduces the vectors to; 0 indexes the full embeddings
+PROJECTION_DIMS = int(os.getenv("PROJECTION_DIMS", "0"))
+PROJECTION_PATH = os.getenv(
+    "PROJECTION_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "projections"),
+)
+PROJECTION_REFRESH_INTERVAL = float(os.getenv("PROJECTION_REFRESH_INTERVAL", "30"))
+# Rebuilds reuse the projection of the live index; set to fit a new one on the corpus instead
+PROJECTION_REFIT = os.getenv("PROJECTION_REFIT", "0") == "1"
+
+
+class Projection:
+    """A fitted PCA projection of embeddings to fewer dimensions.
+
+    transform() centres vectors on the corpus mean, projects them onto the
+    principal components and L2-normalizes the result; zero rows (empty
+    texts) stay zero. The version is a hash of the model name and the
+    parameters, so an index and the artifact it was built with can be
+    matched exactly.
+    """
+
+    def __init__(self, mean, components, model_name, explained_variance=None, fitted_on=0):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.ascontiguousarray(components, dtype=np.float32)  # (dims, input dims)
+        self.model_name = model_name
+        self.explained_variance = float(explained_variance) if explained_variance is not None else None
+        self.fitted_on = int(fitted_on)
+        digest = hashlib.sha256(model_name.encode("utf-8"))
+        digest.update(self.mean.tobytes())
+        digest.update(self.components.tobytes())
+        self.version = f"pca{self.dims}-{digest.hexdigest()[:12]}"
+
+    @property
+    def dims(self):
+        return self.components.shape[0]
+
+    @property
+    def input_dims(self):
+        return self.components.shape[1]
+
+    def transform(self, vectors):
+        """Project one vector or a matrix of row vectors; returns float32 of the same rank."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        matrix = vectors.reshape(-1, self.input_dims)
+        nonzero = np.any(matrix != 0, axis=1)
+        projected = (matrix - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        projected /= np.clip(norms, 1e-12, None)
+        projected[~nonzero] = 0
+        return projected[0] if vectors.ndim == 1 else projected
+
+    def save(self, path=PROJECTION_PATH):
+        """Write the projection to {path}/{version}.npz; existing versions are never overwritten."""
+        os.makedirs(path, exist_ok=True)
+        file_path = os.path.join(path, f"{self.version}.npz")
+        if not os.path.exists(file_path):
+            tmp_path = os.path.join(path, f"{self.version}.tmp.npz")
+            np.savez(
+                tmp_path,
+                mean=self.mean,
+                components=self.components,
+                model_name=np.array(self.model_name),
+                explained_variance=np.array(
+                    self.explained_variance if self.explained_variance is not None else np.nan
+                ),
+                fitted_on=np.array(self.fitted_on),
+            )
+            os.replace(tmp_path, file_path)
+        print(f"Projection {self.version} saved to {file_path}.")
+        return file_path
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "dims": self.dims,
+            "input_dims": self.input_dims,
+            "explained_variance": self.explained_variance,
+            "fitted_on": self.fitted_on,
+        }
+
+
+def fit_projection(vectors, dims, model_name):
+    """Fit a PCA projection of the row vectors (zero rows ignored) down to dims dimensions."""
+    from sklearn.decomposition import PCA
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors[np.any(vectors != 0, axis=1)]
+    if not 0 < dims < vectors.shape[1]:
+        raise ValueError(f"Projection dims must be between 1 and {vectors.shape[1] - 1}, got {dims}")
+    if len(vectors) < dims:
+        raise ValueError(f"Cannot fit {dims} components on {len(vectors)} vectors")
+    print(f"Fitting a {dims}-dim PCA projection on {len(vectors)} vectors...")
+    pca = PCA(n_components=dims, random_state=0).fit(vectors)
+    projection = Projection(
+        pca.mean_, pca.components_, model_name,
+        explained_variance=pca.explained_variance_ratio_.sum(), fitted_on=len(vectors),
+    )
+    print(f"Projection {projection.version} keeps {projection.explained_variance:.1%} of the variance.")
+    return projection
+
+
+def load_projection(version, path=PROJECTION_PATH):
+    """Load the projection artifact of a version; raises FileNotFoundError when it is missing."""
+    with np.load(os.path.join(path, f"{version}.npz")) as artifact:
+        explained_variance = float(artifact["explained_variance"])
+        projection = Projection(
+            artifact["mean"], artifact["components"], str(artifact["model_name"]),
+            explained_variance=None if np.isnan(explained_variance) else explained_variance,
+            fitted_on=int(artifact["fitted_on"]),
+        )
+    if projection.version != version:
+        raise ValueError(f"Projection artifact {version} does not match its contents ({projection.version})")
+    return projection
+
+
+class ProjectionLoader:
+    """Keeps the projection of the live index loaded for query-time use.
+
+    projection_fn returns the projection version the live index was built
+    with (None for full vectors). It is called again whenever version_fn
+    returns a different value, at most every refresh_interval seconds, so
+    the projection follows a reindex without a restart. Until a load
+    succeeds (the index could not be read, or the artifact is missing) it
+    is retried at the same pace and ready() is False.
+    """
+
+    def __init__(self, projection_fn, version_fn=None, path=PROJECTION_PATH,
+                 refresh_interval=PROJECTION_REFRESH_INTERVAL):
+        self.projection_fn = projection_fn
+        self.version_fn = version_fn
+        self.path = path
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._projection = None
+        self._resolved = False  # whether the last refresh() loaded the live index's projection
+        self._version = None
+        self._version_checked_at = 0.0
+
+        self.loads = 0
+        self.errors = 0
+
+        self.refresh()
+
+    def refresh(self):
+        """Load the projection the live index uses, or drop it when the index holds full vectors."""
+        try:
+            version = self.projection_fn()
+            projection = load_projection(version, self.path) if version else None
+        except Exception as e:
+            self.errors += 1
+            self._resolved = False
+            print(f"Error loading the index projection: {e}")
+            return
+        with self._lock:
+            self._projection = projection
+            self._resolved = True
+            self.loads += 1
+        print(f"Index projection: {projection.version if projection else 'none (full vectors)'}.")
+
+    def get(self):
+        """Return the current Projection, or None when the index holds full vectors."""
+        self._check_version()
+        with self._lock:
+            return self._projection
+
+    def ready(self):
+        """True once the projection of the live index (or its absence) is known; retries a failed load."""
+        self._check_version()
+        return self._resolved
+
+    def transform(self, vector):
+        """Project a query vector for the live index; unchanged without a projection."""
+        projection = self.get()
+        return projection.transform(vector) if projection is not None else vector
+
+    def stats(self):
+        with self._lock:
+            projection = self._projection
+        return {
+            **(projection.stats() if projection is not None else {"version": None}),
+            "ready": self._resolved,
+            "loads": self.loads,
+            "errors": self.errors,
+        }
+
+    def _check_version(self):
+        now = time.time()
+        if now - self._version_checked_at < self.refresh_interval:
+            return
+        self._version_checked_at = now
+
+        version = self.version_fn() if self.version_fn is not None else None
+        if not self._resolved:
+            print("Retrying the index projection load.")
+            self.refresh()
+        elif version is not None and self._version is not None and version != self._version:
+            print(f"Index version is now {version}, reloading the projection.")
+            self.refresh()
+        if version is not None:
+            self._version = version
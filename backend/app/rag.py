@@ -1,10 +1,20 @@
 import os
 import json
 import time
-from openai import OpenAI
+import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from read import ReviewReader
+from llm_client import get_llm_client, LLMUnavailableError, LLMRequestError
+from semantic_cache import SemanticCache, SEMANTIC_CACHE_ENABLED
+from embedding_cache import QueryEmbeddingCache, QUERY_CACHE_ENABLED
+from embedding_batcher import EmbeddingBatcher, EMBED_BATCHING_ENABLED
+from title_resolver import TitleResolver, TITLE_RESOLVER_ENABLED
+from projection import ProjectionLoader
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
+from embedder import load_embedder, MODEL_NAME, EMBEDDER_BACKEND
+from local_index import LocalReviewReader, RETRIEVAL_BACKEND
 
 
 # Load environment variables
@@ -14,24 +24,309 @@ load_dotenv()
 ELASTIC_URL = os.getenv("ELASTIC_URL", "http://localhost:9200")
 INDEX_NAME = os.getenv("INDEX_NAME", "reviews-steam")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+BATCH_ENCODE_SIZE = int(os.getenv("BATCH_ENCODE_SIZE", "64"))
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")  # hybrid | rrf | rrf-server
+RRF_RANK_CONSTANT = int(os.getenv("RRF_RANK_CONSTANT", "60"))
+RRF_WINDOW_SIZE = int(os.getenv("RRF_WINDOW_SIZE", "0"))  # 0 uses num_results
+
+model_name = MODEL_NAME
+
+# The embedder, the Elasticsearch reader and the caches are built on first use.
+# Importing this module stays cheap, and gunicorn.conf.py can load the model
+# weights once in the master so forked workers share them copy-on-write.
+_model = None
+_reader = None
+_embedding_batcher = None
+_query_embedding_cache = None
+_semantic_cache = None
+_title_resolver = None
+_async_reader = None
+_projection_loader = None
+_init_lock = threading.RLock()
+
+# Requests answered without an LLM call: unknown titles and retrievals with no hits
+_short_circuits = {"unknown_title": 0, "empty_context": 0}
+_short_circuits_lock = threading.Lock()
+
+
+class UnknownTitleError(ValueError):
+    """The requested title does not match any title in the index."""
+
+    def __init__(self, title, suggestions=()):
+        super().__init__(f"Unknown game title: {title}")
+        self.title = title
+        self.suggestions = list(suggestions)
+
+
+def get_model():
+    global _model
+    if _model is None:
+        with _init_lock:
+            if _model is None:
+                _model = load_embedder(model_name)
+    return _model
+
+
+def get_reader():
+    global _reader
+    if _reader is None:
+        with _init_lock:
+            if _reader is None:
+                if RETRIEVAL_BACKEND == "local":
+                    _reader = LocalReviewReader(model=get_model())
+                else:
+                    _reader = ReviewReader(model=get_model())
+    return _reader
+
+
+# asyncio retrieval for async servers; built on first use inside the serving event loop
+async def get_async_reader():
+    global _async_reader
+    if _async_reader is None:
+        from async_read import AsyncReviewReader
+        reader = AsyncReviewReader(model=get_model())
+        await reader.check_connection()
+        if _async_reader is None:
+            _async_reader = reader
+        else:
+            await reader.close()
+    return _async_reader
+
+
+# Concurrent requests share one forward pass instead of encoding one question each
+def get_embedding_batcher():
+    global _embedding_batcher
+    if _embedding_batcher is None and EMBED_BATCHING_ENABLED:
+        with _init_lock:
+            if _embedding_batcher is None:
+                _embedding_batcher = EmbeddingBatcher(get_model())
+    return _embedding_batcher
+
+
+def embed(question):
+    batcher = get_embedding_batcher()
+    return batcher.encode(question) if batcher is not None else get_model().encode(question)
+
+
+# Repeated questions reuse their embedding instead of running the model again
+def get_query_embedding_cache():
+    global _query_embedding_cache
+    if _query_embedding_cache is None and QUERY_CACHE_ENABLED:
+        with _init_lock:
+            if _query_embedding_cache is None:
+                # Keyed like prep's EmbeddingStore: the backends' vectors differ slightly
+                _query_embedding_cache = QueryEmbeddingCache(f"{model_name}:{EMBEDDER_BACKEND}")
+    return _query_embedding_cache
+
+
+# Answers are reused for near-duplicate questions about the same title
+def get_semantic_cache():
+    global _semantic_cache
+    if _semantic_cache is None and SEMANTIC_CACHE_ENABLED:
+        with _init_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache(version_fn=get_reader().index_version)
+    return _semantic_cache
+
+
+# Free-text titles are resolved against the titles in the index, refreshed on reindex
+def get_title_resolver():
+    global _title_resolver
+    if _title_resolver is None and TITLE_RESOLVER_ENABLED:
+        with _init_lock:
+            if _title_resolver is None:
+                reader = get_reader()
+                _title_resolver = TitleResolver(reader.read_titles, version_fn=reader.index_version)
+    return _title_resolver
+
+
+# Query vectors are reduced with the projection the live index was built with, if any
+def get_projection_loader():
+    global _projection_loader
+    if _projection_loader is None:
+        with _init_lock:
+            if _projection_loader is None:
+                reader = get_reader()
+                _projection_loader = ProjectionLoader(reader.index_projection, version_fn=reader.index_version)
+    return _projection_loader
+
+
+def count_short_circuit(reason):
+    with _short_circuits_lock:
+        _short_circuits[reason] += 1
+
+
+# Function to map a user-supplied title to the indexed one; raises UnknownTitleError
+def resolve_title(title):
+    title_resolver = get_title_resolver()
+    if title_resolver is None:
+        return title
+    resolved = title_resolver.resolve(title)
+    if resolved is None:
+        count_short_circuit("unknown_title")
+        raise UnknownTitleError(title, title_resolver.suggest(title))
+    return resolved
+
+
+# Function to report cache and batcher stats without building anything not yet in use
+def component_stats():
+    with _short_circuits_lock:
+        short_circuits = dict(_short_circuits)
+    return {
+        "semantic_cache": _semantic_cache.stats() if _semantic_cache is not None else None,
+        "query_embedding_cache": (
+            _query_embedding_cache.stats() if _query_embedding_cache is not None else None
+        ),
+        "embedding_batcher": _embedding_batcher.stats() if _embedding_batcher is not None else None,
+        "title_resolver": _title_resolver.stats() if _title_resolver is not None else None,
+        "async_reader_pool": _async_reader.stats() if _async_reader is not None else None,
+        "projection": _projection_loader.stats() if _projection_loader is not None else None,
+        "short_circuits": short_circuits,
+    }
+
+
+_warmed_up = False
+_warmup_lock = threading.Lock()
+
+
+# Function to load the model and run one encode; returns whether the model is warm
+def warmup():
+    global _warmed_up
+    if _warmed_up:
+        return True
+    # Concurrent callers (e.g. /ready polls) do not queue behind a warmup in progress
+    if not _warmup_lock.acquire(blocking=False):
+        return False
+    try:
+        if not _warmed_up:
+            started = time.time()
+            embed("Is this game worth buying?")
+            get_reader()
+            get_title_resolver()
+            get_projection_loader()
+            _warmed_up = True
+            print(f"Warmup complete in {time.time() - started:.2f}s")
+    except Exception as e:
+        print(f"Warmup failed: {e}")
+    finally:
+        _warmup_lock.release()
+    return _warmed_up
+
+
+# Function to check whether this process can serve questions
+def readiness():
+    model_ready = warmup()
+    elasticsearch_ready = False
+    projection_ready = False
+    if model_ready:
+        try:
+            elasticsearch_ready = get_reader().ping()
+        except Exception as e:
+            print(f"Retrieval backend ping failed: {e}")
+    if elasticsearch_ready:
+        # A projected index cannot be searched with full-size query vectors
+        projection_ready = get_projection_loader().ready()
+    return {
+        "ready": model_ready and elasticsearch_ready and projection_ready,
+        "model": model_ready,
+        "elasticsearch": elasticsearch_ready,
+        "projection": projection_ready,
+    }
+
 
-# Initialize the ReviewReader with the required model
-model_name = 'multi-qa-MiniLM-L6-cos-v1'
-model = SentenceTransformer(model_name)
-reader = ReviewReader(model=model)
+@contextmanager
+def timed(timings, stage):
+    """Record the wall-clock duration of a block in timings[stage] (seconds)."""
+    started = time.time()
+    try:
+        yield
+    finally:
+        timings[stage] = time.time() - started
+
+
+# Function to embed the user question; a custom model bypasses the cache
+def encode_query(question, custom_model=None):
+    if custom_model is not None:
+        return custom_model.encode(question)
+    query_embedding_cache = get_query_embedding_cache()
+    if query_embedding_cache is not None:
+        return query_embedding_cache.get_or_encode(question, embed)
+    return embed(question)
+
+
+# Function to embed many questions with one batched encode for all cache misses
+def encode_queries(questions):
+    query_embedding_cache = get_query_embedding_cache()
+    vectors = [None] * len(questions)
+    if query_embedding_cache is not None:
+        vectors = [query_embedding_cache.get(question) for question in questions]
+
+    misses = [i for i, vector in enumerate(vectors) if vector is None]
+    if misses:
+        encoded = get_model().encode([questions[i] for i in misses], batch_size=BATCH_ENCODE_SIZE)
+        for i, vector in zip(misses, encoded):
+            vectors[i] = vector
+            if query_embedding_cache is not None:
+                query_embedding_cache.put(questions[i], vector)
+    return vectors
+
+
+# Function to turn a question (or its embedding) into the query vector of the live index
+def query_vector(question, vector=None, model=None):
+    v_q = vector if vector is not None else encode_query(question, custom_model=model)
+    return get_projection_loader().transform(v_q)
 
 
 # Function to search for reviews
-def search(query, model=model, num_results=5):
+def search(query, model=None, num_results=5, vector=None, stats=None):
     # Uses the ReviewReader to perform the search using KNN and keyword matching
     question = query['question']
     title = query['title']
 
     field='question_answer_vector'
-    v_q = model.encode(question)
+    v_q = query_vector(question, vector, model)
 
-    return reader.read_reviews_knn_and_keyword(field=field, query=query, title=title, vector=v_q, num_results=num_results)
+    if RETRIEVAL_MODE in ("rrf", "rrf-server"):
+        return get_reader().read_reviews_knn_and_keyword_rrf(
+            field=field, query=question, title=title, vector=v_q, k=RRF_RANK_CONSTANT,
+            num_results=num_results, stats=stats, window_size=RRF_WINDOW_SIZE,
+            server_side=RETRIEVAL_MODE == "rrf-server",
+        )
+    return get_reader().read_reviews_knn_and_keyword(field=field, query=question, title=title, vector=v_q, num_results=num_results, stats=stats)
+
+
+# Awaitable search() for async servers: many searches share a few threads and pooled connections
+async def search_async(query, num_results=5, vector=None, stats=None):
+    question = query['question']
+    title = query['title']
+
+    field = 'question_answer_vector'
+    # Embedding is CPU-bound, so it runs off the event loop
+    v_q = await asyncio.to_thread(query_vector, question, vector)
+
+    reader = await get_async_reader()
+    if RETRIEVAL_MODE in ("rrf", "rrf-server"):
+        return await reader.read_reviews_knn_and_keyword_rrf(
+            field=field, query=question, title=title, vector=v_q, k=RRF_RANK_CONSTANT,
+            num_results=num_results, stats=stats, window_size=RRF_WINDOW_SIZE,
+            server_side=RETRIEVAL_MODE == "rrf-server",
+        )
+    return await reader.read_reviews_knn_and_keyword(
+        field=field, query=question, title=title, vector=v_q, num_results=num_results, stats=stats
+    )
+
+
+DEGRADED_ANSWER = (
+    "Sorry, the review assistant cannot reach its language model right now. "
+    "Please try again in a moment."
+)
+
+NO_CONTEXT_ANSWER = (
+    "Sorry, I could not find any reviews of {title} that match this question. "
+    "Try rephrasing it or asking about another aspect of the game."
+)
 
 
 prompt_template = """
@@ -45,37 +340,128 @@ CONTEXT:
 """.strip()
 
 
+review_template = """
+review.title: {title}
+review.review: {review}
+""".strip()
+
+
 entry_template = """
-review.title: {review.title}
-review.review: {review.review}
 answer: {answer}
 section: {section}
 """.strip()
 
+# Reviews are only truncated when at least this many tokens of the body fit
+MIN_TRUNCATED_REVIEW_TOKENS = 50
+
+
+# tiktoken encodings by model name, imported on first use. Without tiktoken, or
+# when its encoding files cannot be fetched (offline containers), token counts
+# fall back to an estimate of ~4 characters per token.
+_encodings = {}
+
+def get_encoding(model):
+    if model not in _encodings:
+        try:
+            import tiktoken
+        except ImportError:
+            return None
+        try:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            print(f"Error loading the tiktoken encoding for {model}, estimating token counts: {e}")
+            _encodings[model] = None
+    return _encodings[model]
+
+
+# Function to count prompt tokens; falls back to ~4 characters per token without tiktoken
+def count_tokens(text, model="gpt-4o-mini"):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4o-mini"):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+# Function to group search hits by source review, keeping rank order
+def group_by_review(search_results):
+    groups = {}
+    for doc in search_results:
+        key = doc.get("recommendationid") or doc.get("review")
+        group = groups.setdefault(key, {
+            "id": key,
+            "title": doc.get("title"),
+            "review": doc.get("review", ""),
+            "entries": [],
+        })
+        entry = {"answer": doc.get("answer", ""), "section": doc.get("section", "")}
+        if entry not in group["entries"]:
+            group["entries"].append(entry)
+    return list(groups.values())
+
 
 # Function to build the prompt based on search results
-def build_prompt(query, search_results):
-    context = ""
+def build_prompt(query, search_results, token_budget=PROMPT_TOKEN_BUDGET):
+    """Build the prompt with each source review once, within token_budget prompt tokens.
+
+    Returns the prompt and a dict describing how the context was assembled,
+    including the reviews that were dropped or truncated to fit the budget.
+    """
+    question = query["question"]
+    remaining = token_budget - count_tokens(prompt_template.format(question=question, context=""))
+
+    blocks = []
+    dropped = []
+    truncated = []
+    for group in group_by_review(search_results):
+        entries = "\n".join(entry_template.format(**entry) for entry in group["entries"])
+        block = review_template.format(**group) + "\n" + entries + "\n\n"
+        block_tokens = count_tokens(block)
+
+        if block_tokens > remaining:
+            # Keep the answers and cut the review body to whatever still fits
+            header = review_template.format(title=group["title"], review="") + "\n" + entries + "\n\n"
+            review_budget = remaining - count_tokens(header) - 1
+            if review_budget < MIN_TRUNCATED_REVIEW_TOKENS:
+                dropped.append(group["id"])
+                continue
+            review = truncate_to_tokens(group["review"], review_budget) + "..."
+            block = review_template.format(title=group["title"], review=review) + "\n" + entries + "\n\n"
+            block_tokens = count_tokens(block)
+            truncated.append(group["id"])
+
+        blocks.append(block)
+        remaining -= block_tokens
+
+    prompt = prompt_template.format(question=question, context="".join(blocks)).strip()
+    context_stats = {
+        "context_hits": len(search_results),
+        "context_reviews": len(blocks),
+        "context_dropped": dropped,
+        "context_truncated": truncated,
+        "context_token_budget": token_budget,
+    }
+    return prompt, context_stats
 
-    for doc in search_results:
-        context = context + entry_template.format(**doc) + "\n\n"
+# Function to generate the LLM response from OpenAI
+def llm(prompt, model="gpt-4o-mini", timings=None):
+    # Deadlines, retries, hedging and the circuit breaker live in llm_client
+    started = time.time()
+    answer, token_stats, time_to_first_token = get_llm_client().complete(prompt, model=model)
 
-    prompt = prompt_template.format(question=query, context=context).strip()
-    return prompt
+    if timings is not None:
+        timings["llm"] = time.time() - started
+        timings["llm_ttft"] = time_to_first_token
 
-# Function to generate the LLM response from OpenAI
-def llm(prompt, model="gpt-4o-mini"):
-    response = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}]
-    )
-    
-    answer = response.choices[0].message.content
-    token_stats = {
-        "prompt_tokens": response.usage.prompt_tokens,
-        "completion_tokens": response.usage.completion_tokens,
-        "total_tokens": response.usage.total_tokens,
-    }
     return answer, token_stats
 
 
@@ -132,45 +518,255 @@ def calculate_openai_cost(model, tokens):
 # Main RAG function to handle the query and LLM interaction
 def rag_answer(query, title, model="gpt-4o-mini"):
     start_time = time.time()
+    timings = {}
 
     query = {"question": query, "title": title}
+    with timed(timings, "encode"):
+        v_q = encode_query(query["question"])
+
+    semantic_cache = get_semantic_cache()
+    # Serve near-duplicate questions from the semantic cache
+    if semantic_cache is not None:
+        with timed(timings, "cache_lookup"):
+            cached = semantic_cache.get(title, v_q)
+        if cached is not None:
+            return cached_answer(cached, start_time, timings)
+
     # Search for reviews related to the query
-    search_results = search(query)
-    
+    with timed(timings, "search"):
+        search_results = search(query, vector=v_q, stats=timings)
+
+    answer_data = answer_from_results(query, search_results, model, start_time, timings)
+
+    if semantic_cache is not None and not answer_data.get("degraded") and not answer_data.get("no_context"):
+        semantic_cache.put(title, query["question"], v_q, answer_data)
+
+    return answer_data
+
+
+# Function to run the prompt and LLM steps on retrieved reviews
+def answer_from_results(query, search_results, model, start_time, timings):
+    # Nothing to ground an answer on: skip the LLM call
+    if not search_results:
+        return no_context_answer(query, model, start_time, timings)
+
     # Build the prompt from the search results
-    prompt = build_prompt(query, search_results)
+    with timed(timings, "prompt"):
+        prompt, context_stats = build_prompt(query, search_results)
     
     # Get LLM-generated answer
-    answer, token_stats = llm(prompt, model=model)
-    
-    # Evaluate the relevance of the answer
-    relevance, rel_token_stats = evaluate_relevance(query, answer)
+    try:
+        answer, token_stats = llm(prompt, model=model, timings=timings)
+    except (LLMUnavailableError, LLMRequestError) as e:
+        # A rejected request (e.g. context length) is no reason to fail the whole request
+        print(f"LLM call failed, returning degraded answer: {e}")
+        return degraded_answer(model, start_time, timings, context_stats)
+
+    return final_answer(answer, token_stats, model, start_time, timings, context_stats)
 
+
+# Function to assemble the answer data stored with the conversation
+def final_answer(answer, token_stats, model, start_time, timings, context_stats):
     # Response time
     response_time = time.time() - start_time
     
-    # Calculate costs
-    openai_cost_rag = calculate_openai_cost(model, token_stats)
-    openai_cost_eval = calculate_openai_cost(model, rel_token_stats)
-
-    openai_cost = openai_cost_rag + openai_cost_eval
+    # Calculate costs; the relevance evaluation runs in the background
+    # (see evaluation.py) and adds its own cost once it finishes
+    openai_cost = calculate_openai_cost(model, token_stats)
 
     # Create final answer data
-    answer_data = {
+    return {
         "answer": answer,
         "model_used": model,
         "response_time": response_time,
-        "relevance": relevance.get("Relevance", "UNKNOWN"),
-        "relevance_explanation": relevance.get(
-            "Explanation", "Failed to parse evaluation"
-        ),
+        "relevance": "PENDING",
+        "relevance_explanation": "Evaluation pending",
         "prompt_tokens": token_stats["prompt_tokens"],
         "completion_tokens": token_stats["completion_tokens"],
         "total_tokens": token_stats["total_tokens"],
-        "eval_prompt_tokens": rel_token_stats["prompt_tokens"],
-        "eval_completion_tokens": rel_token_stats["completion_tokens"],
-        "eval_total_tokens": rel_token_stats["total_tokens"],
+        "eval_prompt_tokens": 0,
+        "eval_completion_tokens": 0,
+        "eval_total_tokens": 0,
         "openai_cost": openai_cost,
+        "timings": timings,
+        **context_stats,
     }
 
+
+# Streaming RAG function used by the /question/stream endpoint
+def rag_answer_stream(query, title, model="gpt-4o-mini"):
+    """Yield ("token", text) events as the LLM writes the answer, then ("done", answer_data).
+
+    Semantic cache hits and degraded answers arrive as a single token event.
+    If the LLM fails after some tokens were sent, the done event carries the
+    partial answer marked as degraded.
+    """
+    start_time = time.time()
+    timings = {}
+
+    query = {"question": query, "title": title}
+    with timed(timings, "encode"):
+        v_q = encode_query(query["question"])
+
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        with timed(timings, "cache_lookup"):
+            cached = semantic_cache.get(title, v_q)
+        if cached is not None:
+            answer_data = cached_answer(cached, start_time, timings)
+            yield "token", answer_data["answer"]
+            yield "done", answer_data
+            return
+
+    with timed(timings, "search"):
+        search_results = search(query, vector=v_q, stats=timings)
+
+    if not search_results:
+        answer_data = no_context_answer(query, model, start_time, timings)
+        yield "token", answer_data["answer"]
+        yield "done", answer_data
+        return
+
+    with timed(timings, "prompt"):
+        prompt, context_stats = build_prompt(query, search_results)
+
+    chunks = []
+    token_stats = {}
+    try:
+        with timed(timings, "llm"):
+            for text in get_llm_client().stream(prompt, model=model, stats=token_stats):
+                chunks.append(text)
+                yield "token", text
+    except (LLMUnavailableError, LLMRequestError) as e:
+        # A rejected request (e.g. context length) is no reason to fail the whole request
+        print(f"LLM call failed, returning degraded answer: {e}")
+        answer_data = degraded_answer(model, start_time, timings, context_stats)
+        if chunks:
+            answer_data["answer"] = "".join(chunks)
+        else:
+            yield "token", answer_data["answer"]
+        yield "done", answer_data
+        return
+
+    timings["llm_ttft"] = token_stats.pop("time_to_first_token")
+    answer_data = final_answer("".join(chunks), token_stats, model, start_time, timings, context_stats)
+
+    if semantic_cache is not None:
+        semantic_cache.put(title, query["question"], v_q, answer_data)
+
+    yield "done", answer_data
+
+
+# Batch RAG function used by the /questions endpoint
+def rag_answer_batch(items, model="gpt-4o-mini", concurrency=BATCH_LLM_CONCURRENCY):
+    """Answer a list of {"question", "title"} items.
+
+    All questions are embedded in one batched encode and searched in one
+    _msearch round trip, then the LLM calls run on up to `concurrency`
+    threads. Returns one entry per item in input order: the answer data, or
+    {"error": message} when that item failed. The semantic cache is not used
+    so that batch jobs always see fresh answers.
+    """
+    if not items:
+        return []
+
+    start_time = time.time()
+    batch_timings = {}
+    queries = [{"question": item["question"], "title": item["title"]} for item in items]
+
+    with timed(batch_timings, "batch_encode"):
+        vectors = encode_queries([q["question"] for q in queries])
+
+    with timed(batch_timings, "batch_search"):
+        results = get_reader().read_reviews_knn_and_keyword_batch(
+            field='question_answer_vector',
+            queries=[q["question"] for q in queries],
+            vectors=[get_projection_loader().transform(vector) for vector in vectors],
+            titles=[q["title"] for q in queries],
+            stats=batch_timings,
+            mode="rrf" if RETRIEVAL_MODE in ("rrf", "rrf-server") else "hybrid",
+            k=RRF_RANK_CONSTANT,
+            window_size=RRF_WINDOW_SIZE,
+        )
+    # msearch took (or the local index search time) covers the whole batch; keep it
+    # apart from the per-request search timings
+    for stage in ("es_took", "local_search"):
+        if stage in batch_timings:
+            batch_timings[f"batch_{stage}"] = batch_timings.pop(stage)
+
+    def answer_one(i):
+        if isinstance(results[i], Exception):
+            return {"error": str(results[i])}
+        try:
+            return answer_from_results(queries[i], results[i], model, start_time, dict(batch_timings))
+        except Exception as e:
+            print(f"Error answering batch item {i}: {e}")
+            return {"error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        return list(pool.map(answer_one, range(len(queries))))
+
+
+# Function to build answer data when the LLM cannot be reached
+def degraded_answer(model, start_time, timings, context_stats):
+    return {
+        "answer": DEGRADED_ANSWER,
+        "model_used": model,
+        "response_time": time.time() - start_time,
+        "relevance": "SKIPPED",
+        "relevance_explanation": "LLM unavailable, degraded answer returned",
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "eval_prompt_tokens": 0,
+        "eval_completion_tokens": 0,
+        "eval_total_tokens": 0,
+        "openai_cost": 0,
+        "timings": timings,
+        "degraded": True,
+        **context_stats,
+    }
+
+
+# Function to build answer data when retrieval found nothing, without calling the LLM
+def no_context_answer(query, model, start_time, timings):
+    count_short_circuit("empty_context")
+    return {
+        "answer": NO_CONTEXT_ANSWER.format(title=query["title"]),
+        "model_used": model,
+        "response_time": time.time() - start_time,
+        "relevance": "SKIPPED",
+        "relevance_explanation": "No matching reviews, LLM not called",
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "eval_prompt_tokens": 0,
+        "eval_completion_tokens": 0,
+        "eval_total_tokens": 0,
+        "openai_cost": 0,
+        "timings": timings,
+        "no_context": True,
+        "context_hits": 0,
+        "context_reviews": 0,
+        "context_dropped": [],
+        "context_truncated": [],
+        "context_token_budget": PROMPT_TOKEN_BUDGET,
+    }
+
+
+# Function to turn a cached answer into answer data for a new conversation
+def cached_answer(cached, start_time, timings):
+    answer_data = dict(cached)
+    answer_data.update({
+        "response_time": time.time() - start_time,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "openai_cost": 0,
+        "timings": timings,
+        "cache_hit": True,
+        # The cached answer is graded with the conversation that produced it
+        "relevance": "SKIPPED",
+        "relevance_explanation": "Served from the semantic cache",
+    })
     return answer_data
@@ -1,7 +1,9 @@
 import os
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-from elasticsearch import Elasticsearch, ConnectionError, NotFoundError
+import re
+import json
+import time
+import hashlib
+from elasticsearch import Elasticsearch, ConnectionError, NotFoundError, BadRequestError, AuthorizationException
 from dotenv import load_dotenv
 
 
@@ -10,14 +12,102 @@ load_dotenv()
 ELASTIC_URL = os.getenv("ELASTIC_URL", "http://localhost:9200")  # Changed to localhost for local testing
 INDEX_NAME = os.getenv("INDEX_NAME", "reviews-steam")
 
+# Fields the RAG path reads from a hit (rag.build_prompt and the benchmarks)
+RAG_SOURCE_FIELDS = ["title", "review", "recommendationid", "document_id", "question", "answer", "section"]
+# Dense vectors are large and never needed by callers, so no read path returns them
+VECTOR_FIELDS = ["question_vector", "answer_vector", "question_answer_vector"]
+
+# kNN candidate pool size. benchmark.py tune-knn writes per-title values to KNN_SETTINGS_PATH;
+# KNN_NUM_CANDIDATES is used for titles without a tuned value.
+KNN_SETTINGS_PATH = os.getenv(
+    "KNN_SETTINGS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "knn_settings.json"),
+)
+KNN_NUM_CANDIDATES = int(os.getenv("KNN_NUM_CANDIDATES", "10000"))
+MAX_NUM_CANDIDATES = 10000  # Elasticsearch's upper limit
+
+# Transport settings shared by the sync and async clients
+ES_CONNECTIONS = int(os.getenv("ES_CONNECTIONS", "10"))  # pooled keep-alive connections per node
+ES_REQUEST_TIMEOUT = float(os.getenv("ES_REQUEST_TIMEOUT", "10"))
+ES_MAX_RETRIES = int(os.getenv("ES_MAX_RETRIES", "2"))
+
+# Upper bound on distinct titles returned by read_titles
+MAX_TITLES = int(os.getenv("MAX_TITLES", "10000"))
+
+# Page size and point-in-time keep-alive for the iter_* corpus readers
+READ_PAGE_SIZE = int(os.getenv("READ_PAGE_SIZE", "1000"))
+READ_KEEP_ALIVE = os.getenv("READ_KEEP_ALIVE", "2m")
+
+# How prep.ReviewIndexer lays out the index: single (one shard), routed (documents routed
+# to a shard by title) or per-title (one backing index per title behind the INDEX_NAME alias)
+INDEX_LAYOUT = os.getenv("INDEX_LAYOUT", "single")
+INDEX_LAYOUTS = ("single", "routed", "per-title")
+# How a cluster rejects rank.rrf: an unknown parameter (before 8.8) or a license without it.
+# Other errors, such as a timeout, say nothing about support.
+RRF_UNSUPPORTED_ERRORS = (BadRequestError, AuthorizationException)
+# Index fields index_version reads; prep.ReviewIndexer.update bumps _meta.generation
+VERSION_FILTER_PATH = ["*.settings.index.uuid", "*.mappings._meta.generation"]
+# Per-title layout: how often a reader checks whether a reindex replaced the indices it searches
+TITLE_INDICES_REFRESH_INTERVAL = float(os.getenv("TITLE_INDICES_REFRESH_INTERVAL", "30"))
+
+
+def title_index_name(index_name, title):
+    """Backing index of a title in the per-title layout: a lowercase slug plus a short hash."""
+    slug = re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")[:80]
+    digest = hashlib.sha1(title.encode("utf-8")).hexdigest()[:8]
+    return f"{index_name}-{slug}-{digest}"
+
+
+def es_client_options(connections=ES_CONNECTIONS, request_timeout=ES_REQUEST_TIMEOUT, max_retries=ES_MAX_RETRIES):
+    """Connection pool, timeout and retry settings for Elasticsearch and AsyncElasticsearch.
+
+    Connections are HTTP/1.1 keep-alive and reused from a pool of
+    `connections` per node; timed out and 502/503/504 requests are retried.
+    """
+    return {
+        "connections_per_node": connections,
+        "request_timeout": request_timeout,
+        "max_retries": max_retries,
+        "retry_on_timeout": True,
+        "retry_on_status": (502, 503, 504),
+    }
+
+
+def load_knn_settings(path=KNN_SETTINGS_PATH):
+    """Load {"default": n, "titles": {title: n}}; missing file or keys fall back to KNN_NUM_CANDIDATES."""
+    settings = {"default": KNN_NUM_CANDIDATES, "titles": {}}
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                settings.update(json.load(file))
+            print(f"Loaded kNN settings from {path}")
+        except Exception as e:
+            print(f"Error loading kNN settings from {path}: {e}")
+    return settings
+
 class ReviewReader:
-    def __init__(self, es_host=ELASTIC_URL, index_name=INDEX_NAME, model=None):
-        self.es = Elasticsearch([es_host])
+    def __init__(self, es_host=ELASTIC_URL, index_name=INDEX_NAME, model=None, source_fields=RAG_SOURCE_FIELDS,
+                 layout=INDEX_LAYOUT):
+        if layout not in INDEX_LAYOUTS:
+            raise ValueError(f"Unknown index layout '{layout}', expected one of {INDEX_LAYOUTS}")
+        self.es = self.create_client(es_host)
         self.index_name = index_name
+        self.layout = layout
+        self.title_indices = {}  # per-title layout: title -> backing index
+        self._version = None
+        self._version_checked_at = 0.0
         self.model = model  # SentenceTransformer model for embedding generation
+        self.source_fields = source_fields  # _source projection for the search methods
+        self.knn_settings = load_knn_settings()
+        self._server_rrf_supported = None  # unknown until the first server-side RRF search
 
         # Check the connection on initialization
         self.check_connection()
+        if self.layout == "per-title":
+            self.refresh_title_indices()
+
+    def create_client(self, es_host):
+        return Elasticsearch([es_host], **es_client_options())
 
     def check_connection(self):
         """Check if Elasticsearch connection is established."""
@@ -27,27 +117,168 @@ class ReviewReader:
             print("Connected to Elasticsearch!")
         except ConnectionError:
             print("Failed to connect to Elasticsearch.")
+
+    def ping(self):
+        """Return True when Elasticsearch answers a ping."""
+        return bool(self.es.ping())
+
+    def index_version(self):
+        """Return an identifier that changes whenever the index is recreated or updated in place."""
+        self._version_checked_at = time.time()
+        try:
+            response = self.es.indices.get(index=self.index_name, filter_path=VERSION_FILTER_PATH)
+            version = self.version_from_indices(response)
+        except Exception as e:
+            print(f"Error retrieving index version: {e}")
+            return None
+        # A reindex may have added or replaced backing indices
+        if version != self._version and self.layout == "per-title":
+            self.refresh_title_indices()
+        self._version = version
+        return version
+
+    @staticmethod
+    def version_from_indices(response):
+        """Each backing index's uuid (a rebuild) plus the generation in its _meta (an incremental update)."""
+        return ",".join(sorted(
+            f"{index['settings']['index']['uuid']}.{index.get('mappings', {}).get('_meta', {}).get('generation', 0)}"
+            for index in response.values()
+        ))
+
+    def index_projection(self):
+        """Version of the projection the live index was built with (recorded in its _meta), or None."""
+        response = self.es.indices.get_mapping(index=self.index_name)
+        versions = {mapping["mappings"].get("_meta", {}).get("projection") for mapping in response.values()}
+        if len(versions) > 1:
+            raise ValueError(f"The indices behind '{self.index_name}' use different projections: {versions}")
+        return versions.pop() if versions else None
+
+    def refresh_title_indices(self):
+        """Map each title to its backing index, read from the _meta of the indices behind the alias."""
+        try:
+            response = self.es.indices.get_mapping(index=self.index_name)
+            self.set_title_indices(response)
+        except Exception as e:
+            print(f"Error resolving per-title indices: {e}")
+        return self.title_indices
+
+    def set_title_indices(self, mapping_response):
+        self.title_indices = {
+            mapping["mappings"]["_meta"]["title"]: index
+            for index, mapping in mapping_response.items()
+            if "title" in mapping["mappings"].get("_meta", {})
+        }
+        print(f"Resolved {len(self.title_indices)} per-title indices behind '{self.index_name}'")
+
+    def title_indices_stale(self):
+        """True when the per-title map is due a check against the alias (see index_version)."""
+        return (self.layout == "per-title"
+                and time.time() - self._version_checked_at >= TITLE_INDICES_REFRESH_INTERVAL)
+
+    def search_target(self, title):
+        """Index and routing that hold a title's documents under the configured layout.
+
+        Titles without a backing index search the alias; the title filter
+        then simply matches nothing. The per-title map is refreshed here when
+        it is stale, so it follows a reindex even when nothing else polls
+        index_version.
+        """
+        if self.title_indices_stale():
+            self.index_version()
+        return self.layout_target(title)
+
+    def layout_target(self, title):
+        """search_target from the cached per-title map, without checking it."""
+        if self.layout == "per-title":
+            return {"index": self.title_indices.get(title, self.index_name)}
+        if self.layout == "routed":
+            return {"index": self.index_name, "routing": title}
+        return {"index": self.index_name}
     
     def read_all_reviews(self):
-        """Retrieve all reviews from the index."""
+        """Retrieve the first page (10 hits) of reviews; use iter_all_reviews for the whole index."""
         try:
-            response = self.es.search(index=self.index_name, query={"match_all": {}})
+            response = self.es.search(index=self.index_name, query={"match_all": {}}, source_excludes=VECTOR_FIELDS)
             return response['hits']['hits']  # returns the list of documents
         except Exception as e:
             print(f"Error retrieving documents: {e}")
             return []
 
     def read_review_by_appid(self, appid):
-        """Retrieve reviews by appid."""
+        """Retrieve the first page (10 hits) of reviews by appid; use iter_reviews_by_appid for all of them."""
         try:
             response = self.es.search(index=self.index_name, query={
                 "term": {"appid": appid}
-            })
+            }, source_excludes=VECTOR_FIELDS)
             return response['hits']['hits']  # list of documents matching the appid
         except Exception as e:
             print(f"Error retrieving document with appid {appid}: {e}")
             return []
 
+    def read_titles(self):
+        """Return {title: appid} for every title in the index, from a terms aggregation."""
+        response = self.es.search(index=self.index_name, size=0, aggs=self.build_titles_aggregation())
+        return self.titles_from_aggregation(response)
+
+    @staticmethod
+    def build_titles_aggregation():
+        return {"titles": {
+            "terms": {"field": "title", "size": MAX_TITLES},
+            "aggs": {"appid": {"terms": {"field": "appid", "size": 1}}},
+        }}
+
+    @staticmethod
+    def titles_from_aggregation(response):
+        titles = {}
+        for bucket in response["aggregations"]["titles"]["buckets"]:
+            appids = bucket["appid"]["buckets"]
+            titles[bucket["key"]] = appids[0]["key"] if appids else None
+        return titles
+
+    def iter_hits(self, query, page_size=READ_PAGE_SIZE, source_fields=None, keep_alive=READ_KEEP_ALIVE):
+        """Yield every hit matching query, one page at a time.
+
+        Pages are read from a point in time with search_after, so the walk
+        sees a consistent snapshot of the index and only one page is held in
+        memory. source_fields limits _source to those fields; by default
+        everything except the dense vectors is returned. The point in time
+        is closed when the generator finishes or is closed early.
+        """
+        pit_id = self.es.open_point_in_time(index=self.index_name, keep_alive=keep_alive)["id"]
+        source = source_fields if source_fields is not None else {"excludes": VECTOR_FIELDS}
+        search_after = None
+        try:
+            while True:
+                page = {"search_after": search_after} if search_after is not None else {}
+                response = self.es.search(
+                    pit={"id": pit_id, "keep_alive": keep_alive},
+                    query=query,
+                    size=page_size,
+                    sort=["_shard_doc"],
+                    source=source,
+                    track_total_hits=False,
+                    **page,
+                )
+                pit_id = response.get("pit_id", pit_id)
+                hits = response["hits"]["hits"]
+                yield from hits
+                if len(hits) < page_size:
+                    break
+                search_after = hits[-1]["sort"]
+        finally:
+            try:
+                self.es.close_point_in_time(id=pit_id)
+            except Exception as e:
+                print(f"Error closing point in time: {e}")
+
+    def iter_all_reviews(self, page_size=READ_PAGE_SIZE, source_fields=None):
+        """Yield every review hit in the index."""
+        return self.iter_hits({"match_all": {}}, page_size=page_size, source_fields=source_fields)
+
+    def iter_reviews_by_appid(self, appid, page_size=READ_PAGE_SIZE, source_fields=None):
+        """Yield every review hit for an appid."""
+        return self.iter_hits({"term": {"appid": appid}}, page_size=page_size, source_fields=source_fields)
+
     def read_reviews_knn(self, query, title, vector_field="answer_vector", num_results=5):
         """Retrieve reviews using KNN search to find similar vectors."""
         try:
@@ -63,7 +294,7 @@ class ReviewReader:
                     "field": vector_field,
                     "query_vector": knn_vector,
                     "k": num_results,
-                    "num_candidates": 10000,
+                    "num_candidates": self.num_candidates(title, num_results),
                     "filter": {
                         "term": {"title": title}
                     }
@@ -71,120 +302,214 @@ class ReviewReader:
             }
 
             # Execute the search
-            es_results = self.es.search(index=self.index_name, query=knn_query)
+            es_results = self.es.search(**self.search_target(title), query=knn_query, source=self.source_fields)
             return [hit['_source'] for hit in es_results['hits']['hits']]
         
         except Exception as e:
             print(f"Error executing KNN search: {e}")
             return []
 
-    def read_reviews_knn_and_keyword(self, field, query, vector, title, num_results=5):
-        """Retrieve reviews using both KNN and keyword search."""
-        try:
-            if self.model is None:
-                raise ValueError("Model for embedding generation is not initialized.")
+    def num_candidates(self, title, k):
+        """kNN candidate pool for a title: the tuned value, kept between k and MAX_NUM_CANDIDATES."""
+        default = self.knn_settings.get("default", KNN_NUM_CANDIDATES)
+        candidates = self.knn_settings.get("titles", {}).get(title, default)
+        return min(max(int(candidates), k), MAX_NUM_CANDIDATES)
 
-            # Define the KNN part of the query
-            knn_query = {
-                "knn": {
-                    "field": field,
-                    "query_vector": vector,
-                    "k": num_results,
-                    "num_candidates": 10000,
-                    "filter": {
-                        "term": {"title": title}
-                    }
-                }
+    def build_knn_query(self, field, vector, title, num_results=5):
+        """Build the KNN clause, filtered to one title."""
+        return {
+            "field": field,
+            "query_vector": vector,
+            "k": num_results,
+            "num_candidates": self.num_candidates(title, num_results),
+            "filter": {
+                "term": {"title": title}
             }
+        }
 
-            # Define the keyword search part of the query
-            keyword_query = {
-                "bool": {
-                    "must": {
-                        "multi_match": {
-                            "query": query,
-                            "fields": ["question^3", "answer", "section"],
-                            "type": "best_fields",
-                            "fuzziness": "AUTO"
-                        }
-                    },
-                    "filter": {
-                        "term": {"title": title}
+    def build_keyword_query(self, query, title):
+        """Build the keyword clause, filtered to one title."""
+        return {
+            "bool": {
+                "must": {
+                    "multi_match": {
+                        "query": query,
+                        "fields": ["question^3", "answer", "section"],
+                        "type": "best_fields",
+                        "fuzziness": "AUTO"
                     }
+                },
+                "filter": {
+                    "term": {"title": title}
                 }
             }
+        }
 
-            # Combine the KNN and keyword search
-            combined_query = {
-                "knn": knn_query["knn"],
-                "query": keyword_query
-            }
+    def build_knn_and_keyword_search(self, field, query, vector, title, num_results=5):
+        """Build the search body for the combined KNN and keyword search."""
+        # knn and query are top-level siblings; ES sums the scores of both
+        return {
+            "knn": self.build_knn_query(field, vector, title, num_results),
+            "query": self.build_keyword_query(query, title),
+            "size": num_results,
+            "_source": self.source_fields,
+        }
+
+    def build_rrf_searches(self, field, query, vector, title, window_size):
+        """Build the _msearch lines for the KNN and keyword halves of an RRF search."""
+        return [
+            self.search_target(title),
+            {"knn": self.build_knn_query(field, vector, title, window_size), "size": window_size,
+             "_source": self.source_fields},
+            self.search_target(title),
+            {"query": self.build_keyword_query(query, title), "size": window_size,
+             "_source": self.source_fields},
+        ]
+
+    def read_reviews_knn_and_keyword(self, field, query, vector, title, num_results=5, stats=None):
+        """Retrieve reviews using both KNN and keyword search.
+
+        When a stats dict is passed, the server-side search time reported by
+        Elasticsearch is stored in it as es_took (seconds).
+        """
+        try:
+            if self.model is None:
+                raise ValueError("Model for embedding generation is not initialized.")
+
+            search_body = self.build_knn_and_keyword_search(field, query, vector, title, num_results)
 
             # Execute the search
-            es_results = self.es.search(index=self.index_name, query=combined_query, size=num_results)
+            es_results = self.es.search(**self.search_target(title), **search_body)
+            if stats is not None:
+                stats["es_took"] = es_results["took"] / 1000
             return [hit['_source'] for hit in es_results['hits']['hits']]
 
         except Exception as e:
             print(f"Error executing combined KNN and keyword search: {e}")
             return []
 
-    def read_reviews_knn_and_keyword_rrf(self, field, query, vector, title, k=60, num_results=5):
-        """Retrieve reviews using both KNN and keyword search with RRF."""
+    def read_reviews_knn_and_keyword_batch(self, field, queries, vectors, titles, num_results=5, stats=None,
+                                           mode="hybrid", k=60, window_size=None):
+        """Run many KNN and keyword searches in a single _msearch round trip.
+
+        mode is "hybrid" (scores summed by Elasticsearch) or "rrf" (two
+        sub-searches per query, fused client-side). Returns one entry per
+        query, in input order: the list of matching documents, or the
+        exception raised for that query.
+        """
+        searches = self.build_batch_searches(field, queries, vectors, titles, num_results, mode, window_size)
         try:
-            if self.model is None:
-                raise ValueError("Model for embedding generation is not initialized.")
+            es_results = self.es.msearch(searches=searches)
+        except Exception as e:
+            print(f"Error executing batched KNN and keyword search: {e}")
+            return [e] * len(queries)
 
-            # Define the KNN query
-            knn_query = {
-                "knn": {
-                    "field": field,
-                    "query_vector": vector,
-                    "k": num_results,
-                    "num_candidates": 10000,
-                    "filter": {
-                        "term": {"title": title}
-                    }
-                }
-            }
+        if stats is not None:
+            stats["es_took"] = es_results["took"] / 1000
+        return self.parse_batch_responses(es_results["responses"], mode, k, num_results)
 
-            # Define the keyword search query
-            keyword_query = {
-                "bool": {
-                    "must": {
-                        "multi_match": {
-                            "query": query,
-                            "fields": ["question", "answer", "section"],
-                            "type": "best_fields"
-                        }
-                    },
-                    "filter": {"term": {"title": title}}
-                }
-            }
+    def build_batch_searches(self, field, queries, vectors, titles, num_results=5, mode="hybrid", window_size=None):
+        """Build the _msearch lines of a batch: one search per query, or two in rrf mode."""
+        window_size = max(window_size or num_results, num_results)
+        searches = []
+        for query, vector, title in zip(queries, vectors, titles):
+            if mode == "rrf":
+                searches.extend(self.build_rrf_searches(field, query, vector, title, window_size))
+            else:
+                searches.append(self.search_target(title))
+                searches.append(self.build_knn_and_keyword_search(field, query, vector, title, num_results))
+        return searches
 
-            # Execute the KNN and keyword searches
-            knn_results = self.es.search(index=self.index_name, query=knn_query, size=num_results)['hits']['hits']
-            keyword_results = self.es.search(index=self.index_name, query=keyword_query, size=num_results)['hits']['hits']
+    def parse_batch_responses(self, responses, mode="hybrid", k=60, num_results=5):
+        """Turn the _msearch responses of a batch into one result list or exception per query."""
+        results = []
+        if mode == "rrf":
+            for knn_response, keyword_response in zip(responses[0::2], responses[1::2]):
+                errors = [r["error"] for r in (knn_response, keyword_response) if "error" in r]
+                if errors:
+                    results.append(RuntimeError(f"Search failed: {errors[0]}"))
+                else:
+                    results.append(self.fuse_rrf(
+                        knn_response['hits']['hits'], keyword_response['hits']['hits'], k, num_results
+                    ))
+            return results
 
-            # Compute RRF scores and rerank the results
-            rrf_scores = {}
-            for rank, hit in enumerate(knn_results):
-                doc_id = hit['_id']
-                rrf_scores[doc_id] = self.compute_rrf(rank + 1, k)
+        for response in responses:
+            if "error" in response:
+                results.append(RuntimeError(f"Search failed: {response['error']}"))
+            else:
+                results.append([hit['_source'] for hit in response['hits']['hits']])
+        return results
 
-            for rank, hit in enumerate(keyword_results):
-                doc_id = hit['_id']
-                rrf_scores[doc_id] = rrf_scores.get(doc_id, 0) + self.compute_rrf(rank + 1, k)
+    def read_reviews_knn_and_keyword_rrf(self, field, query, vector, title, k=60, num_results=5, stats=None,
+                                         window_size=None, server_side=False):
+        """Retrieve reviews using both KNN and keyword search with RRF.
 
-            # Sort documents based on RRF scores
-            reranked_docs = sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)
+        Both sub-searches go out in one _msearch round trip and are fused
+        client-side from the _source they return. With server_side set, a
+        single search with Elasticsearch's rank.rrf is tried first; if the
+        cluster rejects it (version or license), the client-side path is used
+        from then on. Transport errors fail the search without that fallback.
+        """
+        window_size = max(window_size or num_results, num_results)
+        try:
+            if server_side and self._server_rrf_supported is not False:
+                try:
+                    response = self.es.search(
+                        **self.search_target(title),
+                        **self.build_server_rrf_search(field, query, vector, title, k, num_results, window_size),
+                    )
+                    self._server_rrf_supported = True
+                    if stats is not None:
+                        stats["es_took"] = response["took"] / 1000
+                    return [hit['_source'] for hit in response['hits']['hits']]
+                except RRF_UNSUPPORTED_ERRORS as e:
+                    if self._server_rrf_supported:
+                        raise
+                    print(f"Server-side RRF unavailable, fusing client-side instead: {e}")
+                    self._server_rrf_supported = False
 
-            # Return the top reranked documents
-            return [self.es.get(index=self.index_name, id=doc_id)['_source'] for doc_id, _ in reranked_docs[:num_results]]
+            es_results = self.es.msearch(searches=self.build_rrf_searches(field, query, vector, title, window_size))
+            if stats is not None:
+                stats["es_took"] = es_results["took"] / 1000
+            return self.parse_rrf_responses(es_results["responses"], k, num_results)
 
         except Exception as e:
             print(f"Error executing KNN and keyword search with RRF: {e}")
             return []
 
+    def build_server_rrf_search(self, field, query, vector, title, k, num_results, window_size):
+        """Build the search body for Elasticsearch's rank.rrf."""
+        return {
+            "knn": self.build_knn_query(field, vector, title, window_size),
+            "query": self.build_keyword_query(query, title),
+            "rank": {"rrf": {"window_size": window_size, "rank_constant": k}},
+            "size": num_results,
+            "source": self.source_fields,
+        }
+
+    def parse_rrf_responses(self, responses, k=60, num_results=5):
+        """Fuse the kNN and keyword responses of one RRF _msearch; raises if either failed."""
+        knn_response, keyword_response = responses
+        for response in (knn_response, keyword_response):
+            if "error" in response:
+                raise RuntimeError(f"Search failed: {response['error']}")
+        return self.fuse_rrf(knn_response['hits']['hits'], keyword_response['hits']['hits'], k, num_results)
+
+    def fuse_rrf(self, knn_hits, keyword_hits, k=60, num_results=5):
+        """Fuse two ranked hit lists with RRF and return the top documents' _source."""
+        rrf_scores = {}
+        sources = {}
+        for hits in (knn_hits, keyword_hits):
+            for rank, hit in enumerate(hits):
+                doc_id = hit['_id']
+                rrf_scores[doc_id] = rrf_scores.get(doc_id, 0) + self.compute_rrf(rank + 1, k)
+                sources.setdefault(doc_id, hit['_source'])
+
+        # Sort documents based on RRF scores
+        reranked_docs = sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)
+        return [sources[doc_id] for doc_id, _ in reranked_docs[:num_results]]
+
     def compute_rrf(self, rank, k=60):
         """Compute Reciprocal Rank Fusion (RRF) score."""
         return 1 / (k + rank)
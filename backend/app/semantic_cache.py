@@ -0,0 +1,172 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_MAX_BYTES = int(os.getenv("SEMANTIC_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SEMANTIC_CACHE_VERSION_CHECK_INTERVAL = float(os.getenv("SEMANTIC_CACHE_VERSION_CHECK_INTERVAL", "30"))
+
+# Rough per-entry bookkeeping cost on top of the vector and the answer text
+ENTRY_OVERHEAD_BYTES = 512
+
+
+class SemanticCache:
+    """Answer cache partitioned by title and matched on question embeddings.
+
+    A lookup is a hit when the cosine similarity between the new question
+    vector and a cached one for the same title reaches the threshold.
+    Entries expire after ttl seconds, and the least recently used entries are
+    evicted once the estimated size exceeds max_bytes.
+
+    The cache is dropped whenever version_fn returns a different value. With
+    ReviewReader.index_version this happens as soon as prep.ReviewIndexer
+    recreates or incrementally updates the index, even though the indexer runs in another process.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL,
+                 max_bytes=SEMANTIC_CACHE_MAX_BYTES, version_fn=None,
+                 version_check_interval=SEMANTIC_CACHE_VERSION_CHECK_INTERVAL):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.version_fn = version_fn
+        self.version_check_interval = version_check_interval
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> entry, least recently used first
+        self._titles = {}  # title -> set of keys
+        self._next_key = 0
+        self._size = 0
+        self._version = None
+        self._version_checked_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, title, vector):
+        """Return the cached answer data for a similar question, or None."""
+        self._check_version()
+        vector = self._normalize(vector)
+        now = time.time()
+
+        with self._lock:
+            keys = list(self._titles.get(title, ()))
+            for key in keys:
+                if now - self._entries[key]["created_at"] > self.ttl:
+                    self._remove(key)
+                    self.expirations += 1
+
+            keys = list(self._titles.get(title, ()))
+            if not keys:
+                self.misses += 1
+                return None
+
+            matrix = np.stack([self._entries[key]["vector"] for key in keys])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            key = keys[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(self._entries[key]["answer_data"], cache_similarity=float(scores[best]))
+
+    def put(self, title, question, vector, answer_data):
+        """Store the answer data for a question."""
+        vector = self._normalize(vector)
+        size = (
+            vector.nbytes
+            + len(question)
+            + sum(len(str(value)) for value in answer_data.values())
+            + ENTRY_OVERHEAD_BYTES
+        )
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = {
+                "title": title,
+                "question": question,
+                "vector": vector,
+                "answer_data": dict(answer_data),
+                "created_at": time.time(),
+                "size": size,
+            }
+            self._titles.setdefault(title, set()).add(key)
+            self._size += size
+
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._titles.clear()
+            self._size = 0
+            self.invalidations += 1
+        print("Semantic cache invalidated.")
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "titles": len(self._titles),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _check_version(self):
+        if self.version_fn is None:
+            return
+        now = time.time()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+
+        version = self.version_fn()
+        if version is None:
+            return
+        if self._version is not None and version != self._version:
+            print(f"Index version changed from {self._version} to {version}.")
+            self.invalidate()
+        self._version = version
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._size -= entry["size"]
+        title_keys = self._titles[entry["title"]]
+        title_keys.discard(key)
+        if not title_keys:
+            del self._titles[entry["title"]]
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
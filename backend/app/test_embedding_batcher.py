@@ -0,0 +1,66 @@
+import threading
+import numpy as np
+import pytest
+from embedding_batcher import EmbeddingBatcher
+
+
+class RecordingModel:
+    """Encodes a text as [len(text)] and records the size of every batch."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True):
+        with self._lock:
+            self.batches.append(len(texts))
+        if self.fail:
+            raise RuntimeError("model failed")
+        return np.array([[len(text)] for text in texts], dtype=np.float32)
+
+
+def encode_concurrently(batcher, texts):
+    results = [None] * len(texts)
+    start = threading.Barrier(len(texts))
+
+    def worker(i):
+        start.wait()
+        results[i] = batcher.encode(texts[i])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(texts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_single_call_returns_its_own_vector():
+    batcher = EmbeddingBatcher(RecordingModel(), max_batch_size=8, max_wait_us=1000)
+    np.testing.assert_array_equal(batcher.encode("abc"), [3])
+
+
+def test_concurrent_calls_share_batches_and_get_their_own_vectors():
+    model = RecordingModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=4, max_wait_us=200_000)
+    texts = ["x" * (i + 1) for i in range(8)]
+
+    results = encode_concurrently(batcher, texts)
+
+    assert [float(vector[0]) for vector in results] == [len(text) for text in texts]
+    assert sum(model.batches) == 8
+    assert max(model.batches) <= 4
+    assert len(model.batches) < 8  # at least some calls were batched together
+    stats = batcher.stats()
+    assert stats["items"] == 8
+    assert stats["largest_batch"] <= 4
+
+
+def test_model_errors_reach_every_caller_of_the_batch():
+    batcher = EmbeddingBatcher(RecordingModel(fail=True), max_batch_size=4, max_wait_us=1000)
+    with pytest.raises(RuntimeError, match="model failed"):
+        batcher.encode("abc")
+    # The worker keeps serving after a failed batch
+    batcher.model.fail = False
+    np.testing.assert_array_equal(batcher.encode("abcd"), [4])
@@ -0,0 +1,58 @@
+import numpy as np
+from embedding_cache import QueryEmbeddingCache, normalize_question, ENTRY_OVERHEAD_BYTES
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        return np.full(4, len(self.calls), dtype=np.float32)
+
+
+def test_normalize_question_collapses_case_and_whitespace():
+    assert normalize_question("  Is it  FUN?\n") == "is it fun?"
+
+
+def test_get_or_encode_reuses_vectors_of_normalized_variants():
+    cache = QueryEmbeddingCache("model")
+    encode = CountingEncoder()
+
+    first = cache.get_or_encode("Is it fun?", encode)
+    second = cache.get_or_encode("  is IT fun? ", encode)
+
+    assert encode.calls == ["Is it fun?"]
+    np.testing.assert_array_equal(first, second)
+    assert first.dtype == np.float32
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_least_recently_used_entry_is_evicted_at_max_bytes():
+    entry_bytes = 4 * 4 + len("q0") + ENTRY_OVERHEAD_BYTES
+    cache = QueryEmbeddingCache("model", max_bytes=2 * entry_bytes)
+    for i in range(2):
+        cache.put(f"q{i}", np.zeros(4))
+    cache.get("q0")  # q1 is now the least recently used
+    cache.put("q2", np.zeros(4))
+
+    assert cache.get("q1") is None
+    assert cache.get("q0") is not None
+    assert cache.get("q2") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= 2 * entry_bytes
+
+
+def test_disk_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "query_cache.sqlite")
+    QueryEmbeddingCache("model:torch", path=path).put("Is it fun?", np.arange(4))
+
+    other = QueryEmbeddingCache("model:torch", path=path)
+    np.testing.assert_array_equal(other.get("is it fun?"), np.arange(4, dtype=np.float32))
+    assert other.stats()["disk_hits"] == 1
+    # Entries are keyed by model and embedder backend, so neither another model nor another backend sees them
+    assert QueryEmbeddingCache("other-model:torch", path=path).get("Is it fun?") is None
+    assert QueryEmbeddingCache("model:onnx-int8", path=path).get("Is it fun?") is None
@@ -0,0 +1,119 @@
+import os
+import numpy as np
+import pytest
+from embedding_store import EmbeddingStore, KEY_BYTES
+
+
+DIMS = 4
+
+
+def vectors_for(texts):
+    return np.array([[len(text), i, 1, 0] for i, text in enumerate(texts)], dtype=np.float32)
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return vectors_for(texts)
+
+
+def open_store(tmp_path):
+    return EmbeddingStore("model", DIMS, path=str(tmp_path))
+
+
+def test_get_or_encode_encodes_each_distinct_miss_once(tmp_path):
+    store = open_store(tmp_path)
+    encode = CountingEncoder()
+
+    first = store.get_or_encode(["a", "bb", "a"], encode)
+    second = store.get_or_encode(["bb", "ccc"], encode)
+
+    assert encode.calls == [["a", "bb"], ["ccc"]]
+    np.testing.assert_array_equal(first[0], first[2])
+    np.testing.assert_array_equal(second[0], first[1])
+    stats = store.stats()
+    assert stats["entries"] == 3
+    assert (stats["hits"], stats["misses"]) == (1, 4)
+
+
+def test_vectors_persist_across_reopen(tmp_path):
+    store = open_store(tmp_path)
+    expected = store.get_or_encode(["a", "bb"], CountingEncoder())
+
+    reopened = open_store(tmp_path)
+    vectors, missing = reopened.lookup(["bb", "a", "new"])
+
+    assert missing == [2]
+    np.testing.assert_array_equal(vectors[:2], expected[[1, 0]])
+
+
+def test_open_rejects_a_store_of_other_dims(tmp_path):
+    open_store(tmp_path).add(["a"], vectors_for(["a"]))
+
+    with pytest.raises(ValueError):
+        EmbeddingStore("model", DIMS + 1, path=str(tmp_path))
+
+
+def test_rows_appended_past_the_recorded_count_are_dropped(tmp_path):
+    store = open_store(tmp_path)
+    store.add(["a"], vectors_for(["a"]))
+    # An append that crashed before meta.json was updated
+    with open(os.path.join(store.path, "vectors.f32"), "ab") as file:
+        file.write(np.zeros(DIMS, dtype=np.float32).tobytes())
+    with open(os.path.join(store.path, "keys.bin"), "ab") as file:
+        file.write(b"x" * KEY_BYTES)
+
+    reopened = open_store(tmp_path)
+
+    assert reopened.stats()["entries"] == 1
+    assert os.path.getsize(os.path.join(store.path, "keys.bin")) == KEY_BYTES
+
+
+def test_collect_garbage_keeps_only_referenced_vectors(tmp_path):
+    open_store(tmp_path).get_or_encode(["a", "bb", "ccc"], CountingEncoder())
+
+    store = open_store(tmp_path)
+    kept = store.get_or_encode(["ccc"], CountingEncoder())
+    assert store.garbage_ratio() == pytest.approx(2 / 3)
+    assert store.collect_garbage() == 2
+
+    reopened = open_store(tmp_path)
+    vectors, missing = reopened.lookup(["a", "ccc"])
+    assert missing == [0]
+    np.testing.assert_array_equal(vectors[1], kept[0])
+    assert sorted(os.listdir(store.path)) == ["keys.1.bin", "meta.json", "vectors.1.f32"]
+
+
+def test_compaction_interrupted_before_the_switch_keeps_the_old_store(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    expected = store.get_or_encode(["a", "bb"], CountingEncoder())
+
+    def crash():
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "_write_meta", crash)
+    with pytest.raises(OSError):
+        store.compact(keep=set())
+
+    reopened = open_store(tmp_path)
+    vectors, missing = reopened.lookup(["a", "bb"])
+    assert missing == []
+    np.testing.assert_array_equal(vectors, expected)
+    # The new generation written before the crash is cleaned up
+    assert sorted(os.listdir(store.path)) == ["keys.bin", "meta.json", "vectors.f32"]
+
+
+def test_compaction_interrupted_after_the_switch_opens_the_new_store(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    store.get_or_encode(["a", "bb"], CountingEncoder())
+    monkeypatch.setattr(os, "remove", lambda path: None)  # crash before the old files are removed
+
+    store.compact(keep=None)
+    monkeypatch.undo()
+
+    reopened = open_store(tmp_path)
+    assert reopened.stats()["entries"] == 2
+    assert sorted(os.listdir(store.path)) == ["keys.1.bin", "meta.json", "vectors.1.f32"]
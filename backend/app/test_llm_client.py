@@ -0,0 +1,184 @@
+import time
+import threading
+from http.server import ThreadingHTTPServer
+import openai
+import pytest
+from fake_openai import FakeOpenAIHandler, build_parser, FAKE_ANSWER
+from llm_client import LLMClient, CircuitBreaker, LLMUnavailableError, LLMRequestError
+
+
+@pytest.fixture
+def fake_openai():
+    """Start fake_openai.py on a free port; returns a function that configures it and builds a client."""
+    servers = []
+
+    def start(*args, **client_options):
+        config = build_parser().parse_args(["--latency", "0", "--jitter", "0", "--token-delay", "0", *args])
+        handler = type("Handler", (FakeOpenAIHandler,), {"config": config, "requests": 0})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+        client_options.setdefault("backoff_base", 0.01)
+        client_options.setdefault("hedge_enabled", False)
+        client = LLMClient(api_key="fake", base_url=f"http://127.0.0.1:{server.server_port}/v1", **client_options)
+        return client, handler
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_complete_returns_the_answer_and_token_counts(fake_openai):
+    client, handler = fake_openai()
+
+    answer, tokens, time_to_first_token = client.complete("Is it fun?")
+
+    assert answer.strip() == FAKE_ANSWER
+    assert tokens["completion_tokens"] > 0
+    assert tokens["total_tokens"] == tokens["prompt_tokens"] + tokens["completion_tokens"]
+    assert time_to_first_token >= 0
+    assert handler.requests == 1
+    assert client.stats()["retries"] == 0
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_complete_retries_rate_limits_and_server_errors(fake_openai, status):
+    client, handler = fake_openai("--fail-first", "2", "--fail-status", str(status), max_retries=2)
+
+    answer, _, _ = client.complete("Is it fun?")
+
+    assert answer.strip() == FAKE_ANSWER
+    assert handler.requests == 3
+    stats = client.stats()
+    assert stats["retries"] == 2
+    assert stats["failures"] == 0
+    assert stats["breaker_state"] == "closed"
+
+
+def test_complete_gives_up_when_retries_are_exhausted(fake_openai):
+    client, handler = fake_openai("--fail-first", "10", max_retries=1)
+
+    with pytest.raises(LLMUnavailableError):
+        client.complete("Is it fun?")
+
+    assert handler.requests == 2
+    assert client.stats()["failures"] == 1
+
+
+def test_complete_does_not_retry_bad_requests(fake_openai):
+    client, handler = fake_openai("--fail-first", "1", "--fail-status", "400", max_retries=2)
+
+    with pytest.raises(LLMRequestError) as error:
+        client.complete("Is it fun?")
+
+    assert isinstance(error.value.__cause__, openai.BadRequestError)
+    assert handler.requests == 1
+    stats = client.stats()
+    assert stats["retries"] == 0
+    assert stats["request_errors"] == 1
+    assert stats["failures"] == 0
+
+
+@pytest.mark.parametrize("status", [400, 401])
+def test_rejected_requests_do_not_open_the_breaker(fake_openai, status):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+    client, _ = fake_openai("--fail-first", "3", "--fail-status", str(status), breaker=breaker)
+
+    for _ in range(3):
+        with pytest.raises(LLMRequestError):
+            client.complete("Is it fun?")
+
+    assert breaker.state == "closed"
+    answer, _, _ = client.complete("Is it fun?")
+    assert answer.strip() == FAKE_ANSWER
+
+
+def test_stream_rejected_request_raises_request_error(fake_openai):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    client, _ = fake_openai("--fail-first", "1", "--fail-status", "400", breaker=breaker)
+
+    with pytest.raises(LLMRequestError):
+        "".join(client.stream("Is it fun?"))
+
+    assert breaker.state == "closed"
+
+
+def test_half_open_trial_without_a_verdict_is_replaced_after_the_cooldown():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.1)
+    breaker.record_failure()
+    time.sleep(0.15)
+    assert breaker.allow()  # the trial call, which then ends in a rejected request
+    assert not breaker.allow()
+
+    time.sleep(0.15)
+    assert breaker.allow()
+
+
+def test_complete_gives_up_at_the_deadline(fake_openai):
+    client, _ = fake_openai("--latency", "2", timeout=0.3, max_retries=3)
+
+    started = time.time()
+    with pytest.raises(LLMUnavailableError):
+        client.complete("Is it fun?")
+
+    assert time.time() - started < 1.5
+
+
+def test_breaker_opens_rejects_calls_and_recovers_after_the_cooldown(fake_openai):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.2)
+    client, handler = fake_openai("--fail-first", "2", max_retries=0, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            client.complete("Is it fun?")
+    assert breaker.state == "open"
+
+    with pytest.raises(LLMUnavailableError, match="circuit breaker is open"):
+        client.complete("Is it fun?")
+    assert handler.requests == 2
+    assert client.stats()["rejected"] == 1
+
+    time.sleep(0.25)
+    answer, _, _ = client.complete("Is it fun?")
+
+    assert answer.strip() == FAKE_ANSWER
+    assert breaker.state == "closed"
+    assert breaker.trips == 1
+
+
+def test_stream_yields_the_answer_and_fills_stats(fake_openai):
+    client, _ = fake_openai()
+    stats = {}
+
+    answer = "".join(client.stream("Is it fun?", stats=stats))
+
+    assert answer.strip() == FAKE_ANSWER
+    assert stats["completion_tokens"] > 0
+    assert stats["time_to_first_token"] >= 0
+
+
+def test_stream_retries_failures_before_the_first_token(fake_openai):
+    client, handler = fake_openai("--fail-first", "1", "--fail-status", "503", max_retries=1)
+
+    answer = "".join(client.stream("Is it fun?"))
+
+    assert answer.strip() == FAKE_ANSWER
+    assert handler.requests == 2
+    assert client.stats()["retries"] == 1
+
+
+def test_hedge_wins_when_the_first_request_is_slow(fake_openai):
+    client, handler = fake_openai("--slow-first", "1", "--slow-latency", "2", hedge_enabled=True, hedge_min_samples=1)
+    client._latencies.append(0.05)
+
+    started = time.time()
+    answer, _, _ = client.complete("Is it fun?")
+
+    assert answer.strip() == FAKE_ANSWER
+    assert time.time() - started < 1.5
+    assert handler.requests == 2
+    stats = client.stats()
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
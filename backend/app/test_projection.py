@@ -0,0 +1,67 @@
+import numpy as np
+from projection import Projection, ProjectionLoader, load_projection
+
+
+def make_projection(seed=0):
+    rng = np.random.default_rng(seed)
+    components = np.linalg.qr(rng.normal(size=(8, 3)))[0].T  # 3 orthonormal rows of 8 dims
+    return Projection(rng.normal(size=8), components, "model")
+
+
+def test_transform_normalizes_and_keeps_zero_rows():
+    projection = make_projection()
+    vectors = np.vstack([np.ones(8), np.zeros(8)])
+
+    projected = projection.transform(vectors)
+
+    assert projected.shape == (2, 3)
+    np.testing.assert_allclose(np.linalg.norm(projected[0]), 1.0, rtol=1e-5)
+    np.testing.assert_array_equal(projected[1], 0)
+    assert projection.transform(np.ones(8)).shape == (3,)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    projection = make_projection()
+    projection.save(str(tmp_path))
+
+    loaded = load_projection(projection.version, str(tmp_path))
+
+    assert loaded.version == projection.version
+    np.testing.assert_array_equal(loaded.transform(np.ones(8)), projection.transform(np.ones(8)))
+
+
+def test_loader_retries_until_the_artifact_can_be_loaded(tmp_path):
+    projection = make_projection()
+    loader = ProjectionLoader(lambda: projection.version, version_fn=lambda: "v1", path=str(tmp_path),
+                              refresh_interval=0)
+    assert not loader.ready()
+    assert loader.stats()["errors"] >= 1
+
+    projection.save(str(tmp_path))
+
+    assert loader.ready()
+    assert loader.get().version == projection.version
+
+
+def test_loader_follows_the_index_version(tmp_path):
+    first, second = make_projection(0), make_projection(1)
+    first.save(str(tmp_path))
+    second.save(str(tmp_path))
+    live = {"version": "v1", "projection": first.version}
+    loader = ProjectionLoader(lambda: live["projection"], version_fn=lambda: live["version"], path=str(tmp_path),
+                              refresh_interval=0)
+    assert loader.get().version == first.version
+
+    live["projection"] = second.version
+    assert loader.get().version == first.version  # same index version, no reload
+
+    live["version"] = "v2"
+    assert loader.get().version == second.version
+
+
+def test_loader_without_projection_passes_vectors_through(tmp_path):
+    loader = ProjectionLoader(lambda: None, path=str(tmp_path))
+    vector = np.ones(8, dtype=np.float32)
+
+    assert loader.ready()
+    assert loader.transform(vector) is vector
@@ -0,0 +1,100 @@
+import time
+import pytest
+import rag
+from llm_client import LLMRequestError
+from rag import build_prompt, group_by_review, count_tokens
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Count tokens with the ~4 characters per token estimate so budgets are deterministic
+    monkeypatch.setattr(rag, "get_encoding", lambda model: None)
+
+
+def hit(recommendationid, answer, review="A long review body. " * 20, section="gameplay"):
+    return {
+        "recommendationid": recommendationid,
+        "title": "Some Game",
+        "review": review,
+        "answer": answer,
+        "section": section,
+    }
+
+
+QUERY = {"question": "Is the gameplay fun?"}
+
+
+def test_group_by_review_dedupes_reviews_and_entries_in_rank_order():
+    hits = [
+        hit("r1", "Yes"),
+        hit("r2", "No"),
+        hit("r1", "Yes"),
+        hit("r1", "Very much", section="story"),
+    ]
+
+    groups = group_by_review(hits)
+
+    assert [group["id"] for group in groups] == ["r1", "r2"]
+    assert groups[0]["entries"] == [
+        {"answer": "Yes", "section": "gameplay"},
+        {"answer": "Very much", "section": "story"},
+    ]
+
+
+def test_build_prompt_includes_each_review_once():
+    hits = [hit("r1", "Yes"), hit("r1", "Yes, a lot", section="story"), hit("r2", "No")]
+
+    prompt, stats = build_prompt(QUERY, hits, token_budget=10_000)
+
+    assert prompt.count("A long review body.") == 2 * 20
+    assert "Yes, a lot" in prompt
+    assert stats["context_hits"] == 3
+    assert stats["context_reviews"] == 2
+    assert stats["context_dropped"] == []
+    assert stats["context_truncated"] == []
+    assert stats["context_token_budget"] == 10_000
+
+
+def test_build_prompt_truncates_the_review_that_overflows_the_budget():
+    short = hit("r1", "Yes", review="Short review.")
+    long_review = "word " * 2000
+    hits = [short, hit("r2", "No", review=long_review)]
+    budget = 600
+
+    prompt, stats = build_prompt(QUERY, hits, token_budget=budget)
+
+    assert stats["context_reviews"] == 2
+    assert stats["context_truncated"] == ["r2"]
+    assert stats["context_dropped"] == []
+    assert "Short review." in prompt
+    assert long_review.strip() not in prompt
+    assert count_tokens(prompt) <= budget
+
+
+def test_build_prompt_drops_reviews_when_too_little_budget_is_left():
+    hits = [hit("r1", "Yes", review="word " * 400), hit("r2", "No")]
+    base = count_tokens(rag.prompt_template.format(question=QUERY["question"], context=""))
+    # Room for the first review but not for MIN_TRUNCATED_REVIEW_TOKENS of the second
+    budget = base + count_tokens(
+        rag.review_template.format(title="Some Game", review="word " * 400)
+        + "\n" + rag.entry_template.format(answer="Yes", section="gameplay") + "\n\n"
+    ) + 20
+
+    prompt, stats = build_prompt(QUERY, hits, token_budget=budget)
+
+    assert stats["context_reviews"] == 1
+    assert stats["context_dropped"] == ["r2"]
+    assert stats["context_truncated"] == []
+    assert "A long review body." not in prompt
+
+
+def test_rejected_llm_request_returns_a_degraded_answer(monkeypatch):
+    def rejected(prompt, model, timings):
+        raise LLMRequestError("context length exceeded")
+
+    monkeypatch.setattr(rag, "llm", rejected)
+
+    answer = rag.answer_from_results(QUERY, [hit("r1", "Yes")], "gpt-4o-mini", time.time(), {})
+
+    assert answer["degraded"] is True
+    assert answer["answer"] == rag.DEGRADED_ANSWER
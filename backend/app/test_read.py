@@ -0,0 +1,116 @@
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import BadRequestError, ConnectionError
+from read import ReviewReader
+
+
+@pytest.fixture
+def reader():
+    # fuse_rrf only ranks hits, so no Elasticsearch client is needed
+    return object.__new__(ReviewReader)
+
+
+def hits(*ids):
+    return [{"_id": doc_id, "_source": {"id": doc_id}} for doc_id in ids]
+
+
+def test_compute_rrf(reader):
+    assert reader.compute_rrf(1) == pytest.approx(1 / 61)
+    assert reader.compute_rrf(3, k=10) == pytest.approx(1 / 13)
+
+
+def test_fuse_rrf_ranks_documents_found_by_both_searches_first(reader):
+    fused = reader.fuse_rrf(hits("a", "b", "c"), hits("c", "d", "a"), num_results=4)
+
+    # a: 1/61 + 1/63, c: 1/63 + 1/61, then b: 1/62 and d: 1/62
+    assert [doc["id"] for doc in fused[:2]] == ["a", "c"]
+    assert {doc["id"] for doc in fused[2:]} == {"b", "d"}
+
+
+def test_fuse_rrf_limits_the_results(reader):
+    fused = reader.fuse_rrf(hits("a", "b", "c"), hits("d", "e"), num_results=2)
+
+    assert [doc["id"] for doc in fused] == ["a", "d"]
+
+
+def test_fuse_rrf_handles_one_empty_list(reader):
+    fused = reader.fuse_rrf([], hits("x", "y"))
+
+    assert [doc["id"] for doc in fused] == ["x", "y"]
+
+
+def test_fuse_rrf_k_controls_how_much_top_ranks_dominate(reader):
+    knn = hits("a", "c", "d", "b")
+    keyword = hits("e", "f", "g", "b")
+
+    # With a small k the top hits beat a document ranked 4th in both lists
+    assert [doc["id"] for doc in reader.fuse_rrf(knn, keyword, k=1, num_results=2)] == ["a", "e"]
+    # With a large k, appearing in both lists matters more than the ranks
+    assert reader.fuse_rrf(knn, keyword, k=1000, num_results=1)[0]["id"] == "b"
+
+
+class FakeElasticsearch:
+    """search raises the given error; msearch answers the client-side RRF sub-searches."""
+
+    def __init__(self, search_error):
+        self.search_error = search_error
+        self.searches = 0
+
+    def search(self, **kwargs):
+        self.searches += 1
+        raise self.search_error
+
+    def msearch(self, searches):
+        response = {"hits": {"hits": hits("a", "b")}}
+        return {"took": 1, "responses": [response, response]}
+
+
+def rrf_reader(search_error):
+    reader = object.__new__(ReviewReader)
+    reader.es = FakeElasticsearch(search_error)
+    reader.layout = "single"
+    reader.index_name = "reviews"
+    reader.source_fields = ["id"]
+    reader.knn_settings = {"default": 100, "titles": {}}
+    reader._server_rrf_supported = None
+    return reader
+
+
+def search(reader):
+    return reader.read_reviews_knn_and_keyword_rrf("question_answer_vector", "fun?", [0.1] * 4, "Game",
+                                                   server_side=True)
+
+
+def test_server_rrf_falls_back_for_good_when_the_cluster_rejects_it():
+    meta = ApiResponseMeta(status=400, http_version="1.1", headers=HttpHeaders(), duration=0.0,
+                           node=NodeConfig("http", "localhost", 9200))
+    reader = rrf_reader(BadRequestError("unknown key [rank]", meta, {}))
+
+    assert [doc["id"] for doc in search(reader)] == ["a", "b"]
+    search(reader)
+
+    assert reader._server_rrf_supported is False
+    assert reader.es.searches == 1
+
+
+def test_server_rrf_is_tried_again_after_a_transport_error():
+    reader = rrf_reader(ConnectionError("connection refused"))
+
+    assert search(reader) == []
+    search(reader)
+
+    assert reader._server_rrf_supported is None
+    assert reader.es.searches == 2
+
+
+def test_index_version_changes_with_an_incremental_update(reader):
+    def indices(generation):
+        mappings = {"_meta": {"generation": generation}} if generation else {}
+        return {"reviews-v1": {"settings": {"index": {"uuid": "abc"}}, "mappings": mappings}}
+
+    built, updated = indices(0), indices(1)
+    rebuilt = {"reviews-v2": {"settings": {"index": {"uuid": "def"}}, "mappings": {}}}
+
+    assert reader.version_from_indices(built) == "abc.0"
+    assert reader.version_from_indices(updated) == "abc.1"
+    assert reader.version_from_indices(rebuilt) == "def.0"
@@ -0,0 +1,98 @@
+import pytest
+from title_resolver import TitleResolver, normalize_title
+
+
+CATALOGUE = {
+    "Baldur's Gate 3": 1086940,
+    "Pokémon Legends": None,
+    "Hades": 1145360,
+}
+
+
+class Versions:
+    """version_fn whose value the test changes, like an alias flip in prep.py."""
+
+    def __init__(self, version="v1"):
+        self.version = version
+
+    def __call__(self):
+        return self.version
+
+
+@pytest.mark.parametrize("title", ["Baldur's Gate 3", "baldurs gate 3", "Baldurs-Gate  3", "BALDUR’S GATE 3"])
+def test_normalize_title(title):
+    assert normalize_title(title) == "baldurs gate 3"
+
+
+def test_normalize_title_strips_accents():
+    assert normalize_title("Pokémon Legends") == "pokemon legends"
+
+
+def test_resolve_exact_normalized_appid_and_fuzzy_titles():
+    resolver = TitleResolver(lambda: CATALOGUE)
+
+    assert resolver.resolve("Hades") == "Hades"
+    assert resolver.resolve(" baldurs gate 3 ") == "Baldur's Gate 3"
+    assert resolver.resolve("pokemon legends") == "Pokémon Legends"
+    assert resolver.resolve("1145360") == "Hades"
+    assert resolver.resolve("Baldurs Gat 3") == "Baldur's Gate 3"
+    assert resolver.resolve("Stardew Valley") is None
+
+    stats = resolver.stats()
+    assert (stats["exact"], stats["normalized"], stats["appid"], stats["fuzzy"], stats["unknown"]) == (1, 2, 1, 1, 1)
+
+
+def test_suggest_returns_close_titles():
+    resolver = TitleResolver(lambda: CATALOGUE)
+
+    assert resolver.suggest("Baldur Gate") == ["Baldur's Gate 3"]
+    assert resolver.titles() == sorted(CATALOGUE)
+
+
+def test_titles_pass_through_while_the_catalogue_cannot_be_loaded():
+    def failing():
+        raise ConnectionError("Elasticsearch is down")
+
+    resolver = TitleResolver(failing)
+
+    assert resolver.resolve("Anything") == "Anything"
+    assert resolver.stats()["passthrough"] == 1
+
+
+def test_catalogue_reloads_when_the_index_version_changes():
+    catalogue = dict(CATALOGUE)
+    versions = Versions()
+    resolver = TitleResolver(lambda: catalogue, version_fn=versions, refresh_interval=0)
+    assert resolver.resolve("Celeste") is None
+
+    catalogue["Celeste"] = 504230
+    assert resolver.resolve("Celeste") is None  # same version, no reload
+
+    versions.version = "v2"
+    assert resolver.resolve("Celeste") == "Celeste"
+    assert resolver.stats()["refreshes"] == 2
+
+
+def test_empty_catalogue_is_retried_without_a_version_change():
+    catalogue = {}
+    resolver = TitleResolver(lambda: catalogue, version_fn=Versions(), refresh_interval=0)
+    assert resolver.resolve("Hades") == "Hades"  # passthrough
+
+    catalogue.update(CATALOGUE)
+    assert resolver.resolve("Stardew Valley") is None
+    assert resolver.stats()["titles"] == len(CATALOGUE)
+
+
+def test_version_checks_are_throttled():
+    calls = []
+    versions = Versions()
+
+    def version_fn():
+        calls.append(1)
+        return versions()
+
+    resolver = TitleResolver(lambda: CATALOGUE, version_fn=version_fn, refresh_interval=60)
+    for _ in range(5):
+        resolver.resolve("Hades")
+
+    assert len(calls) == 1
@@ -0,0 +1,151 @@
+import os
+import re
+import time
+import difflib
+import threading
+import unicodedata
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+TITLE_RESOLVER_ENABLED = os.getenv("TITLE_RESOLVER_ENABLED", "1") == "1"
+TITLE_MATCH_CUTOFF = float(os.getenv("TITLE_MATCH_CUTOFF", "0.85"))
+TITLE_REFRESH_INTERVAL = float(os.getenv("TITLE_REFRESH_INTERVAL", "30"))
+
+APOSTROPHES = re.compile(r"['’‘`´]")
+NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_title(title):
+    """Case-fold, strip accents and apostrophes, and collapse punctuation to single spaces.
+
+    "Baldur's Gate 3", "baldurs gate 3" and "Baldurs-Gate  3" all become
+    "baldurs gate 3".
+    """
+    text = unicodedata.normalize("NFKD", title)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = APOSTROPHES.sub("", text.casefold())
+    return " ".join(NON_WORD.sub(" ", text).split())
+
+
+class TitleResolver:
+    """In-memory catalogue of the titles in the index, used to resolve free-text titles.
+
+    A title resolves when it matches an indexed title exactly, matches one
+    after normalize_title, is the appid of one, or is close enough to a
+    normalized title (difflib ratio of at least cutoff). Anything else is
+    unknown.
+
+    The catalogue comes from titles_fn, which returns {title: appid}. It is
+    reloaded whenever version_fn returns a different value, so a reindex by
+    prep.py is picked up without a restart. While the catalogue is empty
+    (for example the index could not be read yet), titles pass through
+    unchanged rather than every question being rejected.
+    """
+
+    def __init__(self, titles_fn, version_fn=None, cutoff=TITLE_MATCH_CUTOFF,
+                 refresh_interval=TITLE_REFRESH_INTERVAL):
+        self.titles_fn = titles_fn
+        self.version_fn = version_fn
+        self.cutoff = cutoff
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._titles = {}  # title -> appid
+        self._normalized = {}  # normalized title -> title
+        self._appids = {}  # appid -> title
+        self._version = None
+        self._version_checked_at = 0.0
+
+        self.exact = 0
+        self.normalized = 0
+        self.appid = 0
+        self.fuzzy = 0
+        self.unknown = 0
+        self.passthrough = 0
+        self.refreshes = 0
+
+        self.refresh()
+
+    def refresh(self):
+        """Reload the title catalogue from titles_fn."""
+        try:
+            titles = self.titles_fn()
+        except Exception as e:
+            print(f"Error loading the title catalogue: {e}")
+            return
+        normalized = {normalize_title(title): title for title in titles}
+        appids = {str(appid): title for title, appid in titles.items() if appid is not None}
+        with self._lock:
+            self._titles = dict(titles)
+            self._normalized = normalized
+            self._appids = appids
+            self.refreshes += 1
+        print(f"Title catalogue loaded: {len(titles)} titles.")
+
+    def resolve(self, title):
+        """Return the indexed title that title refers to, or None when it is unknown."""
+        self._check_version()
+        title = title.strip()
+        with self._lock:
+            if not self._titles:
+                self.passthrough += 1
+                return title
+            if title in self._titles:
+                self.exact += 1
+                return title
+            if title in self._appids:
+                self.appid += 1
+                return self._appids[title]
+            key = normalize_title(title)
+            if key in self._normalized:
+                self.normalized += 1
+                return self._normalized[key]
+            matches = difflib.get_close_matches(key, self._normalized, n=1, cutoff=self.cutoff)
+            if matches:
+                self.fuzzy += 1
+                return self._normalized[matches[0]]
+            self.unknown += 1
+            return None
+
+    def suggest(self, title, n=3, cutoff=0.5):
+        """Return up to n indexed titles loosely resembling title, best first."""
+        with self._lock:
+            matches = difflib.get_close_matches(normalize_title(title), self._normalized, n=n, cutoff=cutoff)
+            return [self._normalized[match] for match in matches]
+
+    def titles(self):
+        """Return the indexed titles, sorted."""
+        with self._lock:
+            return sorted(self._titles)
+
+    def stats(self):
+        """Return the catalogue size and how lookups were resolved."""
+        with self._lock:
+            return {
+                "titles": len(self._titles),
+                "exact": self.exact,
+                "normalized": self.normalized,
+                "appid": self.appid,
+                "fuzzy": self.fuzzy,
+                "unknown": self.unknown,
+                "passthrough": self.passthrough,
+                "refreshes": self.refreshes,
+            }
+
+    def _check_version(self):
+        if self.version_fn is None:
+            return
+        now = time.time()
+        if now - self._version_checked_at < self.refresh_interval:
+            return
+        self._version_checked_at = now
+
+        version = self.version_fn()
+        if version is None:
+            return
+        if (self._version is not None and version != self._version) or not self._titles:
+            print(f"Index version is now {version}, reloading the title catalogue.")
+            self.refresh()
+        self._version = version